@@ -1,17 +1,12 @@
-import wx
 import os
 import sys
-import pystray
-from PIL import Image
-import requests
-from requests.exceptions import JSONDecodeError
-import datetime
 import time
-from plyer import notification
-from plyer.utils import platform
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-from win10toast import ToastNotifier
+import argparse
+import uploader
+from uploadapp import UploadApp
+
+# wx, pystray, PIL and win10toast are imported where they are used, so the
+# watcher and uploads start without them and --headless never loads them
 
 if getattr(sys, 'frozen', False):
 	# Running as compiled executable
@@ -23,7 +18,18 @@ else:
 # Create a tray icon
 iconpath = os.path.join(exe_dir, "icon2.ico")
 
-def show_tray_message(ntitle, nmessage):
+# URL for the upload endpoint
+upload_url = "https://arenalogs.gg/api/upload"
+
+# Run without the tray icon, messages go to the console instead of toasts
+headless = False
+
+# Function to show a toast, blocks until it is gone so only the notifier thread calls it
+def display_tray_message(ntitle, nmessage):
+	if headless:
+		print(f"{ntitle}: {nmessage}", flush=True)
+		return True
+	from win10toast import ToastNotifier
 	toaster = ToastNotifier()
 	toaster.show_toast(ntitle,
 					   nmessage,
@@ -38,173 +44,59 @@ def show_tray_message(ntitle, nmessage):
 #	else:
 #		notification.notify(title=ntitle, message=nmessage, app_name='Arena Logs', app_icon=iconpath,)
 
-def upload_file(file_path):
-	show_tray_message("Starting Upload", f"Uploading {os.path.basename(file_path)}")
-	# Read the contents of the file
-	with open(file_path, 'r', encoding='utf-8') as f:
-		file_contents = f.read()
-	# URL for the upload endpoint
-	url = "https://arenalogs.gg/api/upload"
-	# Prepare the payload for the request
-	payload = {'file_contents': file_contents}
-	# Send the request
-	response = requests.post(url, json=payload)
-	# Check the response status code
-	#//json_response = response.json()
-	#//message = json_response.get('message')
-
-
-	# Print response status code
-	print("Status Code:", response.status_code, flush=True)
-
-	# Print response headers
-	print("Response Headers:", flush=True)
-	for header, value in response.headers.items():
-		print(f"{header}: {value}", flush=True)
-
-	# Print response content (text)
-	print("Response Content (Text):", flush=True)
-	print(response.text, flush=True)
-
-	# Print response content (raw bytes)
-	print("Response Content (Raw Bytes):", flush=True)
-	print(response.content, flush=True)
-
-	if response.status_code == 200:
-		#print("File uploaded successfully.")
-		show_tray_message("Upload Successful", f"Successfully uploaded {os.path.basename(file_path)}")
-	else:
-		#print("Failed to upload file.")
-		show_tray_message("Upload Failed", "Failed to upload the file.")
+# The upload queue, indexes, tailer and watcher, see uploadapp.py. Only the
+# arena matches in a log are sent, one upload per match, each with a short
+# summary ahead of it so results show up sooner, and the active log is sent
+# as it grows.
+uploads = UploadApp(upload_url, 'Arena Logs', iconpath, display_tray_message)
+
+# wx.App, created the first time a window is opened from the tray menu
+wx_app = None
+
+# Function to load the wx windows, and wx with them, when they are first needed
+def load_gui():
+	global wx_app
+	import wxdialogs
+	if wx_app is None:
+		wx_app = wxdialogs.start(uploads)
+	return wxdialogs
 
 def on_quit_callback(icon, item):
+	uploads.stop()
 	#print("Quit item clicked")
 	icon.stop()
-	wx.CallAfter(wx.GetApp().ExitMainLoop)
+	if wx_app is not None:
+		load_gui().stop()
 
 def show_info_window(icon):
-	frame = InfoFrame(icon)
+	frame = load_gui().InfoFrame(icon, uploads)
 	frame.Show(True)
 
 def show_manual_upload_dialog():
-	dialog = ManualUploadDialog(None)
+	dialog = load_gui().ManualUploadDialog(None, uploads)
 	dialog.ShowModal()
 	#dialog.Destroy()
 
-class ManualUploadDialog(wx.Dialog):
-	def __init__(self, parent):
-		super().__init__(parent, title="Manual Upload", size=(500, 300))
-		self.__close_callback = self.OnClose
-		self.icon = wx.Icon(iconpath, wx.BITMAP_TYPE_ICO)
-		self.SetIcon(self.icon)
-		
-		vbox = wx.BoxSizer(wx.VERTICAL)
-		
-		self.file_listctrl = wx.ListCtrl(self, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
-		self.file_listctrl.InsertColumn(0, "File Name")
-		self.file_listctrl.InsertColumn(1, "Date Created")
-		self.file_listctrl.SetColumnWidth(0, 280)  # Adjust width of first column
-		self.file_listctrl.SetColumnWidth(1, 160)  # Adjust width of second column
-
-		vbox.Add(self.file_listctrl, 1, wx.EXPAND | wx.ALL, 10)
-		
-		upload_button = wx.Button(self, label="Upload Selected File")
-		upload_button.Bind(wx.EVT_BUTTON, self.on_upload)
-		vbox.Add(upload_button, 0, wx.ALIGN_CENTER | wx.ALL, 10)
-		
-		close_button = wx.Button(self, label="Close")
-		close_button.Bind(wx.EVT_BUTTON, self.on_close)
-		vbox.Add(close_button, 0, wx.ALIGN_CENTER | wx.ALL, 10)
-		
-		self.populate_file_list()
-		self.SetSizer(vbox)
-		
-		self.Bind(wx.EVT_CLOSE, self.OnClose)
-		self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy)
-
-	def OnClose(self, event):
-		#print('In OnClose')
-		event.Skip()
-
-	def OnDestroy(self, event):
-		#print('In OnDestroy')
-		event.Skip()
-
-	def _close(self):
-		#print('In _close')
-		self.Hide()
-		self.Destroy()
-
-	def on_close(self, event):
-		#print('In On_Close')
-		self.Hide()
-
-	def populate_file_list(self):
-		directory = "C:\\Program Files (x86)\\World of Warcraft\\_retail_\\Logs"
-		files = [f for f in os.listdir(directory) if f.startswith("WoWCombatLog-") and f.endswith(".txt")]
-		
-		# Sort files based on creation time
-		files.sort(key=lambda x: os.path.getctime(os.path.join(directory, x)))
-		
-		for file_name in files:
-			file_path = os.path.join(directory, file_name)
-			created_time = os.path.getctime(file_path)
-			created_date = datetime.datetime.fromtimestamp(created_time).strftime("%Y-%m-%d %H:%M:%S")
-			index = self.file_listctrl.InsertItem(self.file_listctrl.GetItemCount(), file_name)
-			self.file_listctrl.SetItem(index, 1, created_date)
-
-	def on_upload(self, event):
-		selection = self.file_listctrl.GetFirstSelected()
-		if selection != wx.NOT_FOUND:
-			file_name = self.file_listctrl.GetItemText(selection)
-			file_path = os.path.join("C:\\Program Files (x86)\\World of Warcraft\\_retail_\\Logs", file_name)
-			upload_file(file_path)
-		else:
-			#wx.MessageBox("Please select a file to upload.", "No file selected", wx.OK | wx.ICON_INFORMATION)
-			show_tray_message("No file selected", f"Please select a file to upload")
-
-class NewLogFileHandler(FileSystemEventHandler):
-	def on_created(self, event):
-		if not event.is_directory and event.src_path.endswith(".txt") and "WoWCombatLog-" in event.src_path:
-			#print(f"New log file detected: {event.src_path}")
-			show_tray_message("Auto Upload", f"New log file detected {os.path.basename(event.src_path)}")
-			upload_file(event.src_path)
-
-# Function to setup file monitoring
-def setup_file_monitoring():
-	path_to_watch = "C:\\Program Files (x86)\\World of Warcraft\\_retail_\\Logs"
-	event_handler = NewLogFileHandler()
-	observer = Observer()
-	observer.schedule(event_handler, path=path_to_watch, recursive=False)
-	observer.start()
-
-class InfoFrame(wx.Frame):
-	def __init__(self, icon):
-		super().__init__(None, title="Arena Logs Uploader", size=(400, 200))
-		self.icon = icon
-		self.icon_path = iconpath  # Assuming 'exe_dir' is defined in the main part of your script
-		self.SetIcon(wx.Icon(self.icon_path, wx.BITMAP_TYPE_ICO))  # Set the frame icon
-		panel = wx.Panel(self)
-		vbox = wx.BoxSizer(wx.VERTICAL)
-		label = wx.StaticText(panel, label="This application monitors the World of Warcraft logs directory for new log files and uploads them to the server when detected. GitHub repo can be seen here https://github.com/Ulminia/PvP-Lookup-App", style=wx.ST_ELLIPSIZE_MIDDLE)
-		label.Wrap(380)  # Set the width to wrap at (adjust as needed)
-		vbox.Add(label, 0, wx.ALL | wx.EXPAND, 10)
-		close_button = wx.Button(panel, label="Close")
-		close_button.Bind(wx.EVT_BUTTON, self.on_close)
-		vbox.Add(close_button, 0, wx.ALL | wx.CENTER, 10)
-		panel.SetSizer(vbox)
-
-	def on_close(self, event):
-		self.Hide()
-
-class MyApp(wx.App):
-	def OnInit(self):
-		# You can initialize file monitoring here if needed
-		setup_file_monitoring()
-		#show_tray_message("Arenalogs", f"Arenalogs is running in the background monitoring for new files")
-		return True
-
-def main():
+# Function to start the uploads and the watcher, with or without the tray icon
+def start_uploader():
+	uploads.upload_queue.start()
+	uploads.setup_file_monitoring()
+	#show_tray_message("Arenalogs", f"Arenalogs is running in the background monitoring for new files")
+
+# Function to run without any GUI until Ctrl+C or the process is stopped
+def run_headless():
+	start_uploader()
+	try:
+		while True:
+			time.sleep(60)
+	except KeyboardInterrupt:
+		pass
+	uploads.stop()
+
+def run_tray():
+	import pystray
+	from PIL import Image
+	start_uploader()
 	# Get the path to the directory containing the executable or the script file
 	icon = pystray.Icon("Arena Logs Combat Log Uploader")
 	icon.icon = Image.open(iconpath)
@@ -216,8 +108,25 @@ def main():
 	manual_upload_item = pystray.MenuItem("Manual Upload", show_manual_upload_dialog)
 	icon.menu = (info_item, manual_upload_item, quit_item)
 
-	app = MyApp(False)
 	icon.run()
 
+def main():
+	global headless
+	parser = argparse.ArgumentParser(description="Arena Logs combat log uploader")
+	parser.add_argument('--headless', action='store_true', help="watch and upload without the tray icon or any windows")
+	parser.add_argument('--logs', action='append', help="combat log folder to watch, can be given more than once, every install found by default")
+	parser.add_argument('--quiet-seconds', type=float, default=uploads.quiet_seconds, help="how long a log has to stay unchanged before it is uploaded")
+	parser.add_argument('--binary-uploads', action='store_true', help="send the smaller but slower to encode binary log format to servers that offer it")
+	args = parser.parse_args()
+	headless = args.headless
+	uploads.quiet_seconds = args.quiet_seconds
+	uploader.binary_uploads = args.binary_uploads
+	if args.logs:
+		uploads.logs_directories = args.logs
+	if headless:
+		run_headless()
+	else:
+		run_tray()
+
 if __name__ == "__main__":
 	main()
\ No newline at end of file
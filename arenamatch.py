@@ -0,0 +1,159 @@
+import os
+import re
+import mmap
+import metrics
+from uploader import post_file, is_duplicate
+from matchsummary import send_summary
+
+# Finding the arena matches in a combat log. The upload servers only look at
+# arena matches, which are usually a small part of a log full of raids and
+# dungeons, so only those byte ranges are sent, one request per match.
+
+# Event names as they appear after the two spaces following the timestamp
+MATCH_START = b'  ARENA_MATCH_START,'
+MATCH_END = b'  ARENA_MATCH_END,'
+LOG_VERSION = b'  COMBAT_LOG_VERSION,'
+# Any of the three, searched for over the mapped file without reading it in
+MARKER = re.compile(rb'  (?:ARENA_MATCH_START|ARENA_MATCH_END|COMBAT_LOG_VERSION),')
+
+# One arena match in a log. start and end are byte offsets of the
+# ARENA_MATCH_START line and the end of the ARENA_MATCH_END line, the
+# COMBATANT_INFO lines for the match sit between them. header is the byte
+# range of the COMBAT_LOG_VERSION line the match was logged under, which the
+# server needs to read the match.
+class ArenaMatch:
+	def __init__(self, start, header=None):
+		self.start = start
+		self.end = None
+		self.header = header
+		self.complete = False
+
+	# Byte ranges to send for this match
+	def ranges(self):
+		if self.header is None:
+			return [(self.start, self.end)]
+		return [self.header, (self.start, self.end)]
+
+	# Plain lists for keeping matches in a JSON index
+	def to_list(self):
+		return [self.start, self.end, list(self.header) if self.header else None, self.complete]
+
+	@classmethod
+	def from_list(cls, values):
+		start, end, header, complete = values
+		match = cls(start, tuple(header) if header else None)
+		match.end = end
+		match.complete = complete
+		return match
+
+	def __repr__(self):
+		return f"ArenaMatch({self.start}, {self.end}, complete={self.complete})"
+
+# Byte range of the first line if it is a COMBAT_LOG_VERSION line
+def log_header(file_path):
+	with open(file_path, 'rb') as f:
+		line = f.readline()
+	if LOG_VERSION in line and line.endswith(b'\n'):
+		return (0, len(line))
+	return None
+
+# Find the arena matches in a log, starting at byte offset start which must be
+# the start of a line. Returns the matches and the offset to carry on from
+# next time, which is the start of a match that has not ended yet or the end
+# of the last complete line. A match cut short by another ARENA_MATCH_START is
+# returned with complete set to False.
+def find_matches(file_path, start=0, header=None):
+	matches, resume, _ = scan_matches(file_path, start, header)
+	return matches, resume
+
+# find_matches that also returns the log version header in effect at the
+# resume offset, for carrying on later. The file is memory mapped and searched
+# with MARKER, so only the few lines that mark a match or a new log version
+# are ever copied out of it.
+def scan_matches(file_path, start=0, header=None):
+	if header is None:
+		header = log_header(file_path)
+	matches = []
+	current = None
+	with open(file_path, 'rb') as f:
+		size = os.fstat(f.fileno()).st_size
+		if size <= start:
+			return matches, start, header
+		with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+			# Last line is still being written
+			limit = mm.rfind(b'\n', start) + 1
+			if limit <= 0:
+				return matches, start, header
+			line_end = start
+			for found in MARKER.finditer(mm, start, limit):
+				if found.start() < line_end:
+					# Second marker on a line that was already handled
+					continue
+				line_start = mm.rfind(b'\n', start, found.start()) + 1 or start
+				line_end = mm.find(b'\n', found.end(), limit) + 1
+				name = found.group()
+				if name == MATCH_START:
+					if current is not None:
+						current.end = line_start
+						matches.append(current)
+					current = ArenaMatch(line_start, header)
+				elif name == MATCH_END:
+					if current is not None:
+						current.end = line_end
+						current.complete = True
+						matches.append(current)
+						current = None
+				else:
+					header = (line_start, line_end)
+	if current is not None:
+		return matches, current.start, current.header
+	return matches, limit, header
+
+# Hash of a match and whether it still needs uploading. Only the match
+# itself is hashed so the same match found in two overlapping logs is only
+# sent once.
+def match_digest(file_path, match, index=None):
+	if index is None:
+		return None, True
+	with metrics.timed(file_path, 'hash'):
+		digest = index.range_digest(file_path, [(match.start, match.end)])
+	return digest, not index.known(digest, file_path)
+
+def post_match(url, file_path, match, digest=None, index=None):
+	response = post_file(url, file_path, ranges=match.ranges())
+	if index is not None and (response.status_code == 200 or is_duplicate(response)):
+		index.add(digest, file_path)
+	return response
+
+# Upload one match. With a HashIndex the match is skipped, and None returned,
+# if it was uploaded before. With summary set, the match summary is sent
+# ahead of the match itself.
+def upload_match(url, file_path, match, index=None, summary=False):
+	digest, new = match_digest(file_path, match, index)
+	if not new:
+		return None
+	if summary:
+		send_summary(url, file_path, match, digest)
+	return post_match(url, file_path, match, digest, index)
+
+# Upload every complete arena match in a log as its own request. Returns the
+# responses for the matches that were sent, an empty list if there were none.
+# With an UploadEngine the matches go up side by side, with a MatchIndex the
+# log is only scanned where it has changed since it was last looked at. With
+# summaries set, the summaries of all new matches are sent before any of the
+# raw matches, which are much bigger and can follow at their own pace.
+def upload_matches(url, file_path, index=None, engine=None, match_index=None, summaries=False):
+	if match_index is not None:
+		matches = match_index.matches(file_path)
+	else:
+		matches, _ = find_matches(file_path)
+	if engine is not None:
+		run = engine.map
+	else:
+		run = lambda fn, arg_list: [fn(*args) for args in arg_list]
+	matches = [match for match in matches if match.complete]
+	checked = run(match_digest, [(file_path, match, index) for match in matches])
+	jobs = [(match, digest) for match, (digest, new) in zip(matches, checked) if new]
+	if summaries:
+		run(send_summary, [(url, file_path, match, digest) for match, digest in jobs])
+	return run(post_match, [(url, file_path, match, digest, index) for match, digest in jobs])
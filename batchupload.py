@@ -0,0 +1,158 @@
+import os
+import time
+import threading
+from collections import deque, namedtuple
+from uploader import watch_progress, unwatch_progress
+
+# Uploading a batch of logs picked in the manual upload dialog, with progress
+# the dialog can show. The logs go through the app's UploadQueue like the ones
+# the watcher finds, so they survive a restart, are tried again if they fail
+# and never upload twice at once, and the batch follows its files' jobs as
+# the queue's workers run them. Progress is taken from the bytes the uploader
+# reads for sending and handed to the GUI thread a few times a second.
+# Seconds between progress updates
+PROGRESS_INTERVAL = 0.25
+# Seconds of history behind the bytes/s figure
+RATE_WINDOW = 5
+
+# How a file's progress bar reads when it is not uploading
+STATE_LABELS = {
+	'waiting': 'Waiting',
+	'done': 'Done',
+	'failed': 'Failed',
+	'cancelled': 'Cancelled',
+}
+
+FileProgress = namedtuple('FileProgress', ['file_path', 'done', 'total', 'state'])
+BatchProgress = namedtuple('BatchProgress', ['files', 'done', 'total', 'rate', 'eta', 'finished'])
+
+def format_size(size):
+	for unit in ("B", "KB", "MB", "GB"):
+		if size < 1024 or unit == "GB":
+			return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+		size /= 1024
+
+def format_eta(seconds):
+	if seconds is None:
+		return "--:--"
+	minutes, seconds = divmod(int(seconds), 60)
+	hours, minutes = divmod(minutes, 60)
+	if hours:
+		return f"{hours}:{minutes:02d}:{seconds:02d}"
+	return f"{minutes}:{seconds:02d}"
+
+# One line of text for the whole batch, "12.5 MB of 40.1 MB, 2.1 MB/s, 0:13 left"
+def describe(progress):
+	text = f"{format_size(progress.done)} of {format_size(progress.total)}, {format_size(progress.rate)}/s"
+	if progress.finished:
+		return text
+	return f"{text}, {format_eta(progress.eta)} left"
+
+class BatchUpload:
+	# The files go on queue, the app's UploadQueue, like any other upload.
+	# size_fn(file_path) is how many bytes an upload is expected to send, it
+	# is worked out on the queue's worker once the file's job starts. Progress
+	# is given to on_progress(BatchProgress) and each finished file to
+	# on_file_done((file_path, ok)), both through dispatch like LogScanner.
+	def __init__(self, files, queue, size_fn, dispatch, on_progress, on_file_done=None):
+		self.files = list(files)
+		self.queue = queue
+		self.size_fn = size_fn
+		self.dispatch = dispatch
+		self.on_progress = on_progress
+		self.on_file_done = on_file_done
+		self.lock = threading.Lock()
+		self.done = {file_path: 0 for file_path in self.files}
+		# Until a file's job starts its size on disk stands in for the total
+		self.totals = {}
+		self.states = {file_path: 'waiting' for file_path in self.files}
+		self.samples = deque()
+		self.cancelled = False
+		self.finished = threading.Event()
+
+	def start(self):
+		self.queue.add_watcher(self)
+		threading.Thread(target=self.enqueue, daemon=True).start()
+		threading.Thread(target=self.monitor, daemon=True).start()
+
+	def enqueue(self):
+		for file_path in self.files:
+			if self.cancelled:
+				return
+			try:
+				size = max(os.path.getsize(file_path), 1)
+			except OSError:
+				size = 1
+			with self.lock:
+				self.totals.setdefault(file_path, size)
+			self.queue.put(file_path)
+
+	# Files that have not started yet are taken off the queue, the ones
+	# uploading finish
+	def cancel(self):
+		self.cancelled = True
+		with self.lock:
+			waiting = [file_path for file_path, state in self.states.items() if state == 'waiting']
+			for file_path in waiting:
+				self.states[file_path] = 'cancelled'
+		self.queue.cancel(waiting)
+		self.check_finished()
+
+	def job_started(self, file_path):
+		with self.lock:
+			if self.states.get(file_path) != 'waiting':
+				return
+			self.states[file_path] = 'uploading'
+		try:
+			total = max(self.size_fn(file_path), 1)
+		except OSError:
+			total = 1
+		with self.lock:
+			self.totals[file_path] = total
+
+		def progress(size):
+			with self.lock:
+				self.done[file_path] = min(self.done[file_path] + size, self.totals[file_path])
+
+		watch_progress(file_path, progress)
+
+	# A file that was already uploading when the batch was made is done
+	# when that upload is
+	def job_finished(self, file_path, ok):
+		with self.lock:
+			if self.states.get(file_path) not in ('waiting', 'uploading'):
+				return
+			self.totals.setdefault(file_path, 1)
+			self.states[file_path] = 'done' if ok else 'failed'
+			# Skipped matches and compression make the real count come up short
+			self.done[file_path] = self.totals[file_path]
+		unwatch_progress(file_path)
+		if self.on_file_done is not None:
+			self.dispatch(self.on_file_done, (file_path, ok))
+		self.check_finished()
+
+	def check_finished(self):
+		with self.lock:
+			if any(state in ('waiting', 'uploading') for state in self.states.values()):
+				return
+		self.queue.remove_watcher(self)
+		self.finished.set()
+
+	def snapshot(self):
+		now = time.monotonic()
+		with self.lock:
+			files = [FileProgress(file_path, self.done[file_path], self.totals.get(file_path, 1), self.states[file_path]) for file_path in self.files]
+		done = sum(f.done for f in files)
+		total = sum(f.total for f in files if f.state != 'cancelled')
+		self.samples.append((now, done))
+		while len(self.samples) > 2 and now - self.samples[1][0] >= RATE_WINDOW:
+			self.samples.popleft()
+		first_time, first_done = self.samples[0]
+		rate = (done - first_done) / (now - first_time) if now > first_time else 0
+		eta = (total - done) / rate if rate > 0 else None
+		return BatchProgress(files, done, total, rate, eta, self.finished.is_set())
+
+	def monitor(self):
+		while not self.finished.wait(PROGRESS_INTERVAL):
+			self.dispatch(self.on_progress, self.snapshot())
+		self.dispatch(self.on_progress, self.snapshot())
@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import zlib
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import binlog
+from uploader import GZIP_LEVEL, ZSTD_LEVEL, zstandard
+from bench_parser import write_log
+
+# Size of the binary event encoding against the text log, both on their own
+# and under the compression uploads use, after checking that the encoding
+# decodes back to the same text.
+#
+#   python bench/bench_binlog.py --size-mb 20
+
+def gzip_size(data):
+	compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+	return len(compressor.compress(data) + compressor.flush())
+
+def zstd_size(data):
+	return len(zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data))
+
+def report(name, size, base):
+	print(f"{name:20} {size:>12} bytes {size / base * 100:7.1f}%", flush=True)
+
+def main():
+	parser = argparse.ArgumentParser(description="Binary event encoding benchmark")
+	parser.add_argument('--size-mb', type=int, default=20)
+	parser.add_argument('--log', help="use an existing combat log instead of a synthetic one")
+	args = parser.parse_args()
+	path = args.log
+	if path is None:
+		path = os.path.join(tempfile.gettempdir(), f"bench-combatlog-{args.size_mb}.txt")
+		if not os.path.exists(path):
+			write_log(path, args.size_mb)
+	with open(path, 'rb') as f:
+		text = f.read().replace(b'\r\n', b'\n')
+	start = time.perf_counter()
+	encoded = binlog.encode(text)
+	elapsed = time.perf_counter() - start
+	print(f"{path}: {len(text) / 1e6:.1f} MB, encoded at {len(text) / elapsed / 1e6:.1f} MB/s", flush=True)
+	start = time.perf_counter()
+	decoded = binlog.decode(encoded)
+	elapsed = time.perf_counter() - start
+	if decoded != text:
+		print("Round trip FAILED", flush=True)
+		sys.exit(1)
+	print(f"Round trip ok, decoded at {len(text) / elapsed / 1e6:.1f} MB/s", flush=True)
+	base = len(text)
+	report('text', base, base)
+	report('text + gzip', gzip_size(text), base)
+	if zstandard is not None:
+		report('text + zstd', zstd_size(text), base)
+	report('binary', len(encoded), base)
+	report('binary + gzip', gzip_size(encoded), base)
+	if zstandard is not None:
+		report('binary + zstd', zstd_size(encoded), base)
+
+if __name__ == "__main__":
+	main()
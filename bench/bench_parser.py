@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import combatlog
+from loggen import cached_log
+
+# Throughput of combatlog against reading the log line by line with
+# str.split, on a synthetic log from loggen.py. Each combatlog pass is
+# measured against a baseline that does the same work: finding every event
+# name, and splitting every line into its fields. Timestamps and full Event
+# objects have no baseline and are shown on their own.
+#
+#   python bench/bench_parser.py --size-mb 200
+
+# Line by line with str.split, the event name of every line
+def baseline_names(path):
+	count = 0
+	with open(path, 'r', encoding='utf-8') as f:
+		for line in f:
+			event = line.split('  ', 1)[1].split(',', 1)[0]
+			count += 1
+	return count
+
+# Line by line with str.split, every field of every line
+def baseline_fields(path):
+	count = 0
+	with open(path, 'r', encoding='utf-8') as f:
+		for line in f:
+			timestamp, rest = line.rstrip('\n').split('  ', 1)
+			fields = rest.split(',')
+			count += 1
+	return count
+
+# Columnar batches, event names only
+def batches(path):
+	count = 0
+	for batch in combatlog.read_batches(path):
+		count += len(batch)
+	return count
+
+# Columnar batches with the fields of every line split
+def batches_fields(path):
+	count = 0
+	for batch in combatlog.read_batches(path):
+		fields = batch.fields
+		for i in range(len(batch)):
+			fields(i)
+		count += len(batch)
+	return count
+
+# Columnar batches with every timestamp decoded
+def batches_timestamps(path):
+	count = 0
+	for batch in combatlog.read_batches(path):
+		count += len(batch.timestamps())
+	return count
+
+# Full Event objects, timestamps and fields decoded for every line
+def events(path):
+	count = 0
+	for event in combatlog.parse_events(path):
+		count += 1
+	return count
+
+def run(name, fn, path, size):
+	start = time.perf_counter()
+	lines = fn(path)
+	elapsed = time.perf_counter() - start
+	print(f"{name:22} {lines:>10} lines {elapsed:8.2f} s {size / elapsed / 1e6:9.1f} MB/s", flush=True)
+	return elapsed
+
+def main():
+	parser = argparse.ArgumentParser(description="Combat log parser benchmark")
+	parser.add_argument('--size-mb', type=int, default=100)
+	parser.add_argument('--log', help="use an existing combat log instead of a synthetic one")
+	args = parser.parse_args()
+	path = args.log
+	if path is None:
+		path = cached_log(tempfile.gettempdir(), args.size_mb)
+	size = os.path.getsize(path)
+	print(f"{path}: {size / 1e6:.1f} MB", flush=True)
+	names_base = run('names, str.split', baseline_names, path, size)
+	names = run('names, batches', batches, path, size)
+	fields_base = run('fields, str.split', baseline_fields, path, size)
+	fields = run('fields, batches', batches_fields, path, size)
+	run('batches + timestamps', batches_timestamps, path, size)
+	run('full events', events, path, size)
+	print(f"event names are {names_base / names:.1f}x the baseline, fields {fields_base / fields:.1f}x", flush=True)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+	import psutil
+except ImportError:
+	# Only needed for RSS where there is no /proc, on Windows
+	psutil = None
+
+# Startup benchmark for the uploader. The app is launched watching an empty
+# logs folder, the time until it prints "Watching" is the time to watching,
+# and its resident memory after a few idle seconds is the idle RSS. Each run
+# gets a fresh state folder so nothing is carried over. The import time of
+# each GUI toolkit that is installed is measured too, that is what a launch
+# that does not load them saves. Like bench_upload.py, results can be saved
+# and compared, with the exit code 1 on a regression.
+#
+#   python bench/bench_startup.py --runs 5 --save bench/startup.json
+#   python bench/bench_startup.py --compare bench/startup.json
+
+# How much worse than the baseline counts as a regression
+THRESHOLD = 0.15
+# GUI modules the uploader can do without
+GUI_MODULES = ['wx', 'PyQt5.QtWidgets', 'pystray', 'PIL.Image', 'win10toast', 'plyer']
+
+def rss_mb(pid):
+	if psutil is not None:
+		return psutil.Process(pid).memory_info().rss / 1e6
+	with open(f"/proc/{pid}/status", 'r') as f:
+		for line in f:
+			if line.startswith('VmRSS:'):
+				return int(line.split()[1]) * 1024 / 1e6
+	return None
+
+# Launch once, return seconds to watching and idle RSS in MB
+def launch(command, idle):
+	with tempfile.TemporaryDirectory(prefix='arenalogs-startup-') as state_dir:
+		env = dict(os.environ, LOCALAPPDATA=state_dir)
+		start = time.perf_counter()
+		process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+		try:
+			for line in process.stdout:
+				if line.startswith('Watching'):
+					break
+			else:
+				raise RuntimeError(f"{' '.join(command)} exited before watching")
+			watching = time.perf_counter() - start
+			time.sleep(idle)
+			return watching, rss_mb(process.pid)
+		finally:
+			process.kill()
+			process.wait()
+			process.stdout.close()
+
+def import_seconds(module):
+	code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+	result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+	if result.returncode != 0:
+		return None
+	return float(result.stdout)
+
+def regressions(result, base, threshold):
+	flags = []
+	if result['watching_s'] > base['watching_s'] * (1 + threshold):
+		flags.append(f"watching {base['watching_s']:.3f} -> {result['watching_s']:.3f} s")
+	if result['rss_mb'] and base['rss_mb'] and result['rss_mb'] > base['rss_mb'] * (1 + threshold):
+		flags.append(f"rss {base['rss_mb']:.1f} -> {result['rss_mb']:.1f} MB")
+	return flags
+
+def main():
+	parser = argparse.ArgumentParser(description="Uploader startup benchmark")
+	parser.add_argument('--script', default='arenalogsgg.py')
+	parser.add_argument('--runs', type=int, default=5)
+	parser.add_argument('--idle', type=float, default=3, help="seconds to wait before reading RSS")
+	parser.add_argument('--save', help="write the results to this JSON file")
+	parser.add_argument('--compare', help="flag regressions against results saved with --save")
+	parser.add_argument('--threshold', type=float, default=THRESHOLD)
+	args = parser.parse_args()
+	baseline = None
+	if args.compare:
+		with open(args.compare, 'r', encoding='utf-8') as f:
+			baseline = json.load(f)['results']
+	# Every launch watches the same empty folder, removed once they are done
+	with tempfile.TemporaryDirectory(prefix='arenalogs-logs-') as logs:
+		script = [sys.executable, os.path.join(ROOT, args.script), '--logs', logs]
+		launches = {'headless': script + ['--headless']}
+		if importlib.util.find_spec('pystray') is not None:
+			launches['tray'] = script
+		results = {}
+		failed = False
+		for name, command in launches.items():
+			runs = [launch(command, args.idle) for _ in range(args.runs)]
+			rss = [value for _, value in runs if value is not None]
+			results[name] = {
+				'watching_s': statistics.median(watching for watching, _ in runs),
+				'rss_mb': statistics.median(rss) if rss else None,
+			}
+			flags = []
+			if baseline is not None and name in baseline:
+				flags = regressions(results[name], baseline[name], args.threshold)
+			failed = failed or bool(flags)
+			rss_text = f"{results[name]['rss_mb']:8.1f} MB idle RSS" if rss else "      -- idle RSS"
+			print(f"{name:10} {results[name]['watching_s']:8.3f} s to watching {rss_text} {'REGRESSION: ' + ' '.join(flags) if flags else ''}", flush=True)
+	print("GUI imports the headless launch skips:", flush=True)
+	for module in GUI_MODULES:
+		seconds = import_seconds(module)
+		print(f"  {module:18} {'not installed' if seconds is None else f'{seconds:.3f} s'}", flush=True)
+	if args.save:
+		with open(args.save, 'w', encoding='utf-8') as f:
+			json.dump({'script': args.script, 'results': results}, f, indent=1)
+	if failed:
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
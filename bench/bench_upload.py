@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Checkpoints and other upload state go to a folder of their own, so the
+# benchmark never touches the app's
+STATE_DIR = tempfile.mkdtemp(prefix='arenalogs-bench-')
+os.environ['LOCALAPPDATA'] = STATE_DIR
+import uploader
+import metrics
+from arenamatch import upload_matches
+from uploadengine import UploadEngine
+from loggen import cached_log
+
+# End to end upload benchmark. A synthetic log from loggen.py is uploaded to
+# devserver.py, run in its own process so its work does not count against
+# the client, once per upload mode. For each mode it reports the median time
+# of an upload, log MB/s, CPU seconds of this process, the bytes that went
+# over the wire and the peak Python memory under tracemalloc (measured in a
+# run of its own, tracemalloc slows everything down). Results can be saved
+# and later runs compared against them, anything that got slower or bigger
+# by more than the threshold is flagged and the exit code is 1.
+#
+#   python bench/bench_upload.py --size-mb 50 --save bench/baseline.json
+#   python bench/bench_upload.py --size-mb 50 --compare bench/baseline.json
+
+# How much worse than the baseline counts as a regression
+THRESHOLD = 0.15
+
+def free_port():
+	with socket.socket() as s:
+		s.bind(('127.0.0.1', 0))
+		return s.getsockname()[1]
+
+def start_server(port, upload_dir, latency):
+	command = [sys.executable, os.path.join(ROOT, 'devserver.py'), '--port', str(port), '--upload-dir', upload_dir, '--binary', '--quiet', '--latency', str(latency)]
+	server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+	deadline = time.monotonic() + 10
+	while time.monotonic() < deadline:
+		try:
+			socket.create_connection(('127.0.0.1', port), timeout=1).close()
+			return server
+		except OSError:
+			time.sleep(0.05)
+	server.kill()
+	raise RuntimeError("devserver did not start")
+
+# Modes take the url and log path and return the responses
+def send(encoding, stream=True, binary=False):
+	def run(url, file_path):
+		return [uploader.send_file(url, file_path, encoding, stream, binary=binary)]
+	return run
+
+def resumable(upload_dir):
+	def run(url, file_path):
+		# Start from nothing every time, on both ends
+		uid = uploader.upload_id(file_path)
+		uploader.remove_checkpoint(uid)
+		part_file = os.path.join(upload_dir, f"{uid}.part")
+		if os.path.exists(part_file):
+			os.remove(part_file)
+		return [uploader.resumable_upload(url, file_path)]
+	return run
+
+def arena(engine=None):
+	def run(url, file_path):
+		return upload_matches(url, file_path, engine=engine)
+	return run
+
+def upload_modes(upload_dir):
+	modes = {
+		'buffered': send('identity', stream=False),
+		'stream': send('identity'),
+		'gzip': send('gzip'),
+	}
+	if uploader.zstandard is not None:
+		modes['zstd'] = send('zstd')
+	modes['binary'] = send(uploader.supported_encodings()[0], binary=True)
+	modes['resumable'] = resumable(upload_dir)
+	modes['arena'] = arena()
+	modes['arena-engine'] = arena(UploadEngine())
+	return modes
+
+# Run one upload with the negotiated state of earlier runs forgotten
+def run_once(fn, url, file_path):
+	uploader.accepted_encodings.clear()
+	uploader.binary_urls.clear()
+	metrics.begin(file_path, 'bench')
+	responses = fn(url, file_path)
+	entry = metrics.end(file_path, 'bench')
+	failed = [getattr(r, 'status_code', None) for r in responses if r is None or r.status_code != 200]
+	if failed:
+		raise RuntimeError(f"Upload failed with {failed}")
+	return entry
+
+def measure(fn, url, file_path, repeat):
+	times = []
+	cpu = 0.0
+	for _ in range(repeat):
+		start_cpu = time.process_time()
+		start = time.perf_counter()
+		entry = run_once(fn, url, file_path)
+		times.append(time.perf_counter() - start)
+		cpu += time.process_time() - start_cpu
+	tracemalloc.start()
+	run_once(fn, url, file_path)
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	seconds = statistics.median(times)
+	return {
+		'seconds': seconds,
+		'max_seconds': max(times),
+		'mb_s': os.path.getsize(file_path) / seconds / 1e6,
+		'cpu_s': cpu / repeat,
+		'sent_mb': entry['bytes_sent'] / 1e6,
+		'requests': entry['requests'],
+		'peak_mb': peak / 1e6,
+	}
+
+def report(name, result, flags=()):
+	print(f"{name:14} {result['seconds']:8.3f} s {result['max_seconds']:8.3f} s {result['mb_s']:8.1f} MB/s {result['cpu_s']:7.3f} s cpu {result['sent_mb']:8.2f} MB sent {result['requests']:5} req {result['peak_mb']:8.2f} MB peak {' '.join(flags)}", flush=True)
+
+# What got worse than the baseline by more than threshold
+def regressions(result, base, threshold):
+	flags = []
+	if result['mb_s'] < base['mb_s'] * (1 - threshold):
+		flags.append(f"throughput {base['mb_s']:.1f} -> {result['mb_s']:.1f} MB/s")
+	if result['cpu_s'] > base['cpu_s'] * (1 + threshold):
+		flags.append(f"cpu {base['cpu_s']:.3f} -> {result['cpu_s']:.3f} s")
+	if result['peak_mb'] > base['peak_mb'] * (1 + threshold):
+		flags.append(f"memory {base['peak_mb']:.2f} -> {result['peak_mb']:.2f} MB")
+	if result['sent_mb'] > base['sent_mb'] * (1 + threshold):
+		flags.append(f"sent {base['sent_mb']:.2f} -> {result['sent_mb']:.2f} MB")
+	return flags
+
+def main():
+	parser = argparse.ArgumentParser(description="End to end upload benchmark")
+	parser.add_argument('--size-mb', type=float, default=20)
+	parser.add_argument('--arena-share', type=float, default=0.1, help="part of the log in arena matches, 0 to 1")
+	parser.add_argument('--match-kb', type=int, default=1500)
+	parser.add_argument('--log', help="use an existing combat log instead of a synthetic one")
+	parser.add_argument('--repeat', type=int, default=3)
+	parser.add_argument('--latency', type=float, default=0.0, help="seconds the server waits before answering")
+	parser.add_argument('--modes', help="comma separated modes to run, all of them by default")
+	parser.add_argument('--save', help="write the results to this JSON file")
+	parser.add_argument('--compare', help="flag regressions against results saved with --save")
+	parser.add_argument('--threshold', type=float, default=THRESHOLD)
+	args = parser.parse_args()
+	file_path = args.log or cached_log(tempfile.gettempdir(), args.size_mb, args.arena_share, args.match_kb)
+	baseline = None
+	if args.compare:
+		with open(args.compare, 'r', encoding='utf-8') as f:
+			baseline = json.load(f)['results']
+	upload_dir = os.path.join(STATE_DIR, 'uploads')
+	port = free_port()
+	server = start_server(port, upload_dir, args.latency)
+	url = f"http://127.0.0.1:{port}/api/upload/"
+	print(f"{file_path}: {os.path.getsize(file_path) / 1e6:.1f} MB, {args.repeat} runs per mode", flush=True)
+	results = {}
+	failed = False
+	try:
+		modes = upload_modes(upload_dir)
+		names = args.modes.split(',') if args.modes else list(modes)
+		for name in names:
+			results[name] = measure(modes[name], url, file_path, args.repeat)
+			flags = []
+			if baseline is not None and name in baseline:
+				flags = regressions(results[name], baseline[name], args.threshold)
+			failed = failed or bool(flags)
+			report(name, results[name], ['REGRESSION:'] + flags if flags else [])
+	finally:
+		server.terminate()
+		server.wait()
+		shutil.rmtree(STATE_DIR, ignore_errors=True)
+	if args.save:
+		with open(args.save, 'w', encoding='utf-8') as f:
+			json.dump({'log': os.path.basename(file_path), 'results': results}, f, indent=1)
+	if failed:
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,213 @@
+import os
+import random
+import argparse
+
+# Synthetic WoWCombatLog files for the benchmarks. The log is open world and
+# raid combat with arena matches spread through it, arena_share of the bytes
+# being in matches of about match_kb each. Matches have the lines the
+# uploader and the match summaries look at, ARENA_MATCH_START and _END,
+# COMBATANT_INFO for every player, damage, healing and deaths, with the same
+# field layout as a real log with advanced logging on. Names include a few
+# accented ones so the text is not plain ASCII.
+#
+#   python bench/loggen.py WoWCombatLog-bench.txt --size-mb 200 --arena-share 0.2
+
+HEADER = 'COMBAT_LOG_VERSION,21,ADVANCED_LOG_ENABLED,1,BUILD_VERSION,11.0.2,PROJECT_ID,1'
+DATE = '10/18/2026'
+
+REALMS = [(1092, 'Draenor'), (1096, 'Kazzak'), (1305, 'Ragnaros'), (3674, 'Twisting Nether'), (1403, 'Silvermoon')]
+SYLLABLES = ['ka', 'ri', 'mo', 'dan', 'thel', 'vy', 'zor', 'ae', 'lin', 'gro', 'mé', 'sha', 'ù', 'nar', 'ix']
+SPECS = [62, 63, 64, 65, 66, 70, 71, 72, 73, 102, 103, 104, 105, 250, 251, 252, 253, 254, 255, 256, 257, 258, 259, 260, 261, 262, 263, 264, 265, 266, 267, 268, 269, 270, 577, 581, 1467, 1468]
+ARENA_ZONES = [572, 617, 1134, 1505, 1552, 1672, 1825, 1911, 2167, 2373]
+DAMAGE_SPELLS = [(185358, 'Arcane Shot', 64), (19434, 'Aimed Shot', 1), (116, 'Frostbolt', 16), (133, 'Fireball', 4), (8092, 'Mind Blast', 32), (1329, 'Mutilate', 1), (100780, 'Tiger Palm', 1)]
+HEAL_SPELLS = [(774, 'Rejuvenation', 8), (2061, 'Flash Heal', 2), (8936, 'Regrowth', 8), (77472, 'Healing Wave', 8)]
+AURAS = [(186257, 'Aspect of the Cheetah', 1, 'BUFF'), (1784, 'Stealth', 1, 'BUFF'), (118, 'Polymorph', 64, 'DEBUFF'), (408, 'Kidney Shot', 1, 'DEBUFF')]
+CREATURES = [(225982, 'Target Dummy'), (215405, 'Anub\'arash'), (219430, 'Nerub-ar Soldier'), (214502, 'Web Weaver')]
+
+NO_UNIT = '0000000000000000'
+
+class Unit:
+	def __init__(self, guid, name, flags, level=80):
+		self.guid = guid
+		self.name = name
+		self.flags = flags
+		self.level = level
+		self.max_hp = 500000 if guid.startswith('Player') else 2000000
+		self.hp = self.max_hp
+
+def player(rng, flags='0x548'):
+	realm_id, realm = rng.choice(REALMS)
+	name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+	return Unit(f"Player-{realm_id}-{rng.getrandbits(32):08X}", f"{name}-{realm.replace(' ', '')}", flags)
+
+def creature(rng):
+	npc_id, name = rng.choice(CREATURES)
+	return Unit(f"Creature-0-3019-2657-13-{npc_id}-{rng.getrandbits(40):010X}", name, '0xa48', 82)
+
+class LogWriter:
+	def __init__(self, f, rng):
+		self.f = f
+		self.rng = rng
+		self.seconds = 20 * 3600
+		self.written = 0
+		self.lines = []
+
+	def stamp(self):
+		minute, second = divmod(self.seconds, 60)
+		hour, minute = divmod(int(minute), 60)
+		return f"{DATE} {hour % 24:02d}:{minute:02d}:{second:07.4f}-4"
+
+	def line(self, text, gap=0.05):
+		self.seconds += self.rng.random() * gap
+		self.lines.append(f"{self.stamp()}  {text}\n")
+		if len(self.lines) >= 1000:
+			self.flush()
+
+	def flush(self):
+		data = ''.join(self.lines).encode('utf-8')
+		self.f.write(data)
+		self.written += len(data)
+		self.lines = []
+
+	# Written so far, counting lines that are still buffered roughly
+	def position(self):
+		return self.written + len(self.lines) * 300
+
+	def advanced(self, unit):
+		rng = self.rng
+		return f"{unit.guid},{NO_UNIT},{unit.hp},{unit.max_hp},{rng.randint(0, 30000)},{rng.randint(0, 30000)},{rng.randint(0, 20000)},0,0,{rng.randint(0, 50000)},50000,0,{rng.uniform(-3000, 3000):.2f},{rng.uniform(-3000, 3000):.2f},2657,{rng.uniform(0, 6.28):.4f},{unit.level}"
+
+	def damage(self, source, target):
+		rng = self.rng
+		amount = rng.randint(5000, 90000)
+		target.hp = max(target.hp - amount, 0)
+		critical = '1' if rng.random() < 0.3 else 'nil'
+		if rng.random() < 0.2:
+			self.line(f"SWING_DAMAGE,{source.guid},\"{source.name}\",{source.flags},0x0,{target.guid},\"{target.name}\",{target.flags},0x0,{self.advanced(source)},{amount},{amount},-1,1,0,0,0,{critical},nil,nil")
+			return
+		spell_id, spell, school = rng.choice(DAMAGE_SPELLS)
+		self.line(f"SPELL_DAMAGE,{source.guid},\"{source.name}\",{source.flags},0x0,{target.guid},\"{target.name}\",{target.flags},0x0,{spell_id},\"{spell}\",0x{school:x},{self.advanced(target)},{amount},{amount},-1,{school},0,0,0,{critical},nil,nil")
+
+	def heal(self, source, target):
+		rng = self.rng
+		amount = rng.randint(5000, 60000)
+		overheal = max(target.hp + amount - target.max_hp, 0)
+		target.hp = min(target.hp + amount, target.max_hp)
+		spell_id, spell, school = rng.choice(HEAL_SPELLS)
+		event = 'SPELL_PERIODIC_HEAL' if spell_id == 774 else 'SPELL_HEAL'
+		self.line(f"{event},{source.guid},\"{source.name}\",{source.flags},0x0,{target.guid},\"{target.name}\",{target.flags},0x0,{spell_id},\"{spell}\",0x{school:x},{self.advanced(target)},{amount},{amount},{overheal},0,nil")
+
+	def aura(self, source, target):
+		spell_id, spell, school, kind = self.rng.choice(AURAS)
+		event = self.rng.choice(['SPELL_AURA_APPLIED', 'SPELL_AURA_REMOVED'])
+		self.line(f"{event},{source.guid},\"{source.name}\",{source.flags},0x0,{target.guid},\"{target.name}\",{target.flags},0x0,{spell_id},\"{spell}\",0x{school:x},{kind}")
+
+	def cast(self, source):
+		spell_id, spell, school = self.rng.choice(DAMAGE_SPELLS + HEAL_SPELLS)
+		self.line(f"SPELL_CAST_SUCCESS,{source.guid},\"{source.name}\",{source.flags},0x0,{NO_UNIT},nil,0x80000000,0x80000000,{spell_id},\"{spell}\",0x{school:x},{self.advanced(source)}")
+
+	def died(self, unit):
+		self.line(f"UNIT_DIED,{NO_UNIT},nil,0x80000000,0x80000000,{unit.guid},\"{unit.name}\",{unit.flags},0x0,0")
+
+	# Raid and open world combat until the log reaches end bytes
+	def world(self, end, group):
+		rng = self.rng
+		mobs = [creature(rng) for _ in range(4)]
+		self.line("ZONE_CHANGE,2657,\"Nerub-ar Palace\",16")
+		while self.position() < end:
+			source = rng.choice(group)
+			roll = rng.random()
+			if roll < 0.55:
+				self.damage(source, rng.choice(mobs))
+			elif roll < 0.75:
+				self.heal(source, rng.choice(group))
+			elif roll < 0.9:
+				self.aura(source, rng.choice(group))
+			else:
+				self.cast(source)
+
+	def combatant(self, unit, team, rating):
+		rng = self.rng
+		stats = ','.join(str(rng.randint(0, 20000)) for _ in range(21))
+		talents = ','.join(f"({rng.randint(60000, 120000)},{rng.randint(80000, 130000)},1)" for _ in range(8))
+		items = ','.join(f"({rng.randint(200000, 230000)},{rng.randint(580, 640)},(),(),())" for _ in range(6))
+		self.line(f"COMBATANT_INFO,{unit.guid},{team},{stats},{rng.choice(SPECS)},[{talents}],({rng.randint(1000, 6000)},{rng.randint(1000, 6000)},{rng.randint(1000, 6000)}),[{items}],[{unit.guid},{rng.choice(AURAS)[0]},1],{rng.randint(1, 500)},39,{rating},0", gap=0)
+
+	# One arena match of about size bytes
+	def arena(self, size):
+		rng = self.rng
+		end = self.position() + size
+		bracket = rng.choice([2, 3])
+		teams = [[player(rng) for _ in range(bracket)], [player(rng, '0x10548') for _ in range(bracket)]]
+		rating = rng.randint(1400, 2600)
+		self.line(f"ZONE_CHANGE,{rng.choice(ARENA_ZONES)},\"Arena\",0")
+		self.line(f"ARENA_MATCH_START,{rng.choice(ARENA_ZONES)},33,{bracket}v{bracket},1")
+		start = self.seconds
+		for team, units in enumerate(teams):
+			for unit in units:
+				self.combatant(unit, team, rating + rng.randint(-100, 100))
+		alive = [list(units) for units in teams]
+		while self.position() < end and alive[0] and alive[1]:
+			team = rng.randint(0, 1)
+			source = rng.choice(alive[team])
+			roll = rng.random()
+			if roll < 0.5:
+				target = rng.choice(alive[1 - team])
+				self.damage(source, target)
+				if target.hp == 0 and self.position() > end - size // 4:
+					self.died(target)
+					alive[1 - team].remove(target)
+				elif target.hp == 0:
+					target.hp = target.max_hp // 2
+			elif roll < 0.8:
+				self.heal(source, rng.choice(alive[team]))
+			elif roll < 0.9:
+				self.aura(source, rng.choice(alive[1 - team]))
+			else:
+				self.cast(source)
+		winner = 0 if alive[0] else 1
+		self.line(f"ARENA_MATCH_END,{winner},{int(self.seconds - start)},{rating},{rating + rng.randint(-50, 50)}")
+
+# Write a log of about size_mb MB with arena_share of it in arena matches
+def write_log(path, size_mb, arena_share=0.1, match_kb=1500, seed=1):
+	rng = random.Random(seed)
+	target = int(size_mb * 1024 * 1024)
+	match_size = match_kb * 1024
+	with open(path, 'wb') as f:
+		writer = LogWriter(f, rng)
+		writer.line(HEADER, gap=0)
+		group = [player(rng) for _ in range(5)]
+		if arena_share <= 0:
+			writer.world(target, group)
+		else:
+			# World combat between matches, so the matches come out evenly spread
+			gap = int(match_size * (1 - arena_share) / arena_share)
+			while writer.position() < target:
+				if gap:
+					writer.world(min(writer.position() + gap, target), group)
+				if writer.position() < target:
+					writer.arena(match_size)
+		writer.flush()
+	return path
+
+# Path of a cached generated log in the temp folder, written if missing
+def cached_log(directory, size_mb, arena_share=0.1, match_kb=1500, seed=1):
+	path = os.path.join(directory, f"WoWCombatLog-bench-{size_mb}-{arena_share}-{match_kb}-{seed}.txt")
+	if not os.path.exists(path):
+		write_log(path + '.tmp', size_mb, arena_share, match_kb, seed)
+		os.replace(path + '.tmp', path)
+	return path
+
+def main():
+	parser = argparse.ArgumentParser(description="Synthetic combat log generator")
+	parser.add_argument('path')
+	parser.add_argument('--size-mb', type=float, default=100)
+	parser.add_argument('--arena-share', type=float, default=0.1, help="part of the log in arena matches, 0 to 1")
+	parser.add_argument('--match-kb', type=int, default=1500, help="size of each arena match")
+	parser.add_argument('--seed', type=int, default=1)
+	args = parser.parse_args()
+	write_log(args.path, args.size_mb, args.arena_share, args.match_kb, args.seed)
+	print(f"Wrote {args.path}: {os.path.getsize(args.path) / 1e6:.1f} MB", flush=True)
+
+if __name__ == "__main__":
+	main()
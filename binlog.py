@@ -0,0 +1,295 @@
+import re
+from combatlog import split_raw_fields
+
+# Compact binary encoding of a combat log, for servers that opt in to it. The
+# text log repeats the same GUIDs, names and spell names on every line and
+# spells every number out in ASCII. Here each distinct string is sent once and
+# then referred to by its index, timestamps are sent as the difference from
+# the line before, and numbers are packed as varints. The decoder below turns
+# it back into the exact text the JSON upload would have carried (line endings
+# normalised to \n), which is what the round trip check in
+# bench/bench_binlog.py compares.
+#
+# A stream is MAGIC and a version byte followed by records, each starting
+# with an opcode byte:
+#
+#   STRING  varint length, utf-8 bytes. Adds the next entry to the string table.
+#   CLOCK   varint date string, varint timezone string, varint fraction digits,
+#           one byte hour padding. Timestamps that follow use this date, and
+#           the tick count goes back to 0.
+#   LINE    zigzag tick delta, varint event string, varint field count, the
+#           field kinds 2 bits each packed 4 to a byte, then each field.
+#   RAW     varint string, for a line that does not parse, sent whole.
+#   TRIM    the data did not end with a newline, drop the last one.
+#
+# Field kinds are STR (varint string), INT (zigzag varint), HEX (varint, for
+# 0x flags) and DEC (varint digits after the point, zigzag varint of the
+# digits without the point). Numbers are only packed when they turn back into
+# the same text, anything else is a string.
+
+MAGIC = b'ALCB'
+VERSION = 1
+# Content-Type of an encoded upload, and what servers that read it put in
+# their Accept-Log-Format response header
+CONTENT_TYPE = 'application/vnd.arenalogs.events'
+FORMAT_NAME = f"events/{VERSION}"
+
+# Most distinct field texts remembered by the encoder
+FIELD_CACHE_SIZE = 65536
+
+OP_STRING = 0
+OP_CLOCK = 1
+OP_LINE = 2
+OP_RAW = 3
+OP_TRIM = 4
+
+KIND_STR = 0
+KIND_INT = 1
+KIND_HEX = 2
+KIND_DEC = 3
+
+TIMESTAMP = re.compile(rb'^([0-9/]+) ([0-9]{1,2}):([0-9]{2}):([0-9]{2})\.([0-9]{1,9})([-+][0-9]{1,2})?$')
+INT = re.compile(rb'^-?(?:0|[1-9][0-9]*)$')
+HEX = re.compile(rb'^0x(?:0|[1-9a-f][0-9a-f]*)$')
+DEC = re.compile(rb'^-?(?:0|[1-9][0-9]*)\.([0-9]{1,15})$')
+
+def write_varint(out, value):
+	while value > 0x7f:
+		out.append((value & 0x7f) | 0x80)
+		value >>= 7
+	out.append(value)
+
+def zigzag(value):
+	return value * 2 if value >= 0 else -value * 2 - 1
+
+def unzigzag(value):
+	return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+def format_clock(date, tz, digits, padded, ticks):
+	seconds, fraction = divmod(ticks, 10 ** digits)
+	minutes, second = divmod(seconds, 60)
+	hour, minute = divmod(minutes, 60)
+	hour = f"{hour:02d}" if padded else str(hour)
+	return b'%s %s:%02d:%02d.%0*d%s' % (date, hour.encode('ascii'), minute, second, digits, fraction, tz)
+
+def format_dec(digits, value):
+	sign = '-' if value < 0 else ''
+	text = f"{abs(value):0{digits + 1}d}"
+	return f"{sign}{text[:-digits]}.{text[-digits:]}".encode('ascii')
+
+class Encoder:
+	def __init__(self):
+		self.strings = {}
+		# Field text to its kind and packed bytes, most fields repeat
+		self.fields = {}
+		self.clock = None
+		self.ticks = 0
+		self.rest = b''
+
+	def header(self):
+		return MAGIC + bytes([VERSION])
+
+	def string(self, out, value):
+		index = self.strings.get(value)
+		if index is None:
+			index = self.strings[value] = len(self.strings)
+			out.append(OP_STRING)
+			write_varint(out, len(value))
+			out += value
+		return index
+
+	# Timestamp as a tick delta, switching clocks when the date, timezone or
+	# precision changes. None if it can't be rebuilt exactly.
+	def timestamp(self, out, raw):
+		found = TIMESTAMP.match(raw)
+		if found is None:
+			return None
+		date, hour, minute, second, fraction, tz = found.groups()
+		tz = tz or b''
+		digits = len(fraction)
+		ticks = ((int(hour) * 60 + int(minute)) * 60 + int(second)) * 10 ** digits + int(fraction)
+		clock = self.clock
+		if clock is None or clock[0] != date or clock[1] != tz or clock[2] != digits or format_clock(*clock, ticks) != raw:
+			clock = (date, tz, digits, len(hour) == 2)
+			if format_clock(*clock, ticks) != raw:
+				return None
+			date_index = self.string(out, date)
+			tz_index = self.string(out, tz)
+			out.append(OP_CLOCK)
+			write_varint(out, date_index)
+			write_varint(out, tz_index)
+			write_varint(out, digits)
+			out.append(1 if clock[3] else 0)
+			self.clock = clock
+			self.ticks = 0
+		delta = ticks - self.ticks
+		self.ticks = ticks
+		return delta
+
+	def field(self, out, raw):
+		packed = bytearray()
+		if INT.match(raw) and raw != b'-0':
+			write_varint(packed, zigzag(int(raw)))
+			return KIND_INT, packed
+		if HEX.match(raw):
+			write_varint(packed, int(raw, 16))
+			return KIND_HEX, packed
+		found = DEC.match(raw)
+		if found is not None:
+			digits = len(found.group(1))
+			value = int(raw.replace(b'.', b''))
+			if format_dec(digits, value) == raw:
+				write_varint(packed, digits)
+				write_varint(packed, zigzag(value))
+				return KIND_DEC, packed
+		write_varint(packed, self.string(out, raw))
+		return KIND_STR, packed
+
+	def line(self, out, line):
+		line = line.rstrip(b'\r')
+		split = line.find(b'  ')
+		delta = self.timestamp(out, line[:split]) if split > 0 else None
+		if delta is None:
+			index = self.string(out, line)
+			out.append(OP_RAW)
+			write_varint(out, index)
+			return
+		event, comma, rest = line[split + 2:].partition(b',')
+		fields = split_raw_fields(rest) if comma else []
+		event_index = self.string(out, event)
+		kinds = bytearray((len(fields) + 3) // 4)
+		body = bytearray()
+		cache = self.fields
+		for i, raw in enumerate(fields):
+			field = cache.get(raw)
+			if field is None:
+				if len(cache) >= FIELD_CACHE_SIZE:
+					cache.clear()
+				field = cache[raw] = self.field(out, raw)
+			kinds[i >> 2] |= field[0] << ((i & 3) * 2)
+			body += field[1]
+		out.append(OP_LINE)
+		write_varint(out, zigzag(delta))
+		write_varint(out, event_index)
+		write_varint(out, len(fields))
+		out += kinds
+		out += body
+
+	# Encode the next piece of the log. A line cut off at the end is kept for
+	# the next call.
+	def encode(self, data):
+		out = bytearray()
+		lines = (self.rest + data).split(b'\n')
+		self.rest = lines.pop()
+		for line in lines:
+			self.line(out, line)
+		return bytes(out)
+
+	def finish(self):
+		out = bytearray()
+		if self.rest:
+			self.line(out, self.rest)
+			out.append(OP_TRIM)
+			self.rest = b''
+		return bytes(out)
+
+# Encode a stream of chunks of log text as it goes
+def encode_stream(chunks):
+	encoder = Encoder()
+	yield encoder.header()
+	for chunk in chunks:
+		data = encoder.encode(chunk)
+		if data:
+			yield data
+	data = encoder.finish()
+	if data:
+		yield data
+
+def encode(data):
+	return b''.join(encode_stream([data]))
+
+# Reference decoder, gives back the log text for an encoded stream
+class Decoder:
+	def __init__(self, data):
+		if len(data) <= len(MAGIC) or data[:len(MAGIC)] != MAGIC:
+			raise ValueError("Not an encoded combat log")
+		if data[len(MAGIC)] != VERSION:
+			raise ValueError(f"Unsupported version {data[len(MAGIC)]}")
+		self.data = data
+		self.pos = len(MAGIC) + 1
+
+	def varint(self):
+		value = 0
+		shift = 0
+		while True:
+			byte = self.data[self.pos]
+			self.pos += 1
+			value |= (byte & 0x7f) << shift
+			if byte < 0x80:
+				return value
+			shift += 7
+
+	# The log text. Raises ValueError for a stream that is cut off inside a
+	# record or refers to something it never sent. A stream cut off between
+	# two records can't be told apart from a shorter log.
+	def decode(self):
+		try:
+			return self.decode_records()
+		except (IndexError, TypeError):
+			raise ValueError(f"Truncated or corrupt encoded log at {self.pos}")
+
+	def decode_records(self):
+		strings = []
+		clock = None
+		ticks = 0
+		lines = []
+		data = self.data
+		while self.pos < len(data):
+			op = data[self.pos]
+			self.pos += 1
+			if op == OP_STRING:
+				length = self.varint()
+				if self.pos + length > len(data):
+					raise IndexError(length)
+				strings.append(data[self.pos:self.pos + length])
+				self.pos += length
+			elif op == OP_CLOCK:
+				date = strings[self.varint()]
+				tz = strings[self.varint()]
+				digits = self.varint()
+				padded = data[self.pos] == 1
+				self.pos += 1
+				clock = (date, tz, digits, padded)
+				ticks = 0
+			elif op == OP_LINE:
+				ticks += unzigzag(self.varint())
+				event = strings[self.varint()]
+				count = self.varint()
+				kinds = data[self.pos:self.pos + (count + 3) // 4]
+				self.pos += (count + 3) // 4
+				fields = []
+				for i in range(count):
+					kind = (kinds[i >> 2] >> ((i & 3) * 2)) & 3
+					if kind == KIND_STR:
+						fields.append(strings[self.varint()])
+					elif kind == KIND_INT:
+						fields.append(b'%d' % unzigzag(self.varint()))
+					elif kind == KIND_HEX:
+						fields.append(b'0x%x' % self.varint())
+					else:
+						digits = self.varint()
+						fields.append(format_dec(digits, unzigzag(self.varint())))
+				line = format_clock(*clock, ticks) + b'  ' + event
+				if count:
+					line += b',' + b','.join(fields)
+				lines.append(line + b'\n')
+			elif op == OP_RAW:
+				lines.append(strings[self.varint()] + b'\n')
+			elif op == OP_TRIM:
+				lines[-1] = lines[-1][:-1]
+			else:
+				raise ValueError(f"Unknown opcode {op} at {self.pos - 1}")
+		return b''.join(lines)
+
+def decode(data):
+	return Decoder(data).decode()
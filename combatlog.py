@@ -0,0 +1,204 @@
+import re
+import sys
+import time
+import calendar
+from collections import namedtuple
+
+# Streaming parser for WoWCombatLog files. A line looks like
+#
+#   10/18/2026 20:30:15.1234-4  SPELL_DAMAGE,Player-1-0A,"Name-Realm",...
+#
+# a timestamp, two spaces, the event name and then comma separated fields
+# where names are quoted and some fields hold [...] or (...) lists.
+#
+# The log is read in large blocks and the event names of a block are found
+# with one regex pass, so the per line work happens in C. Only that is fast:
+# reading event names is about as quick as splitting lines of text, while
+# timestamps and fields are taken out of a line in Python, once asked for,
+# and cost several times a plain str.split (bench/bench_parser.py compares
+# both). Event names are interned, timestamps go through a cache keyed on the
+# whole second, and fields come back as str, untyped, for the caller to
+# convert the ones it needs.
+
+# Bytes read from the log at a time
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# The event name, found by the two spaces in front of it
+EVENT_NAME = re.compile(rb'  ([A-Z0-9_]+)(?:,|\r?$)', re.M)
+# A whole line, for blocks where the fast pass does not line up
+LINE = re.compile(rb'^([^ ]+ [^ ]+)  ([A-Z0-9_]+)')
+# A quoted name with a comma in it, from its opening quote to the comma
+QUOTED_COMMA = re.compile(rb'(?:^|,)"[^"]*,')
+
+POWERS_OF_TEN = [10 ** i for i in range(16)]
+
+Event = namedtuple('Event', ['timestamp', 'event', 'fields'])
+
+# Event names as interned str, decoded once per name
+class EventNames(dict):
+	def __missing__(self, name):
+		value = self[name] = sys.intern(name.decode('ascii'))
+		return value
+
+# Turns log timestamps into seconds since the epoch (UTC when the log has a
+# timezone, local wall clock otherwise). Lines in the same second share the
+# part before the dot, so that part is parsed once and cached.
+class TimestampDecoder:
+	def __init__(self, year=None):
+		# Old logs leave the year out
+		self.year = year or time.localtime().tm_year
+		self.cache = {}
+
+	def decode(self, raw):
+		seconds, _, fraction = raw.partition(b'.')
+		fraction, sign, tz = fraction.partition(b'-')
+		if not sign:
+			fraction, sign, tz = fraction.partition(b'+')
+		value = self.cache.get(seconds + sign + tz)
+		if value is None:
+			value = self.base(seconds, sign + tz)
+		if fraction:
+			value += int(fraction) / POWERS_OF_TEN[len(fraction)]
+		return value
+
+	def base(self, seconds, tz):
+		key = seconds + tz
+		value = self.cache.get(key)
+		if value is None:
+			date, clock = seconds.split(b' ')
+			date = [int(part) for part in date.split(b'/')]
+			year = date[2] if len(date) > 2 else self.year
+			hours, minutes, secs = [int(part) for part in clock.split(b':')]
+			value = calendar.timegm((year, date[0], date[1], hours, minutes, secs, 0, 0, 0))
+			if tz:
+				value -= int(tz) * 3600
+			self.cache[key] = value
+		return value
+
+# Split the fields of a line. Quoted names may hold commas and [...] or (...)
+# groups are kept whole. Most lines have neither and get a plain split.
+def split_fields(raw):
+	if not raw:
+		return []
+	if b'[' not in raw and b'(' not in raw and not QUOTED_COMMA.search(raw):
+		fields = raw.decode('utf-8').split(',')
+		if b'"' in raw:
+			fields = [field[1:-1] if field[:1] == '"' else field for field in fields]
+		return fields
+	return [unquote(field) for field in split_raw_fields(raw)]
+
+# The same split, with every field left as the exact bytes of the line
+def split_raw_fields(raw):
+	if b'[' not in raw and b'(' not in raw and not QUOTED_COMMA.search(raw):
+		return raw.split(b',')
+	fields = []
+	depth = 0
+	quoted = False
+	start = 0
+	for i, char in enumerate(raw):
+		if char == 0x22:
+			quoted = not quoted
+		elif quoted:
+			continue
+		elif char in (0x5b, 0x28):
+			depth += 1
+		elif char in (0x5d, 0x29):
+			depth -= 1
+		elif char == 0x2c and depth == 0:
+			fields.append(raw[start:i])
+			start = i + 1
+	fields.append(raw[start:])
+	return fields
+
+def unquote(field):
+	if len(field) >= 2 and field[0] == 0x22 and field[-1] == 0x22:
+		field = field[1:-1]
+	return field.decode('utf-8')
+
+# The lines of one block as columns. The block is only cut into lines, and
+# timestamps and fields only taken out of them, once someone asks.
+class EventBatch:
+	__slots__ = ('block', 'split_lines', 'events', 'decoder')
+
+	def __init__(self, block, lines, events, decoder):
+		self.block = block
+		self.split_lines = lines
+		self.events = events
+		self.decoder = decoder
+
+	@property
+	def lines(self):
+		if self.split_lines is None:
+			self.split_lines = self.block.split(b'\n')
+		return self.split_lines
+
+	def __len__(self):
+		return len(self.events)
+
+	def raw_timestamp(self, i):
+		line = self.lines[i]
+		return line[:line.find(b'  ')]
+
+	def timestamp(self, i):
+		return self.decoder.decode(self.raw_timestamp(i))
+
+	def timestamps(self):
+		decode = self.decoder.decode
+		return [decode(line[:line.find(b'  ')]) for line in self.lines]
+
+	def raw_fields(self, i):
+		line = self.lines[i]
+		start = line.find(b'  ') + 3 + len(self.events[i])
+		return line[start:].rstrip(b'\r')
+
+	def fields(self, i):
+		return split_fields(self.raw_fields(i))
+
+	# Indexes of the lines with one of the given event names
+	def select(self, *names):
+		names = set(names)
+		return [i for i, event in enumerate(self.events) if event in names]
+
+	def __iter__(self):
+		for i in range(len(self.events)):
+			yield Event(self.timestamp(i), self.events[i], self.fields(i))
+
+def parse_block(block, names, decoder):
+	events = EVENT_NAME.findall(block)
+	if len(events) == block.count(b'\n') + 1:
+		return EventBatch(block, None, list(map(names.__getitem__, events)), decoder)
+	# Blank or broken lines, or a name with two spaces in it, so match line
+	# by line and leave out what does not parse
+	lines = [line for line in block.split(b'\n') if LINE.match(line)]
+	events = [LINE.match(line).group(2) for line in lines]
+	return EventBatch(block, lines, list(map(names.__getitem__, events)), decoder)
+
+# Read a combat log, or an open binary file, as a stream of EventBatch, one
+# per block. A line cut by the end of a block is carried into the next one.
+def read_batches(source, block_size=BLOCK_SIZE, year=None):
+	f = open(source, 'rb') if isinstance(source, str) else source
+	names = EventNames()
+	decoder = TimestampDecoder(year)
+	rest = b''
+	try:
+		while True:
+			block = f.read(block_size)
+			if not block:
+				break
+			block = rest + block
+			end = block.rfind(b'\n')
+			if end < 0:
+				rest = block
+				continue
+			rest = block[end + 1:]
+			yield parse_block(block[:end], names, decoder)
+		if rest:
+			yield parse_block(rest, names, decoder)
+	finally:
+		if f is not source:
+			f.close()
+
+# Every line of a log as an Event, with the timestamp and fields decoded
+def parse_events(source, year=None):
+	for batch in read_batches(source, year=year):
+		yield from batch
@@ -0,0 +1,221 @@
+import os
+import re
+import sys
+import json
+import gzip
+import time
+import random
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import binlog
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+# Local stand-in for the /api/upload/ endpoint, the same address local.py and
+# local2.py upload to. It takes plain, gzip and zstd uploads plus the
+# resumable part protocol (also used by live tailing, with a size of '*') and
+# match summaries, and can drop connections at random to check that
+# interrupted uploads pick up where they left off. With --binary it offers
+# the binary event format and decodes uploads sent in it. --latency makes
+# every upload wait before it is answered, like a busy server, and the
+# benchmarks in bench/ run it with --quiet. --unavailable-rate answers some
+# requests with 503 and a Retry-After of --retry-after seconds, and --down
+# answers every request that way for the first seconds after starting, to
+# check that uploads back off and drain once the server is back.
+#
+#   python devserver.py --port 8000 --drop-rate 0.2 --binary --latency 0.05
+#   python devserver.py --port 8000 --down 60 --retry-after 10
+
+UPLOAD_PATH = re.compile(r'^/api/upload/?$')
+RESUMABLE_PATH = re.compile(r'^/api/upload/resumable/(\w+)/?$')
+PART_PATH = re.compile(r'^/api/upload/resumable/(\w+)/(\d+)$')
+COMPLETE_PATH = re.compile(r'^/api/upload/resumable/(\w+)/complete$')
+SUMMARY_PATH = re.compile(r'^/api/upload/summary$')
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+class UploadHandler(BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+
+	def log_message(self, format, *args):
+		if not self.server.quiet:
+			super().log_message(format, *args)
+
+	def read_body(self):
+		if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+			parts = []
+			while True:
+				size = int(self.rfile.readline().split(b';')[0], 16)
+				if size == 0:
+					self.rfile.readline()
+					break
+				parts.append(self.rfile.read(size))
+				self.rfile.readline()
+			body = b''.join(parts)
+		else:
+			body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+		encoding = self.headers.get('Content-Encoding', 'identity').lower()
+		if encoding == 'gzip':
+			body = gzip.decompress(body)
+		elif encoding == 'zstd' and zstandard is not None:
+			body = zstandard.ZstdDecompressor().decompressobj().decompress(body)
+		elif encoding != 'identity':
+			return None
+		return body
+
+	def send_json(self, status, data, headers=None):
+		if self.server.latency:
+			time.sleep(self.server.latency)
+		body = json.dumps(data).encode('utf-8')
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		if self.server.binary:
+			self.send_header('Accept-Log-Format', binlog.FORMAT_NAME)
+		for header, value in (headers or {}).items():
+			self.send_header(header, value)
+		self.end_headers()
+		self.wfile.write(body)
+
+	# Drop the connection without answering, as a flaky Wi-Fi link would
+	def maybe_drop(self):
+		if random.random() < self.server.drop_rate:
+			self.close_connection = True
+			self.connection.close()
+			return True
+		return False
+
+	# Answer 503 instead of handling the request, as an overloaded or
+	# restarting server would
+	def maybe_unavailable(self):
+		down = time.monotonic() < self.server.down_until
+		if not down and random.random() >= self.server.unavailable_rate:
+			return False
+		if self.command != 'GET':
+			self.read_body()
+		self.send_json(503, {'message': 'Service unavailable'}, {'Retry-After': str(self.server.retry_after)})
+		return True
+
+	def unsupported_encoding(self):
+		accepted = 'gzip, zstd' if zstandard is not None else 'gzip'
+		self.send_json(415, {'message': 'Unsupported Content-Encoding'}, {'Accept-Encoding': accepted})
+
+	def part_file(self, uid):
+		return os.path.join(self.server.upload_dir, f"{uid}.part")
+
+	def do_GET(self):
+		if self.maybe_unavailable():
+			return
+		match = RESUMABLE_PATH.match(self.path)
+		if not match:
+			return self.send_json(404, {'message': 'Not found'})
+		path = self.part_file(match.group(1))
+		if not os.path.exists(path):
+			return self.send_json(404, {'offset': 0})
+		self.send_json(200, {'offset': os.path.getsize(path)})
+
+	def do_PUT(self):
+		if self.maybe_unavailable():
+			return
+		match = PART_PATH.match(self.path)
+		if not match:
+			return self.send_json(404, {'message': 'Not found'})
+		content_range = CONTENT_RANGE.match(self.headers.get('Content-Range', ''))
+		if not content_range:
+			return self.send_json(400, {'message': 'Missing Content-Range'})
+		data = self.read_body()
+		if data is None:
+			return self.unsupported_encoding()
+		# Half of the drops happen before the part is stored, the other half
+		# after, so the client also sees parts it was never told about
+		drop_after = random.random() < 0.5
+		if not drop_after and self.maybe_drop():
+			return
+		start = int(content_range.group(1))
+		path = self.part_file(match.group(1))
+		have = os.path.getsize(path) if os.path.exists(path) else 0
+		if start > have:
+			return self.send_json(409, {'offset': have})
+		with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+			f.truncate(start)
+			f.seek(start)
+			f.write(data)
+		if drop_after and self.maybe_drop():
+			return
+		self.send_json(200, {'offset': start + len(data)})
+
+	def do_POST(self):
+		if self.maybe_unavailable():
+			return
+		match = COMPLETE_PATH.match(self.path)
+		if match:
+			self.read_body()
+			path = self.part_file(match.group(1))
+			size = os.path.getsize(path) if os.path.exists(path) else 0
+			self.server.uploads.append({'file': path, 'size': size, 'flavor': self.headers.get('X-WoW-Flavor')})
+			return self.send_json(200, {'message': 'Combat log uploaded', 'size': size})
+		if SUMMARY_PATH.match(self.path):
+			try:
+				summary = json.loads(self.read_body())
+			except (ValueError, TypeError):
+				return self.send_json(400, {'message': 'Bad summary'})
+			self.server.summaries.append(summary)
+			return self.send_json(200, {'message': 'Summary received'})
+		if not UPLOAD_PATH.match(self.path):
+			return self.send_json(404, {'message': 'Not found'})
+		body = self.read_body()
+		if body is None:
+			return self.unsupported_encoding()
+		if self.maybe_drop():
+			return
+		try:
+			if self.headers.get('Content-Type') == binlog.CONTENT_TYPE:
+				if not self.server.binary:
+					return self.send_json(415, {'message': 'Unsupported Content-Type'})
+				contents = binlog.decode(body).decode('utf-8')
+			else:
+				contents = json.loads(body)['file_contents']
+		except (ValueError, KeyError, TypeError, IndexError):
+			return self.send_json(400, {'message': 'Bad upload'})
+		self.server.uploads.append({'size': len(contents), 'flavor': self.headers.get('X-WoW-Flavor')})
+		self.send_json(200, {'message': 'Combat log uploaded', 'size': len(contents)})
+
+def make_server(host='127.0.0.1', port=8000, upload_dir='devserver_uploads', drop_rate=0.0, quiet=False, binary=False, latency=0.0, unavailable_rate=0.0, retry_after=5, down=0):
+	os.makedirs(upload_dir, exist_ok=True)
+	server = ThreadingHTTPServer((host, port), UploadHandler)
+	server.upload_dir = upload_dir
+	server.drop_rate = drop_rate
+	server.quiet = quiet
+	server.binary = binary
+	server.latency = latency
+	server.unavailable_rate = unavailable_rate
+	server.retry_after = retry_after
+	server.down_until = time.monotonic() + down
+	server.uploads = []
+	server.summaries = []
+	return server
+
+def main():
+	parser = argparse.ArgumentParser(description="Local stand-in for the combat log upload server")
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8000)
+	parser.add_argument('--upload-dir', default='devserver_uploads')
+	parser.add_argument('--drop-rate', type=float, default=0.0, help="chance of dropping each request, 0 to 1")
+	parser.add_argument('--binary', action='store_true', help="offer and accept the binary event format")
+	parser.add_argument('--latency', type=float, default=0.0, help="seconds to wait before answering each request")
+	parser.add_argument('--quiet', action='store_true', help="don't log every request")
+	parser.add_argument('--unavailable-rate', type=float, default=0.0, help="chance of answering each request with 503, 0 to 1")
+	parser.add_argument('--retry-after', type=int, default=5, help="Retry-After seconds sent with a 503")
+	parser.add_argument('--down', type=float, default=0, help="answer everything with 503 for this many seconds after starting")
+	args = parser.parse_args()
+	server = make_server(args.host, args.port, args.upload_dir, args.drop_rate, args.quiet, args.binary, args.latency, args.unavailable_rate, args.retry_after, args.down)
+	print(f"Listening on http://{args.host}:{args.port}/api/upload/", flush=True)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,258 @@
+import time
+import queue
+import threading
+import requests
+import metrics
+from uploader import get_session, stream_payload, binary_payload, compress_stream, supported_encodings, accepted_encodings, use_binary, note_log_format, timed_request, post_file, is_duplicate, refused_body, ServerUnavailable
+from uploader import upload
+from arenamatch import find_matches, upload_matches
+from matchsummary import send_summaries
+import binlog
+
+# Sending the same logs to several servers, arenalogs.gg and a PvP Lookup
+# server say, from one app. The log is read, hashed and compressed once and
+# every chunk of the body is handed to one request per server, all running
+# at once. Each server keeps its own HashIndex so it is only sent what it
+# does not have yet, and a server whose request fails is tried again on its
+# own, through post_file and its encoding fallbacks, while the others are
+# counted as done.
+#
+# Whole logs always go as one streamed request per server here, also the big
+# ones that a single server would get as resumable parts, since the parts
+# and their checkpoints belong to one server each.
+
+# Chunks that can wait for a slow server before the read waits for it
+QUEUE_CHUNKS = 8
+# Tries for a server after the shared send failed for it
+RETRY_ATTEMPTS = 3
+# Wait before the first retry, doubled after every try
+RETRY_DELAY = 2
+
+# A server to upload to, with the HashIndex of what it already has
+class Destination:
+	def __init__(self, url, index=None):
+		self.url = url
+		self.index = index
+
+	def __repr__(self):
+		return f"Destination({self.url!r})"
+
+# The chunk queue feeding one server's request. Once that request has given
+# up, put() drops chunks instead of waiting, so one dead server never holds
+# up the others.
+class Branch:
+	def __init__(self):
+		self.queue = queue.Queue(QUEUE_CHUNKS)
+		self.closed = threading.Event()
+
+	def put(self, chunk):
+		while not self.closed.is_set():
+			try:
+				self.queue.put(chunk, timeout=0.5)
+				return
+			except queue.Full:
+				pass
+
+	def chunks(self):
+		while True:
+			chunk = self.queue.get()
+			if chunk is None:
+				return
+			yield chunk
+
+# Send a log, or the given byte ranges of it, to several urls in one pass
+# with the same encoding and format. Returns the response, or the exception
+# raised, for each url.
+def send_shared(urls, file_path, encoding, ranges=None, binary=False):
+	headers = {'Content-Type': binlog.CONTENT_TYPE if binary else 'application/json'}
+	if encoding != 'identity':
+		headers['Content-Encoding'] = encoding
+	branches = {url: Branch() for url in urls}
+	results = {}
+
+	def send(url):
+		try:
+			results[url] = timed_request(get_session().post, url, file_path, branches[url].chunks(), headers=headers)
+		except requests.RequestException as e:
+			results[url] = e
+		finally:
+			branches[url].closed.set()
+
+	threads = [threading.Thread(target=send, args=(url,), daemon=True) for url in urls]
+	for thread in threads:
+		thread.start()
+	if binary:
+		body = binary_payload(file_path, ranges=ranges)
+	else:
+		body = stream_payload(file_path, ranges=ranges)
+	body = compress_stream(body, encoding, file_path)
+	try:
+		for chunk in body:
+			for branch in branches.values():
+				branch.put(chunk)
+	finally:
+		for branch in branches.values():
+			branch.put(None)
+		for thread in threads:
+			thread.join()
+	return results
+
+# How a server's answer is tried again on its own: 'refused' if it could
+# not read the body, which post_file works around straight away with another
+# encoding or format, 'failed' if the server or the connection failed, which
+# is tried again after a wait, None if it is not tried again
+def retry_reason(url, result, encoding, binary):
+	if isinstance(result, ServerUnavailable):
+		# Its breaker is open, the job is tried again once it closes
+		return None
+	if isinstance(result, Exception):
+		return 'failed'
+	if is_duplicate(result):
+		return None
+	if result.status_code >= 500:
+		return 'failed'
+	if result.status_code == 415 or (binary and result.status_code == 400) or refused_body(url, result, encoding):
+		return 'refused'
+	return None
+
+def retry(url, file_path, ranges, result):
+	for attempt in range(RETRY_ATTEMPTS):
+		time.sleep(RETRY_DELAY * 2 ** attempt)
+		metrics.add_count(file_path, 'retries')
+		try:
+			result = post_file(url, file_path, ranges=ranges)
+		except ServerUnavailable as e:
+			result = e
+			break
+		except requests.RequestException as e:
+			result = e
+			continue
+		if result.status_code < 500:
+			break
+	return result
+
+# post_file for several urls at once. Urls that agreed to the same encoding
+# and format share one read of the file, the rest of post_file's
+# bookkeeping is done per url. Returns the response, or the exception
+# raised, for each url.
+def post_shared(urls, file_path, ranges=None):
+	groups = {}
+	for url in urls:
+		encoding = accepted_encodings.get(url, supported_encodings()[0])
+		groups.setdefault((encoding, use_binary(url, file_path, ranges)), []).append(url)
+	results = {}
+	for (encoding, binary), group in groups.items():
+		for url, result in send_shared(group, file_path, encoding, ranges, binary).items():
+			if not isinstance(result, Exception):
+				note_log_format(url, result)
+				if result.status_code == 200:
+					accepted_encodings[url] = encoding
+			reason = retry_reason(url, result, encoding, binary)
+			if reason == 'refused':
+				metrics.add_count(file_path, 'retries')
+				try:
+					result = post_file(url, file_path, ranges=ranges)
+				except requests.RequestException as e:
+					result = e
+			elif reason == 'failed':
+				result = retry(url, file_path, ranges, result)
+			results[url] = result
+	return results
+
+# Record the uploads that went through in each server's index. Returns the
+# responses by url, and raises the first connection error after recording.
+def settle(destinations, digest, file_path, results):
+	error = None
+	responses = {}
+	for destination in destinations:
+		result = results.get(destination.url)
+		if result is None:
+			continue
+		if isinstance(result, Exception):
+			print(f"Upload of {file_path} to {destination.url} failed: {result!r}", flush=True)
+			error = error or result
+			continue
+		if destination.index is not None and digest is not None and (result.status_code == 200 or is_duplicate(result)):
+			destination.index.add(digest, file_path)
+		responses[destination.url] = result
+	if error is not None:
+		raise error
+	return responses
+
+def first_index(destinations):
+	return next((d.index for d in destinations if d.index is not None), None)
+
+# Servers that don't have this content yet
+def pending(destinations, digest, file_path):
+	return [d for d in destinations if d.index is None or digest is None or not d.index.known(digest, file_path)]
+
+# Upload a whole log to every server that doesn't have it yet. Returns the
+# response from each server that was sent it.
+def upload_file_to(destinations, file_path):
+	index = first_index(destinations)
+	digest = None
+	if index is not None:
+		with metrics.timed(file_path, 'hash'):
+			digest = index.file_digest(file_path)
+	targets = pending(destinations, digest, file_path)
+	if not targets:
+		return {}
+	return settle(targets, digest, file_path, post_shared([d.url for d in targets], file_path))
+
+# Upload one arena match to every server that doesn't have it yet, with its
+# summary ahead of it if summary is set
+def upload_match_to(destinations, file_path, match, summary=False):
+	index = first_index(destinations)
+	digest = None
+	if index is not None:
+		with metrics.timed(file_path, 'hash'):
+			digest = index.range_digest(file_path, [(match.start, match.end)])
+	targets = pending(destinations, digest, file_path)
+	if not targets:
+		return {}
+	urls = [d.url for d in targets]
+	if summary:
+		send_summaries(urls, file_path, match, digest)
+	return settle(targets, digest, file_path, post_shared(urls, file_path, match.ranges()))
+
+# Upload every complete arena match in a log to every server, like
+# upload_matches. Returns the responses from each server.
+def upload_matches_to(destinations, file_path, engine=None, match_index=None, summaries=False):
+	if match_index is not None:
+		matches = match_index.matches(file_path)
+	else:
+		matches, _ = find_matches(file_path)
+	if engine is not None:
+		run = engine.map
+	else:
+		run = lambda fn, arg_list: [fn(*args) for args in arg_list]
+	matches = [match for match in matches if match.complete]
+	results = {d.url: [] for d in destinations}
+	for sent in run(upload_match_to, [(destinations, file_path, match, summaries) for match in matches]):
+		for url, response in sent.items():
+			results[url].append(response)
+	return results
+
+# Upload a log to every server the way the app is set up to, matches only
+# with arena_only. Returns the responses from each server.
+def upload_everywhere(destinations, file_path, arena_only=False, engine=None, match_index=None, summaries=False):
+	if arena_only:
+		return upload_matches_to(destinations, file_path, engine, match_index, summaries)
+	return {url: [response] for url, response in upload_file_to(destinations, file_path).items()}
+
+# Upload a log the way the app is set up to, to every destination at once
+# when there are several, else match by match or as the whole log. Returns
+# the responses of every request that went out.
+def upload_log(destinations, file_path, arena_only=False, engine=None, match_index=None, summaries=False):
+	if len(destinations) > 1:
+		# One read of the log feeds every server
+		results = upload_everywhere(destinations, file_path, arena_only, engine, match_index, summaries)
+		for url, url_responses in results.items():
+			print(f"{url}: {[response.status_code for response in url_responses]}", flush=True)
+		return [response for url_responses in results.values() for response in url_responses]
+	destination = destinations[0]
+	if arena_only:
+		return upload_matches(destination.url, file_path, destination.index, engine, match_index, summaries)
+	# Big files go up in parts that can be resumed if the upload is cut off
+	response = upload(destination.url, file_path, destination.index)
+	return [response] if response is not None else []
@@ -0,0 +1,117 @@
+import os
+import time
+import sqlite3
+import hashlib
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from uploader import state_dir, url_key, get_session
+
+# Local index of what has already been uploaded, by content hash. Whole files
+# and single arena matches are both hashed, so a manual retry, a restarted
+# app or two logs that overlap cost one lookup instead of another upload.
+
+# Files are hashed in blocks of this size on several threads, hashlib lets go
+# of the GIL while it works so this scales with cores and disk speed
+BLOCK_SIZE = 8 * 1024 * 1024
+HASH_WORKERS = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploaded (
+	digest TEXT PRIMARY KEY,
+	file_path TEXT,
+	uploaded REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS file_digests (
+	file_path TEXT PRIMARY KEY,
+	size INTEGER NOT NULL,
+	mtime_ns INTEGER NOT NULL,
+	digest TEXT NOT NULL
+);
+"""
+
+def hash_block(file_path, start, end):
+	with open(file_path, 'rb') as f:
+		f.seek(start)
+		return hashlib.sha256(f.read(end - start)).digest()
+
+# Hash the given (start, end) byte ranges of a file, or all of it. Ranges are
+# cut into blocks which are hashed in parallel, and the result is the sha256
+# of the block hashes in order.
+def content_digest(file_path, ranges=None, block_size=BLOCK_SIZE, workers=HASH_WORKERS):
+	if ranges is None:
+		ranges = [(0, os.path.getsize(file_path))]
+	blocks = []
+	for start, end in ranges:
+		for block_start in range(start, end, block_size):
+			blocks.append((file_path, block_start, min(block_start + block_size, end)))
+	if len(blocks) <= 1 or workers <= 1:
+		digests = [hash_block(*block) for block in blocks]
+	else:
+		with ThreadPoolExecutor(workers) as pool:
+			digests = list(pool.map(lambda block: hash_block(*block), blocks))
+	return hashlib.sha256(b''.join(digests)).hexdigest()
+
+class HashIndex:
+	# With preflight set, hashes that are not in the local index are checked
+	# with the server (HEAD <url>/hash/<digest>) before anything is sent. Only
+	# set it for a server known to answer that, neither arenalogs.gg nor
+	# devserver.py does.
+	def __init__(self, url, preflight=False, db_path=None):
+		self.url = url
+		self.preflight = preflight
+		self.db_path = db_path or os.path.join(state_dir(), f"hashes-{url_key(url)}.sqlite3")
+		with self.connect() as db:
+			db.executescript(SCHEMA)
+
+	def connect(self):
+		return sqlite3.connect(self.db_path, timeout=30)
+
+	# Hash of a whole file, remembered until its size or mtime changes
+	def file_digest(self, file_path):
+		stat = os.stat(file_path)
+		with self.connect() as db:
+			row = db.execute("SELECT digest FROM file_digests WHERE file_path = ? AND size = ? AND mtime_ns = ?", (file_path, stat.st_size, stat.st_mtime_ns)).fetchone()
+		if row is not None:
+			return row[0]
+		digest = content_digest(file_path, [(0, stat.st_size)])
+		with self.connect() as db:
+			db.execute("INSERT OR REPLACE INTO file_digests (file_path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)", (file_path, stat.st_size, stat.st_mtime_ns, digest))
+		return digest
+
+	def range_digest(self, file_path, ranges):
+		return content_digest(file_path, ranges)
+
+	def seen(self, digest):
+		with self.connect() as db:
+			return db.execute("SELECT 1 FROM uploaded WHERE digest = ?", (digest,)).fetchone() is not None
+
+	def add(self, digest, file_path=None):
+		with self.connect() as db:
+			db.execute("INSERT OR REPLACE INTO uploaded (digest, file_path, uploaded) VALUES (?, ?, ?)", (digest, file_path, time.time()))
+
+	# Ask the server if it already has this hash. True for a clear yes, False
+	# for a clear no (204), and None when the server can't tell. A 404 or 405
+	# means the server has no such endpoint, so it is not asked again.
+	def server_has(self, digest):
+		try:
+			response = get_session().head(f"{self.url.rstrip('/')}/hash/{digest}")
+		except requests.RequestException:
+			return None
+		if response.status_code == 200:
+			return True
+		if response.status_code == 204:
+			return False
+		if response.status_code in (404, 405):
+			print(f"{self.url} does not answer hash lookups, uploading without them", flush=True)
+			self.preflight = False
+		return None
+
+	# True if the content has been uploaded before, by us or anyone else. A
+	# hash the server can't tell us about is sent like a new one.
+	def known(self, digest, file_path=None):
+		if self.seen(digest):
+			return True
+		if self.preflight and self.server_has(digest):
+			self.add(digest, file_path)
+			return True
+		return False
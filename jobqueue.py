@@ -0,0 +1,204 @@
+import os
+import time
+import sqlite3
+import threading
+from uploader import state_dir, url_key, breaker_for, jittered
+from throttle import lower_priority
+
+# Durable queue of uploads. Everything that wants a file uploaded, the
+# watchdog handler or the manual upload dialog, puts it here and returns
+# straight away. A few worker threads take jobs off the queue and run the
+# upload. Jobs live in a SQLite database so a job that was waiting, or was
+# halfway through when the app quit or crashed, is run again on the next start.
+#
+# While the server's circuit breaker is open no jobs are taken, so nothing is
+# read or compressed for a server that is down, and the queue starts draining
+# again as soon as the breaker closes. A job that failed while the breaker is
+# open doesn't use up one of its tries, it waits for the server, up to
+# MAX_WAITS times.
+
+# Upload threads working through the queue
+WORKERS = 2
+# Tries per job before it is marked failed
+MAX_ATTEMPTS = 5
+# Failures while the breaker is open that don't use up a try, so a log the
+# server keeps failing on still runs out of tries in the end
+MAX_WAITS = 10
+# Wait before the first retry, doubled on every try after that, with jitter
+RETRY_DELAY = 30
+MAX_RETRY_DELAY = 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	file_path TEXT NOT NULL,
+	status TEXT NOT NULL DEFAULT 'pending',
+	attempts INTEGER NOT NULL DEFAULT 0,
+	waits INTEGER NOT NULL DEFAULT 0,
+	next_try REAL NOT NULL DEFAULT 0,
+	last_error TEXT,
+	created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, next_try);
+"""
+
+class UploadQueue:
+	# handler is called with the file path on a worker thread and returns
+	# True once the file is uploaded. defer, if given, is called with the
+	# file path first and returns how many seconds to hold the job back, 0
+	# to run it now.
+	def __init__(self, url, handler, workers=WORKERS, db_path=None, defer=None):
+		self.handler = handler
+		self.defer = defer
+		self.workers = workers
+		self.breaker = breaker_for(url)
+		self.breaker.add_listener(self.resume)
+		self.db_path = db_path or os.path.join(state_dir(), f"queue-{url_key(url)}.sqlite3")
+		self.wakeup = threading.Condition()
+		self.stopping = False
+		self.threads = []
+		self.watchers = []
+		with self.connect() as db:
+			db.executescript(SCHEMA)
+			columns = [row[1] for row in db.execute("PRAGMA table_info(jobs)")]
+			if 'waits' not in columns:
+				# Queue from before waits were counted
+				db.execute("ALTER TABLE jobs ADD COLUMN waits INTEGER NOT NULL DEFAULT 0")
+
+	def connect(self):
+		db = sqlite3.connect(self.db_path, timeout=30)
+		db.execute('PRAGMA journal_mode=WAL')
+		return db
+
+	# Queue a file, unless it is already waiting to be uploaded
+	def put(self, file_path):
+		with self.connect() as db:
+			waiting = db.execute("SELECT 1 FROM jobs WHERE file_path = ? AND status IN ('pending', 'running')", (file_path,)).fetchone()
+			if waiting is None:
+				db.execute("INSERT INTO jobs (file_path, created) VALUES (?, ?)", (file_path, time.time()))
+		self.wake()
+
+	# Take pending jobs for these files off the queue, running ones finish
+	def cancel(self, file_paths):
+		with self.connect() as db:
+			db.executemany("DELETE FROM jobs WHERE file_path = ? AND status = 'pending'", [(file_path,) for file_path in file_paths])
+
+	# A watcher has job_started(file_path) and job_finished(file_path, ok),
+	# called on the worker thread around every try of a job
+	def add_watcher(self, watcher):
+		self.watchers.append(watcher)
+
+	def remove_watcher(self, watcher):
+		if watcher in self.watchers:
+			self.watchers.remove(watcher)
+
+	def wake(self):
+		with self.wakeup:
+			self.wakeup.notify_all()
+
+	# The server is back, everything waiting is due now
+	def resume(self):
+		with self.connect() as db:
+			db.execute("UPDATE jobs SET next_try = 0 WHERE status = 'pending'")
+		self.wake()
+
+	# Jobs by status, for showing in the UI
+	def counts(self):
+		with self.connect() as db:
+			return dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+	def start(self):
+		# Anything still running belongs to a run that did not finish
+		with self.connect() as db:
+			db.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'")
+		for _ in range(self.workers):
+			thread = threading.Thread(target=self.work, daemon=True)
+			thread.start()
+			self.threads.append(thread)
+
+	def stop(self):
+		with self.wakeup:
+			self.stopping = True
+			self.wakeup.notify_all()
+
+	# Take the next job that is due and mark it running. The UPDATE only
+	# succeeds for one worker, so two workers never get the same job.
+	def claim(self):
+		if self.breaker.blocked():
+			return None
+		with self.connect() as db:
+			while True:
+				row = db.execute("SELECT id, file_path, attempts, waits FROM jobs WHERE status = 'pending' AND next_try <= ? ORDER BY id LIMIT 1", (time.time(),)).fetchone()
+				if row is None:
+					return None
+				claimed = db.execute("UPDATE jobs SET status = 'running' WHERE id = ? AND status = 'pending'", (row[0],)).rowcount
+				db.commit()
+				if claimed:
+					return row
+
+	# Seconds until the next job that is waiting on a retry is due. Never
+	# more than a minute, in case a put() lands between claim() and wait().
+	def next_due(self):
+		with self.connect() as db:
+			row = db.execute("SELECT MIN(next_try) FROM jobs WHERE status = 'pending'").fetchone()
+		if row[0] is None:
+			return 60
+		# While a request is testing the server, check back every second
+		return min(max(row[0] - time.time(), self.breaker.wait(), 1 if self.breaker.testing else 0), 60)
+
+	# retry_after, if set, replaces the backoff delay before the next try
+	def finish(self, job_id, attempts, error, retry_after=None):
+		with self.connect() as db:
+			if error is None:
+				db.execute("UPDATE jobs SET status = 'done', attempts = ?, last_error = NULL WHERE id = ?", (attempts, job_id))
+			elif attempts >= MAX_ATTEMPTS:
+				db.execute("UPDATE jobs SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?", (attempts, error, job_id))
+			else:
+				delay = retry_after if retry_after is not None else jittered(min(RETRY_DELAY * 2 ** (max(attempts, 1) - 1), MAX_RETRY_DELAY))
+				db.execute("UPDATE jobs SET status = 'pending', attempts = ?, next_try = ?, last_error = ? WHERE id = ?", (attempts, time.time() + delay, error, job_id))
+
+	# Put a job that failed while the server's breaker is open back until the
+	# breaker closes, without counting it as a try
+	def wait_for_server(self, job_id, waits, error, delay):
+		with self.connect() as db:
+			db.execute("UPDATE jobs SET status = 'pending', waits = ?, next_try = ?, last_error = ? WHERE id = ?", (waits, time.time() + delay, error, job_id))
+
+	# Put a job back without counting it as a try
+	def postpone(self, job_id, delay):
+		with self.connect() as db:
+			db.execute("UPDATE jobs SET status = 'pending', next_try = ? WHERE id = ?", (time.time() + delay, job_id))
+
+	def work(self):
+		lower_priority()
+		while not self.stopping:
+			job = self.claim()
+			if job is None:
+				with self.wakeup:
+					if not self.stopping:
+						self.wakeup.wait(self.next_due())
+				continue
+			job_id, file_path, attempts, waits = job
+			delay = self.defer(file_path) if self.defer is not None else 0
+			if delay:
+				print(f"Holding back {os.path.basename(file_path)} for {delay:.0f} s", flush=True)
+				self.postpone(job_id, delay)
+				continue
+			error = None
+			for watcher in list(self.watchers):
+				watcher.job_started(file_path)
+			try:
+				if not os.path.exists(file_path):
+					# Nothing left to upload, don't keep trying
+					attempts = MAX_ATTEMPTS - 1
+					error = "File not found"
+				elif not self.handler(file_path):
+					error = "Upload failed"
+			except Exception as e:
+				error = repr(e)
+			for watcher in list(self.watchers):
+				watcher.job_finished(file_path, error is None)
+			if error is not None and self.breaker.wait() > 0 and waits < MAX_WAITS:
+				# The server is down, not the job's fault
+				self.wait_for_server(job_id, waits + 1, error, self.breaker.wait())
+			else:
+				self.finish(job_id, attempts + 1, error)
@@ -1,15 +1,14 @@
 import wx
+import wx.lib.scrolledpanel
 import os
 import sys
 import pystray
-import time
 from PIL import Image
-import requests
-import datetime
+from logfiles import LogScanner
+from batchupload import BatchUpload
+from wxdialogs import LogFileListCtrl, BatchProgressDialog
+from uploadapp import UploadApp
 from plyer import notification
-from plyer.utils import platform
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
 
 if getattr(sys, 'frozen', False):
 	# Running as compiled executable
@@ -21,34 +20,23 @@ else:
 # Create a tray icon
 icon_path = os.path.join(exe_dir, "icon2.ico")
 
-def show_tray_message(ntitle, nmessage):
+# URL for the upload endpoint
+upload_url = "http://127.0.0.1:8000/api/upload/"
+
+# Function to show a toast, blocks until it is gone so only the notifier thread calls it
+def display_tray_message(ntitle, nmessage):
 	#toaster = ToastNotifier()
 	#toaster.show_toast(title, message, duration=5, icon_path = icon_path, threaded=True)
 	notification.notify(title=ntitle, message=nmessage, app_name='PvP Lookup', app_icon=icon_path, timeout=10, ticker='', toast=True, hints={})
 	
+# The upload queue, indexes, tailer and watcher, see uploadapp.py
+uploads = UploadApp(upload_url, 'PvP Lookup', icon_path, display_tray_message)
+
 def test_try_msg():
-	show_tray_message("Upload Failed", "Failed to upload the file.")
-
-def upload_file(file_path):
-	print(f"Uploading {file_path}")
-	# Read the contents of the file
-	with open(file_path, 'r', encoding='utf-8') as f:
-		file_contents = f.read()
-	# URL for the upload endpoint
-	url = "http://127.0.0.1:8000/api/upload/"
-	# Prepare the payload for the request
-	payload = {'file_contents': file_contents}
-	# Send the request
-	response = requests.post(url, json=payload)
-	# Check the response status code
-	if response.status_code == 200:
-		print("File uploaded successfully.", flush=True)
-		show_tray_message("Upload Successful", f"Successfully uploaded {os.path.basename(file_path)}")
-	else:
-		print("Failed to upload file.", flush=True)
-		show_tray_message("Upload Failed", "Failed to upload the file.")
-		
+	uploads.show_tray_message("Upload Failed", "Failed to upload the file.", kind='failed')
+
 def on_quit_callback(icon, item):
+	uploads.stop()
 	print("Quit item clicked", flush=True)
 	icon.stop()
 	wx.CallAfter(wx.GetApp().ExitMainLoop)
@@ -70,14 +58,22 @@ class ManualUploadDialog(wx.Dialog):
 		self.icon_path = icon_path
 		self.SetIcon(wx.Icon(self.icon_path, wx.BITMAP_TYPE_ICO))
 		vbox = wx.BoxSizer(wx.VERTICAL)
-		self.file_listctrl = wx.ListCtrl(self, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
+		self.file_listctrl = LogFileListCtrl(self)
 		self.file_listctrl.InsertColumn(0, "File Name")
 		self.file_listctrl.InsertColumn(1, "Date Created")
+		self.file_listctrl.InsertColumn(2, "Arena Matches")
+		self.file_listctrl.InsertColumn(3, "Status")
 		# Set the width of the columns
 		self.file_listctrl.SetColumnWidth(0, 300)  # Adjust width of first column
 		self.file_listctrl.SetColumnWidth(1, 150)  # Adjust width of second column
+		self.file_listctrl.SetColumnWidth(2, 100)
+		self.file_listctrl.SetColumnWidth(3, 120)
 		vbox.Add(self.file_listctrl, 1, wx.EXPAND | wx.ALL, 10)
-		upload_button = wx.Button(self, label="Upload Selected File")
+		select_button = wx.Button(self, label="Select Not Uploaded")
+		select_button.Bind(wx.EVT_BUTTON, self.on_select_not_uploaded)
+		vbox.Add(select_button, 0, wx.ALIGN_CENTER | wx.ALL, 10)
+		
+		upload_button = wx.Button(self, label="Upload Selected Files")
 		upload_button.Bind(wx.EVT_BUTTON, self.on_upload)
 		vbox.Add(upload_button, 0, wx.ALIGN_CENTER | wx.ALL, 10)
 		close_button = wx.Button(self, label="Close")
@@ -102,6 +98,7 @@ class ManualUploadDialog(wx.Dialog):
 
 	def OnDestroy(self, event):
 		print ('In OnDestroy', flush=True)
+		self.scanner.stop()
 		event.Skip()
 
 	def _close(self):
@@ -119,26 +116,33 @@ class ManualUploadDialog(wx.Dialog):
 		print ('In Close')
 		self.Destroy()
 
+	# Fill the list from a background scan so the dialog opens straight away
 	def populate_file_list(self):
-		directory = "C:\\Program Files (x86)\\World of Warcraft\\_retail_\\Logs"
-		files = [f for f in os.listdir(directory) if f.startswith("WoWCombatLog-") and f.endswith(".txt")]
-		for file_name in files:
-			file_path = os.path.join(directory, file_name)
-			created_time = os.path.getctime(file_path)
-			created_date = datetime.datetime.fromtimestamp(created_time).strftime("%Y-%m-%d %H:%M:%S")
-			index = self.file_listctrl.InsertItem(self.file_listctrl.GetItemCount(), file_name)
-			self.file_listctrl.SetItem(index, 1, created_date)
+		self.scanner = LogScanner(uploads.log_folders(), wx.CallAfter, self.file_listctrl.add_files, self.file_listctrl.set_matches, uploads.match_count, uploads.log_cache)
+		self.scanner.start()
 
+	# Upload the selected logs as one batch, the dialog stays usable meanwhile
 	def on_upload(self, event):
-		selection = self.file_listctrl.GetFirstSelected()
-		if selection != wx.NOT_FOUND:
-			file_name = self.file_listctrl.GetItemText(selection)
-			file_path = os.path.join("C:\\Program Files (x86)\\World of Warcraft\\_retail_\\Logs", file_name)
-			print(f"file selected {file_path}!", flush=True)
-			upload_file(file_path)
+		file_paths = self.file_listctrl.selected_paths()
+		if file_paths:
+			progress_dialog = BatchProgressDialog(self, file_paths)
+			batch = BatchUpload(file_paths, uploads.upload_queue, uploads.upload_size, wx.CallAfter, progress_dialog.update_progress, self.on_file_done)
+			progress_dialog.batch = batch
+			progress_dialog.Show()
+			batch.start()
 		else:
 			wx.MessageBox("Please select a file to upload.", "No file selected", wx.OK | wx.ICON_INFORMATION)
 
+	def on_select_not_uploaded(self, event):
+		self.file_listctrl.select_rows(self.file_listctrl.files.not_uploaded())
+
+	def on_file_done(self, value):
+		if not self:
+			return
+		file_path, ok = value
+		entry = uploads.log_cache.get(file_path)
+		self.file_listctrl.set_status(file_path, entry['status'] if entry else None)
+
 class InfoFrame(wx.Frame):
 	def __init__(self, icon):
 		super().__init__(None, title="PvP Lookup Log Uploader", size=(400, 200))
@@ -158,27 +162,21 @@ class InfoFrame(wx.Frame):
 	def on_close(self, event):
 		self.Hide()
 
-class NewLogFileHandler(FileSystemEventHandler):
-	def on_created(self, event):
-		if not event.is_directory and event.src_path.endswith(".txt") and "WoWCombatLog-" in event.src_path:
-			print(f"New log file detected: {event.src_path}")
-			upload_file(event.src_path)
-
-def setup_file_monitoring():
-	path_to_watch = "C:\\Program Files (x86)\\World of Warcraft\\_retail_\\Logs"
-	event_handler = NewLogFileHandler()
-	observer = Observer()
-	observer.schedule(event_handler, path=path_to_watch, recursive=False)
-	observer.start()
-	
 class MyApp(wx.App):
 	def OnInit(self):
-		show_tray_message("PvP Lookup", "Running in the background.")
+		# Upload callbacks come back on the wx thread
+		uploads.upload_engine.set_dispatcher(wx.CallAfter)
+		uploads.upload_queue.start()
+		uploads.show_tray_message("PvP Lookup", "Running in the background.")
 		# You can initialize file monitoring here if needed
-		setup_file_monitoring()
+		uploads.setup_file_monitoring()
 		return True
 
+# wx.App the dialogs run in, kept for as long as the tray icon is up
+wx_app = None
+
 def main():
+	global wx_app
 	# Get the path to the directory containing the executable or the script file
 	icon = pystray.Icon("PvP Lookup Combat Log Uploader")
 	icon.icon = Image.open(icon_path)
@@ -188,7 +186,7 @@ def main():
 	info_item = pystray.MenuItem("Info", show_info_window)
 	manual_upload_item = pystray.MenuItem("Manual Upload", show_manual_upload_dialog)
 	icon.menu = (info_item, manual_upload_item, quit_item)
-	app = MyApp(False)
+	wx_app = MyApp(False)
 	icon.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+import os
+import time
+import sqlite3
+import threading
+import datetime
+from uploader import state_dir, url_key
+from logfiles import LogFile, UPLOADED_STATUSES, is_log_name
+
+# What is known about each combat log in the Logs folder: size, mtime and
+# creation time, how many arena matches it has and how its last upload went.
+# The watchdog handler tells the cache which files changed, and the one full
+# pass over the folder happens in sync() at startup, so opening the manual
+# upload dialog or deciding what to upload only costs a query plus a stat of
+# the files that changed since.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+	file_path TEXT PRIMARY KEY,
+	directory TEXT NOT NULL,
+	name TEXT NOT NULL,
+	size INTEGER NOT NULL,
+	mtime_ns INTEGER NOT NULL,
+	created REAL NOT NULL,
+	matches INTEGER,
+	status TEXT,
+	status_time REAL
+);
+CREATE INDEX IF NOT EXISTS logs_directory ON logs (directory);
+"""
+
+class LogCache:
+	def __init__(self, url, db_path=None):
+		self.db_path = db_path or os.path.join(state_dir(), f"logs-{url_key(url)}.sqlite3")
+		self.lock = threading.Lock()
+		# Files with watchdog events since they were last looked at
+		self.dirty = set()
+		# Directories synced since the app started
+		self.synced = set()
+		with self.connect() as db:
+			db.executescript(SCHEMA)
+
+	def connect(self):
+		return sqlite3.connect(self.db_path, timeout=30)
+
+	# Called from watchdog events, only remembers the path so a busy live log
+	# costs nothing until someone reads the cache
+	def touch(self, file_path):
+		with self.lock:
+			self.dirty.add(file_path)
+
+	def refresh_dirty(self, db):
+		with self.lock:
+			dirty, self.dirty = self.dirty, set()
+		for file_path in dirty:
+			try:
+				stat = os.stat(file_path)
+			except OSError:
+				db.execute("DELETE FROM logs WHERE file_path = ?", (file_path,))
+				continue
+			self.store(db, file_path, stat)
+
+	# Insert or update a row. A file whose size or mtime changed loses its
+	# match count, and its status unless an upload is queued for it.
+	def store(self, db, file_path, stat):
+		row = db.execute("SELECT size, mtime_ns FROM logs WHERE file_path = ?", (file_path,)).fetchone()
+		if row is not None and row == (stat.st_size, stat.st_mtime_ns):
+			return False
+		if row is None:
+			db.execute("INSERT INTO logs (file_path, directory, name, size, mtime_ns, created) VALUES (?, ?, ?, ?, ?, ?)", (file_path, os.path.dirname(file_path), os.path.basename(file_path), stat.st_size, stat.st_mtime_ns, stat.st_ctime))
+		else:
+			db.execute("UPDATE logs SET size = ?, mtime_ns = ?, matches = NULL, status = CASE WHEN status = 'queued' THEN status END WHERE file_path = ?", (stat.st_size, stat.st_mtime_ns, file_path))
+		return True
+
+	# Bring the cache in line with a directory after the app was not running.
+	# Only files that are new or changed are written. Returns how many were.
+	def sync(self, directory):
+		seen = set()
+		changed = 0
+		with self.connect() as db:
+			with os.scandir(directory) as entries:
+				for entry in entries:
+					if not is_log_name(entry.name):
+						continue
+					try:
+						stat = entry.stat()
+					except OSError:
+						continue
+					seen.add(entry.path)
+					if self.store(db, entry.path, stat):
+						changed += 1
+			for (file_path,) in db.execute("SELECT file_path FROM logs WHERE directory = ?", (directory,)).fetchall():
+				if file_path not in seen:
+					db.execute("DELETE FROM logs WHERE file_path = ?", (file_path,))
+					changed += 1
+		self.synced.add(directory)
+		return changed
+
+	# True once sync() has been through the directory in this run, from then
+	# on watchdog events keep the cache up to date
+	def is_synced(self, directory):
+		return directory in self.synced
+
+	def remove(self, file_path):
+		with self.lock:
+			self.dirty.discard(file_path)
+		with self.connect() as db:
+			db.execute("DELETE FROM logs WHERE file_path = ?", (file_path,))
+
+	# True if anything is known about the logs in a directory
+	def has_files(self, directory):
+		with self.connect() as db:
+			return db.execute("SELECT 1 FROM logs WHERE directory = ? LIMIT 1", (directory,)).fetchone() is not None
+
+	# Logs in a directory as LogFile, oldest first, each with the match count
+	# (None if not worked out yet) and upload status
+	def files(self, directory):
+		with self.connect() as db:
+			self.refresh_dirty(db)
+			rows = db.execute("SELECT name, file_path, created, matches, status FROM logs WHERE directory = ? ORDER BY created", (directory,)).fetchall()
+		files = []
+		for name, file_path, created, matches, status in rows:
+			created_date = datetime.datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M:%S")
+			files.append(LogFile(name, file_path, created, created_date, matches, status))
+		return files
+
+	def get(self, file_path):
+		with self.connect() as db:
+			self.refresh_dirty(db)
+			row = db.execute("SELECT size, mtime_ns, matches, status FROM logs WHERE file_path = ?", (file_path,)).fetchone()
+		if row is None:
+			return None
+		return dict(zip(('size', 'mtime_ns', 'matches', 'status'), row))
+
+	def set_matches(self, file_path, count):
+		with self.connect() as db:
+			db.execute("UPDATE logs SET matches = ? WHERE file_path = ?", (count, file_path))
+
+	def set_status(self, file_path, status):
+		with self.connect() as db:
+			self.refresh_dirty(db)
+			db.execute("UPDATE logs SET status = ?, status_time = ? WHERE file_path = ?", (status, time.time(), file_path))
+
+	# True if the file has not changed since it was last uploaded, or since it
+	# was found to have nothing to upload
+	def up_to_date(self, file_path):
+		entry = self.get(file_path)
+		if entry is None or entry['status'] not in UPLOADED_STATUSES:
+			return False
+		try:
+			stat = os.stat(file_path)
+		except OSError:
+			return False
+		return (stat.st_size, stat.st_mtime_ns) == (entry['size'], entry['mtime_ns'])
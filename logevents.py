@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+from watchdog.events import FileSystemEventHandler, FileCreatedEvent, FileModifiedEvent
+from logfiles import is_log_name
+
+# Watchdog events for combat logs, cleaned up before the app sees them. WoW
+# writes the log in bursts and every flush is an event, often several, so
+# events for a path are held for DEBOUNCE_SECONDS and passed on as one: a
+# create and the modifies after it are one on_created, a burst of modifies is
+# one on_modified. Deletes and moves are passed on straight away and drop
+# anything still held for the old path. Only files logfiles.is_log_name
+# takes for combat logs get through.
+#
+# Once a log's size and modification time have not changed for quiet_seconds
+# the handler's on_log_stable(file_path) is called, once, which is when the
+# whole log is there to upload. If the log grows again it becomes stable
+# again later and on_log_stable is called again.
+
+# How long events for a path are collected before they are passed on
+DEBOUNCE_SECONDS = 1
+# How long a log has to stay unchanged to count as complete
+QUIET_SECONDS = 60
+
+def is_combat_log(file_path):
+	return is_log_name(os.path.basename(file_path))
+
+def file_state(file_path):
+	try:
+		stat = os.stat(file_path)
+	except OSError:
+		return None
+	return stat.st_size, stat.st_mtime_ns
+
+class LogEventCoalescer(FileSystemEventHandler):
+	def __init__(self, handler, quiet_seconds=QUIET_SECONDS, debounce_seconds=DEBOUNCE_SECONDS):
+		self.handler = handler
+		self.quiet_seconds = quiet_seconds
+		self.debounce_seconds = debounce_seconds
+		self.lock = threading.Lock()
+		self.pending = {}
+
+	# Run check on a timer thread after delay seconds. A sooner timer
+	# replaces a later one, a later one never replaces a sooner one.
+	def schedule(self, file_path, entry, delay, replace=False):
+		if entry.get('timer') is not None:
+			if not replace:
+				return
+			entry['timer'].cancel()
+		timer = threading.Timer(delay, self.check, args=(file_path,))
+		timer.daemon = True
+		entry['timer'] = timer
+		timer.start()
+
+	def changed(self, file_path, created=False):
+		with self.lock:
+			entry = self.pending.setdefault(file_path, {'created': False, 'changed': False, 'state': None, 'since': 0})
+			entry['created'] = entry['created'] or created
+			entry['changed'] = True
+			# Held events go out after the debounce, however long the burst
+			if not entry.get('debouncing'):
+				entry['debouncing'] = True
+				self.schedule(file_path, entry, self.debounce_seconds, replace=True)
+
+	def drop(self, file_path):
+		with self.lock:
+			entry = self.pending.pop(file_path, None)
+		if entry is not None and entry.get('timer') is not None:
+			entry['timer'].cancel()
+
+	# Pass on held events, then see whether the log has settled
+	def check(self, file_path):
+		with self.lock:
+			entry = self.pending.get(file_path)
+			if entry is None:
+				return
+			entry['timer'] = None
+			entry['debouncing'] = False
+			created, changed = entry['created'], entry['changed']
+			entry['created'] = entry['changed'] = False
+		if created:
+			self.handler.on_created(FileCreatedEvent(file_path))
+		elif changed:
+			self.handler.on_modified(FileModifiedEvent(file_path))
+		state = file_state(file_path)
+		now = time.monotonic()
+		with self.lock:
+			if self.pending.get(file_path) is not entry or entry['timer'] is not None:
+				# Dropped, or newer events have a timer of their own
+				return
+			if state is None:
+				del self.pending[file_path]
+				return
+			if state != entry['state']:
+				entry['state'] = state
+				entry['since'] = now
+			quiet = now - entry['since']
+			if quiet < self.quiet_seconds:
+				self.schedule(file_path, entry, self.quiet_seconds - quiet)
+				return
+			del self.pending[file_path]
+		self.handler.on_log_stable(file_path)
+
+	def on_created(self, event):
+		if not event.is_directory and is_combat_log(event.src_path):
+			self.changed(event.src_path, created=True)
+
+	def on_modified(self, event):
+		if not event.is_directory and is_combat_log(event.src_path):
+			self.changed(event.src_path)
+
+	def on_deleted(self, event):
+		if not event.is_directory and is_combat_log(event.src_path):
+			self.drop(event.src_path)
+			self.handler.on_deleted(event)
+
+	def on_moved(self, event):
+		if event.is_directory:
+			return
+		self.drop(event.src_path)
+		self.handler.on_moved(event)
+		if is_combat_log(event.dest_path):
+			# A log moved in, or renamed into place, is complete once it settles
+			self.changed(event.dest_path)
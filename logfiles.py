@@ -0,0 +1,176 @@
+import os
+import re
+import bisect
+import datetime
+import threading
+from collections import namedtuple
+
+# Listing the combat logs for the manual upload dialog. The Logs folder can
+# hold years of logs, sometimes on a network drive, so it is read with one
+# os.scandir pass on a background thread and handed to the dialog in batches
+# as it goes. scandir returns the file times with the listing on Windows, so
+# there is no extra stat call per file.
+
+# Logs handed to the dialog at a time
+BATCH_SIZE = 200
+
+# matches and status come from the LogCache when there is one
+LogFile = namedtuple('LogFile', ['name', 'path', 'created', 'created_date', 'matches', 'status'], defaults=(None, None))
+
+# Upload status as the dialog shows it
+STATUS_LABELS = {
+	'queued': 'Queued',
+	'uploaded': 'Uploaded',
+	'exists': 'Already uploaded',
+	'nothing': 'Nothing to upload',
+	'failed': 'Failed',
+}
+# Statuses of logs that don't need uploading again
+UPLOADED_STATUSES = ('uploaded', 'exists', 'nothing')
+
+# Names WoW gives combat logs. The watcher, the log cache and the file list
+# all go by this, so files that only look like logs, editor swap files or
+# "WoWCombatLog-1 - Copy.txt", are left out everywhere.
+COMBAT_LOG_NAME = re.compile(r'^WoWCombatLog-[\w.-]+\.txt$')
+
+def is_log_name(name):
+	return COMBAT_LOG_NAME.match(name) is not None
+
+# The logs in a directory, BATCH_SIZE at a time, in directory order
+def scan_logs(directory, batch_size=BATCH_SIZE):
+	batch = []
+	with os.scandir(directory) as entries:
+		for entry in entries:
+			if not is_log_name(entry.name):
+				continue
+			try:
+				created = entry.stat().st_ctime
+			except OSError:
+				continue
+			created_date = datetime.datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M:%S")
+			batch.append(LogFile(entry.name, entry.path, created, created_date))
+			if len(batch) >= batch_size:
+				yield batch
+				batch = []
+	if batch:
+		yield batch
+
+# Logs kept in order of creation, oldest first, as the dialog shows them.
+# Both toolkits' list views read from one of these.
+class LogFileList:
+	def __init__(self):
+		self.rows = []
+		self.keys = []
+		self.matches = {}
+		self.positions = None
+
+	def __len__(self):
+		return len(self.rows)
+
+	def __getitem__(self, row):
+		return self.rows[row]
+
+	# Row a file would go in at
+	def position(self, log_file):
+		return bisect.bisect(self.keys, log_file.created)
+
+	# Add a file and return the row it went in at
+	def insert(self, log_file, row=None):
+		if row is None:
+			row = self.position(log_file)
+		self.keys.insert(row, log_file.created)
+		self.rows.insert(row, log_file)
+		self.positions = None
+		return row
+
+	def row_of(self, file_path):
+		if self.positions is None:
+			self.positions = {log_file.path: row for row, log_file in enumerate(self.rows)}
+		return self.positions.get(file_path)
+
+	def set_status(self, file_path, status):
+		row = self.row_of(file_path)
+		if row is not None:
+			self.rows[row] = self.rows[row]._replace(status=status)
+		return row
+
+	# Rows of the logs that have not been uploaded
+	def not_uploaded(self):
+		return [row for row, log_file in enumerate(self.rows) if log_file.status not in UPLOADED_STATUSES]
+
+	# Text for a cell: file name, created date, arena matches or upload status
+	def cell(self, row, column):
+		log_file = self.rows[row]
+		if column == 0:
+			return log_file.name
+		if column == 1:
+			return log_file.created_date
+		if column == 2:
+			if log_file.path in self.matches:
+				return self.matches[log_file.path]
+			return "" if log_file.matches is None else str(log_file.matches)
+		return STATUS_LABELS.get(log_file.status, "")
+
+# Fills a dialog from a background thread, from every folder in directories. dispatch(callback, value) must run
+# callback(value) on the GUI thread, like wx.CallAfter or a queued Qt signal.
+# on_files gets each batch of LogFile, then on_matches gets (path, count)
+# for each log once the listing is done, as match_count(path) works it out.
+# With a LogCache the listing comes from the cache straight away, with the
+# match counts and statuses it knows, and only the files with watchdog
+# events since are looked at again. A folder the startup sync has not got to
+# yet is synced after that first batch is shown, and the logs it turns up
+# are added. A folder the cache has nothing for yet is scanned in batches as
+# without a cache, and synced after. Only logs without a cached match count
+# are counted.
+class LogScanner:
+	def __init__(self, directories, dispatch, on_files, on_matches=None, match_count=None, cache=None):
+		self.directories = directories
+		self.cache = cache
+		self.dispatch = dispatch
+		self.on_files = on_files
+		self.on_matches = on_matches
+		self.match_count = match_count
+		self.stopped = threading.Event()
+		self.thread = threading.Thread(target=self.run, daemon=True)
+
+	def start(self):
+		self.thread.start()
+
+	# Called when the dialog goes away, nothing is dispatched after this
+	def stop(self):
+		self.stopped.set()
+
+	def run(self):
+		found = []
+		for directory in self.directories:
+			try:
+				if self.cache is not None and self.cache.has_files(directory):
+					batch = self.cache.files(directory)
+					found.extend(batch)
+					self.dispatch(self.on_files, batch)
+					if not self.cache.is_synced(directory):
+						self.cache.sync(directory)
+						shown = {log_file.path for log_file in batch}
+						batch = [log_file for log_file in self.cache.files(directory) if log_file.path not in shown]
+						if batch and not self.stopped.is_set():
+							found.extend(batch)
+							self.dispatch(self.on_files, batch)
+					continue
+				for batch in scan_logs(directory):
+					if self.stopped.is_set():
+						return
+					found.extend(batch)
+					self.dispatch(self.on_files, batch)
+				if self.cache is not None:
+					self.cache.sync(directory)
+			except OSError as e:
+				print(f"Could not list {directory}: {e!r}", flush=True)
+		if self.on_matches is None:
+			return
+		# Newest logs first, those are the ones people upload
+		for log_file in sorted(found, key=lambda log_file: log_file.created, reverse=True):
+			if self.stopped.is_set():
+				return
+			if log_file.matches is not None:
+				continue
+			self.dispatch(self.on_matches, (log_file.path, self.match_count(log_file.path)))
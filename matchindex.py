@@ -0,0 +1,63 @@
+import os
+import json
+import sqlite3
+from uploader import state_dir
+from arenamatch import ArenaMatch, scan_matches
+
+# Index of the arena matches in each combat log, so the file list and the
+# upload code know how many matches a log has, and where they are, without
+# scanning it again. Entries live in one SQLite database in the state folder,
+# a row per log keyed by path and checked against the file's size and mtime,
+# so a changed log rewrites only its own row. A log that has only grown is
+# scanned from where the last scan stopped, anything else is scanned from the
+# top.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+	file_path TEXT PRIMARY KEY,
+	size INTEGER NOT NULL,
+	mtime_ns INTEGER NOT NULL,
+	resume INTEGER,
+	header TEXT,
+	matches TEXT NOT NULL
+);
+"""
+
+class MatchIndex:
+	def __init__(self, db_path=None):
+		self.db_path = db_path or os.path.join(state_dir(), "matches.sqlite3")
+		with self.connect() as db:
+			db.executescript(SCHEMA)
+
+	def connect(self):
+		db = sqlite3.connect(self.db_path, timeout=30)
+		db.execute('PRAGMA journal_mode=WAL')
+		return db
+
+	# The arena matches in a log, complete or not, as ArenaMatch objects
+	def matches(self, file_path):
+		stat = os.stat(file_path)
+		with self.connect() as db:
+			row = db.execute("SELECT size, mtime_ns, resume, header, matches FROM matches WHERE file_path = ?", (file_path,)).fetchone()
+		if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+			return [ArenaMatch.from_list(values) for values in json.loads(row[4])]
+		if row is not None and row[0] < stat.st_size:
+			# Log has grown, carry on from the last match that had not ended
+			found = [ArenaMatch.from_list(values) for values in json.loads(row[4])]
+			header = json.loads(row[3]) if row[3] else None
+			new, resume, header = scan_matches(file_path, row[2], tuple(header) if header else None)
+			found.extend(new)
+		else:
+			found, resume, header = scan_matches(file_path)
+		with self.connect() as db:
+			db.execute("INSERT OR REPLACE INTO matches (file_path, size, mtime_ns, resume, header, matches) VALUES (?, ?, ?, ?, ?, ?)", (file_path, stat.st_size, stat.st_mtime_ns, resume, json.dumps(list(header)) if header else None, json.dumps([match.to_list() for match in found])))
+		return found
+
+	# Number of arena matches in a log that have ended
+	def count(self, file_path):
+		return sum(1 for match in self.matches(file_path) if match.complete)
+
+	# Drop the entry of a log that is gone
+	def forget(self, file_path):
+		with self.connect() as db:
+			db.execute("DELETE FROM matches WHERE file_path = ?", (file_path,))
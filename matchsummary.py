@@ -0,0 +1,163 @@
+import io
+import json
+import requests
+from uploader import get_session
+from wowinstalls import flavor_of
+from combatlog import read_batches
+
+# Summary of one arena match worked out on the client: who played, their
+# specs and ratings, damage and healing done, who died in what order and how
+# long it took. It is a few KB against the megabytes of the match itself, so
+# it is sent first and the site can show the result straight away while the
+# raw match follows.
+
+SUMMARY_VERSION = 1
+
+# Damage and healing events, the amount sits after the 8 unit fields, the 3
+# spell fields (none for swings) and the 17 advanced logging fields
+DAMAGE_EVENTS = {
+	'SWING_DAMAGE': 25,
+	'RANGE_DAMAGE': 28,
+	'SPELL_DAMAGE': 28,
+	'SPELL_PERIODIC_DAMAGE': 28,
+	'SPELL_BUILDING_DAMAGE': 28,
+	'DAMAGE_SPLIT': 28,
+}
+HEAL_EVENTS = {
+	'SPELL_HEAL': 28,
+	'SPELL_PERIODIC_HEAL': 28,
+}
+# Owner of the source unit among the advanced logging fields, so pet and
+# totem damage counts for the player
+OWNER_FIELD = {25: 9, 28: 12}
+# COMBATANT_INFO fields, the pvp stats close the line
+COMBATANT_TEAM = 1
+COMBATANT_SPEC = 23
+COMBATANT_RATING = -2
+
+NO_UNIT = '0000000000000000'
+
+# Urls that have answered that they don't take summaries
+summaries_unsupported = set()
+
+def to_int(value, default=0):
+	try:
+		return int(value)
+	except (TypeError, ValueError):
+		return default
+
+def unnamed(players):
+	return any(entry['name'] is None for entry in players.values())
+
+def read_match(file_path, match):
+	with open(file_path, 'rb') as f:
+		f.seek(match.start)
+		return f.read(match.end - match.start)
+
+# Work out the summary of a complete ArenaMatch as a dict ready to send
+def summarize_match(file_path, match, digest=None):
+	players = {}
+	deaths = []
+	start_time = end_time = None
+	summary = {'version': SUMMARY_VERSION, 'digest': digest, 'flavor': flavor_of(file_path)}
+
+	def player(guid):
+		if guid not in players:
+			players[guid] = {'guid': guid, 'name': None, 'team': None, 'spec': None, 'rating': None, 'damage': 0, 'healing': 0, 'died': False}
+		return players[guid]
+
+	for batch in read_batches(io.BytesIO(read_match(file_path, match))):
+		for i, event in enumerate(batch.events):
+			if event in DAMAGE_EVENTS or event in HEAL_EVENTS:
+				amount_field = DAMAGE_EVENTS.get(event) or HEAL_EVENTS[event]
+				fields = batch.fields(i)
+				if len(fields) <= amount_field + 2:
+					continue
+				source = fields[0]
+				owner = fields[OWNER_FIELD[amount_field]]
+				if owner != NO_UNIT and owner in players:
+					source = owner
+				if source in players and players[source]['name'] is None and source == fields[0]:
+					players[source]['name'] = fields[1]
+				if source not in players:
+					continue
+				if event in DAMAGE_EVENTS:
+					players[source]['damage'] += to_int(fields[amount_field])
+				else:
+					# Overhealing doesn't count
+					players[source]['healing'] += max(to_int(fields[amount_field]) - to_int(fields[amount_field + 2]), 0)
+			elif event == 'SPELL_CAST_SUCCESS' and unnamed(players):
+				# Players that never did damage or healing still cast something
+				fields = batch.fields(i)
+				if fields[0] in players and players[fields[0]]['name'] is None:
+					players[fields[0]]['name'] = fields[1]
+			elif event == 'COMBATANT_INFO':
+				fields = batch.fields(i)
+				entry = player(fields[0])
+				entry['team'] = to_int(fields[COMBATANT_TEAM], None)
+				entry['spec'] = to_int(fields[COMBATANT_SPEC], None) if len(fields) > COMBATANT_SPEC else None
+				entry['rating'] = to_int(fields[COMBATANT_RATING], None)
+			elif event == 'UNIT_DIED':
+				fields = batch.fields(i)
+				if len(fields) > 5 and fields[4] in players:
+					# Feign Death shows up as an unconscious death
+					if len(fields) > 8 and fields[8] == '1':
+						continue
+					players[fields[4]]['died'] = True
+					died = round(batch.timestamp(i) - start_time, 3) if start_time is not None else None
+					deaths.append({'guid': fields[4], 'name': fields[5], 'time': died})
+			elif event == 'ARENA_MATCH_START':
+				fields = batch.fields(i)
+				start_time = batch.timestamp(i)
+				summary['zone'] = to_int(fields[0], None)
+				summary['bracket'] = fields[2] if len(fields) > 2 else None
+				summary['rated'] = len(fields) > 3 and fields[3] == '1'
+				summary['start'] = start_time
+			elif event == 'ARENA_MATCH_END':
+				fields = batch.fields(i)
+				end_time = batch.timestamp(i)
+				summary['winner'] = to_int(fields[0], None)
+				summary['duration'] = to_int(fields[1], None) if len(fields) > 1 else None
+				summary['ratings'] = [to_int(value, None) for value in fields[2:4]]
+	if summary.get('duration') is None and start_time is not None and end_time is not None:
+		summary['duration'] = round(end_time - start_time)
+	summary['players'] = list(players.values())
+	summary['deaths'] = deaths
+	return summary
+
+# Send a summary to <url>/summary. Returns the response, or None if the
+# server has said before that it doesn't take summaries.
+def upload_summary(url, summary):
+	if url in summaries_unsupported:
+		return None
+	body = json.dumps(summary, separators=(',', ':')).encode('utf-8')
+	response = get_session().post(f"{url.rstrip('/')}/summary", data=body, headers={'Content-Type': 'application/json'})
+	if response.status_code in (404, 405, 501):
+		summaries_unsupported.add(url)
+		return None
+	return response
+
+# Summarize a match and send it, for running ahead of the match upload.
+# A summary is a nice to have, so failures are printed and otherwise ignored.
+def send_summary(url, file_path, match, digest=None):
+	return send_summaries([url], file_path, match, digest)[url]
+
+# send_summary for several servers, the match is only summarized once.
+# Returns the response from each url.
+def send_summaries(urls, file_path, match, digest=None):
+	responses = dict.fromkeys(urls)
+	try:
+		summary = summarize_match(file_path, match, digest)
+	except (OSError, ValueError, IndexError) as e:
+		print(f"Could not summarize {file_path}: {e!r}", flush=True)
+		return responses
+	for url in urls:
+		try:
+			response = upload_summary(url, summary)
+		except requests.RequestException as e:
+			print(f"Could not send summary for {file_path}: {e!r}", flush=True)
+			continue
+		if response is not None and response.status_code != 200:
+			print(f"Summary for {file_path} failed with {response.status_code}", flush=True)
+		responses[url] = response
+	return responses
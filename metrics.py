@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Where the time goes in an upload. Every upload of a file gets an UploadTrace
+# that the uploader adds to as it works: seconds spent in each stage, bytes
+# read and sent, requests made and how many of them were retries. When the
+# upload is done the trace becomes one record, given to every sink, the
+# rotating JSON lines file below and the optional Prometheus style endpoint.
+# Traces are looked up by file path like the progress callbacks, so code that
+# is not handed the trace, an engine thread sending one match say, can still
+# add to it. Without a trace for the path nothing is measured.
+#
+# Stages, in the order a log goes through them:
+#   detect    from the file event, or queueing, to the upload starting
+#   read      reading the log from disk
+#   hash      hashing it for the HashIndex
+#   compress  compressing the body
+#   throttle  waiting on the bandwidth limit while the game is played
+#   send      requests writing the body to the connection
+#   ack       from the last byte sent to the server's response
+# Uploads running side by side all add to their file's trace, so stage times
+# are totals over the requests and can add up to more than the wall time.
+
+STAGES = ('detect', 'read', 'hash', 'compress', 'throttle', 'send', 'ack')
+COUNTS = ('bytes_read', 'bytes_sent', 'requests', 'retries')
+
+# Size of the metrics file before it is rotated, and rotated files kept
+MAX_LOG_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+
+# Upper bounds of the upload duration histogram, in seconds
+DURATION_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 300)
+
+traces = {}
+detected_at = {}
+sinks = []
+lock = threading.Lock()
+
+class UploadTrace:
+	def __init__(self, file_path, kind, detected=None):
+		self.file_path = file_path
+		self.kind = kind
+		self.started = time.time()
+		self.start = time.monotonic()
+		self.lock = threading.Lock()
+		self.seconds = dict.fromkeys(STAGES, 0.0)
+		if detected is not None:
+			self.seconds['detect'] = self.start - detected
+		self.counts = dict.fromkeys(COUNTS, 0)
+		self.status = None
+
+	def add(self, stage, seconds):
+		with self.lock:
+			self.seconds[stage] += seconds
+
+	def count(self, name, n=1):
+		with self.lock:
+			self.counts[name] += n
+
+	# The record for the sinks
+	def entry(self, result):
+		with self.lock:
+			entry = {
+				'time': round(self.started, 3),
+				'file': os.path.basename(self.file_path),
+				'kind': self.kind,
+				'result': result,
+				'status': self.status,
+				'seconds': round(time.monotonic() - self.start, 4),
+				'stages': {stage: round(seconds, 4) for stage, seconds in self.seconds.items()},
+			}
+			entry.update(self.counts)
+		return entry
+
+def add_sink(sink):
+	sinks.append(sink)
+
+# Remember when a file was first seen to need uploading, for the detect stage
+def detected(file_path):
+	with lock:
+		detected_at.setdefault(file_path, time.monotonic())
+
+# Start tracing an upload of a file, kind says what started it
+def begin(file_path, kind='upload'):
+	with lock:
+		trace = traces[file_path] = UploadTrace(file_path, kind, detected_at.pop(file_path, None))
+	return trace
+
+# Finish the trace of a file and hand it to the sinks. Live uploads that
+# found nothing to send are dropped, they happen on every quiet timer.
+def end(file_path, result, status=None):
+	with lock:
+		trace = traces.pop(file_path, None)
+	if trace is None or (trace.kind == 'live' and not trace.counts['requests']):
+		return None
+	if status is not None:
+		trace.status = status
+	entry = trace.entry(result)
+	for sink in sinks:
+		try:
+			sink.record(entry)
+		except Exception as e:
+			print(f"Could not record metrics: {e!r}", flush=True)
+	return entry
+
+def current(file_path):
+	return traces.get(file_path)
+
+def add_time(file_path, stage, seconds):
+	trace = traces.get(file_path)
+	if trace is not None:
+		trace.add(stage, seconds)
+
+def add_count(file_path, name, n=1):
+	trace = traces.get(file_path)
+	if trace is not None:
+		trace.count(name, n)
+
+# Time a block of code as a stage of the file's upload
+@contextmanager
+def timed(file_path, stage):
+	start = time.monotonic()
+	try:
+		yield
+	finally:
+		add_time(file_path, stage, time.monotonic() - start)
+
+# Pass a request body through, counting the bytes and timing how long
+# requests takes to send each chunk before asking for the next one. The time
+# the body ran out is appended to finished, for the ack stage.
+def metered(file_path, chunks, finished=None):
+	for chunk in chunks:
+		start = time.monotonic()
+		yield chunk
+		add_time(file_path, 'send', time.monotonic() - start)
+		add_count(file_path, 'bytes_sent', len(chunk))
+	if finished is not None:
+		finished.append(time.monotonic())
+
+# Record as JSON lines, one per upload, rotated like a log file
+class MetricsLog:
+	def __init__(self, path, max_bytes=MAX_LOG_BYTES, backups=LOG_BACKUPS):
+		self.path = path
+		self.max_bytes = max_bytes
+		self.backups = backups
+		self.lock = threading.Lock()
+
+	def rotate(self):
+		for i in range(self.backups - 1, 0, -1):
+			if os.path.exists(f"{self.path}.{i}"):
+				os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+		os.replace(self.path, f"{self.path}.1")
+
+	def record(self, entry):
+		line = json.dumps(entry, separators=(',', ':')) + '\n'
+		with self.lock:
+			try:
+				if os.path.getsize(self.path) + len(line) > self.max_bytes:
+					self.rotate()
+			except OSError:
+				pass
+			with open(self.path, 'a', encoding='utf-8') as f:
+				f.write(line)
+
+# Totals since the app started in the Prometheus text format, served on
+# http://127.0.0.1:<port>/metrics for a local scraper
+class MetricsServer:
+	def __init__(self, port, host='127.0.0.1'):
+		self.lock = threading.Lock()
+		self.uploads = {}
+		self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+		self.counts = dict.fromkeys(COUNTS, 0)
+		self.buckets = [0] * len(DURATION_BUCKETS)
+		self.duration_sum = 0.0
+		self.duration_count = 0
+		server = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				if self.path.split('?')[0] != '/metrics':
+					self.send_error(404)
+					return
+				body = server.render().encode('utf-8')
+				self.send_response(200)
+				self.send_header('Content-Type', 'text/plain; version=0.0.4')
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, format, *args):
+				pass
+
+		self.httpd = ThreadingHTTPServer((host, port), Handler)
+		self.httpd.daemon_threads = True
+		threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+	def record(self, entry):
+		with self.lock:
+			key = (entry['kind'], entry['result'])
+			self.uploads[key] = self.uploads.get(key, 0) + 1
+			for stage, seconds in entry['stages'].items():
+				self.stage_seconds[stage] += seconds
+			for name in COUNTS:
+				self.counts[name] += entry[name]
+			for i, bound in enumerate(DURATION_BUCKETS):
+				if entry['seconds'] <= bound:
+					self.buckets[i] += 1
+			self.duration_sum += entry['seconds']
+			self.duration_count += 1
+
+	def render(self):
+		with self.lock:
+			lines = ['# TYPE arenalogs_uploads_total counter']
+			for (kind, result), count in sorted(self.uploads.items()):
+				lines.append(f'arenalogs_uploads_total{{kind="{kind}",result="{result}"}} {count}')
+			lines.append('# TYPE arenalogs_stage_seconds_total counter')
+			for stage, seconds in self.stage_seconds.items():
+				lines.append(f'arenalogs_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}')
+			for name, count in self.counts.items():
+				lines.append(f'# TYPE arenalogs_{name}_total counter')
+				lines.append(f'arenalogs_{name}_total {count}')
+			lines.append('# TYPE arenalogs_upload_duration_seconds histogram')
+			for bound, count in zip(DURATION_BUCKETS, self.buckets):
+				lines.append(f'arenalogs_upload_duration_seconds_bucket{{le="{bound}"}} {count}')
+			lines.append(f'arenalogs_upload_duration_seconds_bucket{{le="+Inf"}} {self.duration_count}')
+			lines.append(f'arenalogs_upload_duration_seconds_sum {self.duration_sum:.6f}')
+			lines.append(f'arenalogs_upload_duration_seconds_count {self.duration_count}')
+		return '\n'.join(lines) + '\n'
+
+	def stop(self):
+		self.httpd.shutdown()
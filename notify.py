@@ -0,0 +1,79 @@
+import time
+import queue
+import threading
+
+# Tray notifications shown from a thread of their own. Showing a toast can
+# block for as long as it is on screen, so uploads only put messages on a
+# queue and carry on. Messages that arrive close together are shown as one
+# toast, "3 uploaded, 1 failed" instead of four toasts in a row.
+
+# How long to keep collecting messages before showing them
+COALESCE_SECONDS = 3
+
+# Kinds of message that can be counted in a summary, and how they read there
+SUMMARY_LABELS = {
+	'uploaded': 'uploaded',
+	'exists': 'already uploaded',
+	'nothing': 'with nothing new',
+	'failed': 'failed',
+	'waiting': 'waiting for the server',
+}
+
+class Notifier:
+	# display is the toolkit call that actually shows a toast, (title, message)
+	def __init__(self, display, app_name, window=COALESCE_SECONDS):
+		self.display = display
+		self.app_name = app_name
+		self.window = window
+		self.queue = queue.Queue()
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+
+	# Queue a toast and return straight away. kind is one of SUMMARY_LABELS
+	# for upload results, 'started' for progress that is dropped when a result
+	# arrives in the same burst, or None for messages always shown as they are.
+	def notify(self, title, message, kind=None):
+		self.queue.put((title, message, kind))
+
+	def run(self):
+		while True:
+			batch = [self.queue.get()]
+			deadline = time.monotonic() + self.window
+			while True:
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					break
+				try:
+					batch.append(self.queue.get(timeout=remaining))
+				except queue.Empty:
+					break
+			# Anything queued while a toast was on screen joins this batch too
+			while not self.queue.empty():
+				batch.append(self.queue.get_nowait())
+			for title, message in self.coalesce(batch):
+				try:
+					self.display(title, message)
+				except Exception as e:
+					print(f"Could not show notification: {e!r}", flush=True)
+
+	# Turn a burst of messages into the toasts to show
+	def coalesce(self, batch):
+		results = [n for n in batch if n[2] in SUMMARY_LABELS]
+		started = [n for n in batch if n[2] == 'started']
+		toasts = []
+		for title, message, kind in batch:
+			if kind is None and (title, message) not in toasts:
+				toasts.append((title, message))
+		if len(started) == 1 and not results:
+			toasts.append(started[0][:2])
+		elif started and not results:
+			toasts.append((self.app_name, f"Uploading {len(started)} logs"))
+		if len(results) == 1:
+			toasts.append(results[0][:2])
+		elif results:
+			counts = {}
+			for _, _, kind in results:
+				counts[kind] = counts.get(kind, 0) + 1
+			summary = ", ".join(f"{count} {SUMMARY_LABELS[kind]}" for kind, count in counts.items())
+			toasts.append((self.app_name, f"{len(results)} logs: {summary}"))
+		return toasts
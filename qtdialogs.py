@@ -0,0 +1,201 @@
+import os
+from PyQt5.QtWidgets import QDialog, QLabel, QVBoxLayout, QHBoxLayout, QTableView, QTableWidget, QTableWidgetItem, QPushButton, QHeaderView, QAbstractItemView, QProgressBar
+from PyQt5.QtGui import QIcon
+from PyQt5.QtCore import Qt, QObject, pyqtSignal, QAbstractTableModel, QModelIndex, QItemSelection, QItemSelectionModel
+from logfiles import LogFileList, LogScanner
+from batchupload import BatchUpload, STATE_LABELS, describe
+
+# The Qt windows arenalogs.py and local2.py share. app is the script's
+# UploadApp, the windows use its settings, log cache and upload functions.
+
+# Runs callbacks from upload and scan threads on the Qt thread, a signal
+# emitted on another thread is delivered through the Qt event loop
+class CallbackBridge(QObject):
+	call = pyqtSignal(object, object)
+
+	def __init__(self):
+		super().__init__()
+		self.call.connect(lambda callback, future: callback(future))
+
+# Table model over a LogFileList, the view only asks for the rows on screen
+class LogFileModel(QAbstractTableModel):
+	headers = ["File Name", "Created Date", "Arena Matches", "Status"]
+
+	def __init__(self):
+		super().__init__()
+		self.files = LogFileList()
+
+	def rowCount(self, parent=QModelIndex()):
+		return 0 if parent.isValid() else len(self.files)
+
+	def columnCount(self, parent=QModelIndex()):
+		return 0 if parent.isValid() else len(self.headers)
+
+	def data(self, index, role=Qt.DisplayRole):
+		if role == Qt.DisplayRole and index.isValid():
+			return self.files.cell(index.row(), index.column())
+		return None
+
+	def headerData(self, section, orientation, role=Qt.DisplayRole):
+		if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+			return self.headers[section]
+		return None
+
+	# Add a batch of logs from the scanner, each at its place by creation time
+	def add_files(self, batch):
+		if not self.files:
+			# First batch, from the cache in one go
+			self.beginResetModel()
+			for log_file in batch:
+				self.files.insert(log_file)
+			self.endResetModel()
+			return
+		for log_file in batch:
+			row = self.files.position(log_file)
+			self.beginInsertRows(QModelIndex(), row, row)
+			self.files.insert(log_file, row)
+			self.endInsertRows()
+
+	def set_matches(self, value):
+		file_path, count = value
+		self.files.matches[file_path] = count
+		row = self.files.row_of(file_path)
+		if row is not None:
+			self.dataChanged.emit(self.index(row, 2), self.index(row, 2))
+
+	def set_status(self, file_path, status):
+		row = self.files.set_status(file_path, status)
+		if row is not None:
+			self.dataChanged.emit(self.index(row, 3), self.index(row, 3))
+
+# Class for the progress of a batch upload, a bar for each log and one for all of them
+class BatchProgressDialog(QDialog):
+	def __init__(self, parent, file_paths):
+		super().__init__(parent)
+		self.setWindowTitle("Uploading Logs")
+		self.setWindowIcon(parent.windowIcon())
+		self.resize(500, 400)
+		self.batch = None
+		layout = QVBoxLayout(self)
+		self.total_bar = QProgressBar()
+		self.total_bar.setRange(0, 1000)
+		layout.addWidget(self.total_bar)
+		self.total_label = QLabel("Starting upload")
+		layout.addWidget(self.total_label)
+		self.file_table = QTableWidget(len(file_paths), 2)
+		self.file_table.setHorizontalHeaderLabels(["File Name", "Progress"])
+		self.file_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+		self.file_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+		self.file_bars = []
+		for row, file_path in enumerate(file_paths):
+			self.file_table.setItem(row, 0, QTableWidgetItem(os.path.basename(file_path)))
+			bar = QProgressBar()
+			bar.setRange(0, 1000)
+			self.file_table.setCellWidget(row, 1, bar)
+			self.file_bars.append(bar)
+		layout.addWidget(self.file_table)
+		self.cancel_button = QPushButton("Cancel")
+		self.cancel_button.clicked.connect(self.on_cancel)
+		layout.addWidget(self.cancel_button)
+
+	def update_progress(self, progress):
+		self.total_bar.setValue(int(progress.done * 1000 / max(progress.total, 1)))
+		self.total_label.setText(describe(progress))
+		for bar, file_progress in zip(self.file_bars, progress.files):
+			bar.setValue(int(file_progress.done * 1000 / file_progress.total))
+			bar.setFormat(STATE_LABELS.get(file_progress.state, "%p%"))
+		if progress.finished:
+			self.cancel_button.setText("Close")
+
+	def on_cancel(self):
+		if self.batch.finished.is_set():
+			self.accept()
+		else:
+			self.batch.cancel()
+
+# Class for manual upload dialog
+class ManualUploadDialog(QDialog):
+	def __init__(self, app):
+		super().__init__()
+		self.app = app
+		self.setWindowTitle("Manual Upload")
+		self.icon_path = app.icon_path
+		self.setWindowIcon(QIcon(self.icon_path))  # Set window icon
+		self.resize(500, 300)
+		self.setup_ui()
+
+	# Function to setup the UI of the dialog
+	def setup_ui(self):
+		layout = QVBoxLayout(self)
+		self.file_model = LogFileModel()
+		self.file_table_view = QTableView()
+		self.file_table_view.setModel(self.file_model)
+		layout.addWidget(self.file_table_view)
+		buttons = QHBoxLayout()
+		self.select_button = QPushButton("Select Not Uploaded")
+		self.select_button.clicked.connect(self.select_not_uploaded)
+		buttons.addWidget(self.select_button)
+		self.upload_button = QPushButton("Upload Selected Files")
+		self.upload_button.clicked.connect(self.on_upload)
+		buttons.addWidget(self.upload_button)
+		layout.addLayout(buttons)
+		self.close_button = QPushButton("Close")
+		self.close_button.clicked.connect(self.close)
+		layout.addWidget(self.close_button)        
+		# Adjust column widths
+		self.set_column_percentages([35, 20, 15, 20])  # Set column percentages
+		self.file_table_view.horizontalHeader().setSectionResizeMode(QHeaderView.Fixed)  # Prevent resizing
+		self.file_table_view.setSelectionMode(QAbstractItemView.ExtendedSelection)  # Shift and Ctrl pick several logs
+		self.file_table_view.setSelectionBehavior(QAbstractItemView.SelectRows)  # Select whole logs
+		self.populate_file_list()
+
+
+	# Function to fill the file list from a background scan, the dialog opens
+	# straight away and rows appear as they are found
+	def populate_file_list(self):
+		self.bridge = CallbackBridge()
+		self.scanner = LogScanner(self.app.log_folders(), self.bridge.call.emit, self.file_model.add_files, self.file_model.set_matches, self.app.match_count, self.app.log_cache)
+		self.scanner.start()
+
+	# Function to upload the selected logs as one batch, the dialog stays usable
+	def on_upload(self):
+		selected_rows = self.file_table_view.selectionModel().selectedRows()
+		if selected_rows:
+			file_paths = [self.file_model.files[index.row()].path for index in sorted(selected_rows, key=lambda index: index.row())]
+			print(f"{len(file_paths)} files selected")
+			self.progress_dialog = BatchProgressDialog(self, file_paths)
+			batch = BatchUpload(file_paths, self.app.upload_queue, self.app.upload_size, self.bridge.call.emit, self.progress_dialog.update_progress, self.on_file_done)
+			self.progress_dialog.batch = batch
+			self.progress_dialog.show()
+			batch.start()
+		else:
+			self.app.show_tray_message("No file selected", "Please select a file to upload.")
+			#QMessageBox.warning(self, "No file selected", "Please select a file to upload.")
+
+	# Function to select every log that has not been uploaded yet
+	def select_not_uploaded(self):
+		selection = QItemSelection()
+		last_column = self.file_model.columnCount() - 1
+		for row in self.file_model.files.not_uploaded():
+			selection.select(self.file_model.index(row, 0), self.file_model.index(row, last_column))
+		self.file_table_view.selectionModel().select(selection, QItemSelectionModel.ClearAndSelect)
+
+	def on_file_done(self, value):
+		file_path, ok = value
+		entry = self.app.log_cache.get(file_path)
+		self.file_model.set_status(file_path, entry['status'] if entry else None)
+
+	def set_column_percentages(self, percentages):
+		total_width = self.file_table_view.width()
+		for column, percentage in enumerate(percentages):
+			width = round(total_width * percentage / 100)
+			self.file_table_view.setColumnWidth(column, width)
+
+	# Stop the scan once the dialog is out of sight, however it was closed
+	def hideEvent(self, event):
+		self.scanner.stop()
+		super().hideEvent(event)
+			
+	def closeEvent(self, event):
+		event.ignore()  # Ignore the close event
+		self.hide()  # Hide the dialog instead of closing it
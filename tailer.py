@@ -0,0 +1,234 @@
+import os
+import json
+import hashlib
+import threading
+import requests
+import metrics
+from throttle import lower_priority
+from uploader import state_dir, url_key, breaker_for, resumable_url, send_part, complete_upload, conflict_offset, is_duplicate, refused_body, accepted_encodings, supported_encodings
+from arenamatch import find_matches, upload_match
+from fanout import upload_match_to
+
+# Live tailing of the active combat log. WoW creates the log file empty and
+# keeps appending to it for the whole session, so instead of uploading it once
+# on creation the new bytes are sent as they arrive, as parts of a resumable
+# upload whose total size is not known yet. The byte offset the server has
+# acknowledged is kept on disk so a restarted app carries on from there.
+# With arena_only set, each arena match is sent on its own as soon as it ends
+# and everything else in the log is skipped, to every server in destinations
+# when there are several.
+
+# Send what has been appended once this much is waiting...
+BATCH_BYTES = 4 * 1024 * 1024
+# ...or once the log has had no new writes for this many seconds
+BATCH_SECONDS = 5
+# How long to wait before sending again after a failed batch
+RETRY_SECONDS = 60
+
+# Lines that end an arena match, seeing one sends the batch straight away
+MATCH_END = b'ARENA_MATCH_END'
+
+# Id for a tailed upload, stays the same however much the file grows
+def tail_id(file_path):
+	key = f"tail:{os.path.basename(file_path)}"
+	return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+class LogTailer:
+	def __init__(self, url, batch_bytes=BATCH_BYTES, batch_seconds=BATCH_SECONDS, arena_only=False, index=None, summaries=False, destinations=None):
+		self.url = url
+		self.arena_only = arena_only
+		# HashIndex for skipping matches that were uploaded before
+		self.index = index
+		# Send each match's summary ahead of the match
+		self.summaries = summaries
+		# fanout.Destination for each server matches go to, None for url only
+		self.destinations = destinations
+		self.batch_bytes = batch_bytes
+		self.batch_seconds = batch_seconds
+		self.lock = threading.Lock()
+		self.send_lock = threading.Lock()
+		self.timers = {}
+		# How far each file has been looked at for MATCH_END, not persisted
+		self.scanned = {}
+		self.state_path = os.path.join(state_dir(), f"tail-{url_key(url)}.json")
+		self.offsets = self.load_offsets()
+
+	def load_offsets(self):
+		try:
+			with open(self.state_path, 'r', encoding='utf-8') as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return {}
+
+	def save_offsets(self):
+		with open(self.state_path + '.tmp', 'w', encoding='utf-8') as f:
+			json.dump(self.offsets, f)
+		os.replace(self.state_path + '.tmp', self.state_path)
+
+	# Files being tailed that have not been finished yet
+	def active_files(self):
+		with self.lock:
+			return list(self.offsets)
+
+	# Called for every modified event on a combat log
+	def file_changed(self, file_path):
+		try:
+			size = os.path.getsize(file_path)
+		except OSError:
+			return
+		with self.lock:
+			entry = self.offsets.get(file_path)
+			if entry is None or size < entry['offset']:
+				# New file, or the old one was replaced, start from the top
+				entry = {'upload_id': tail_id(file_path), 'offset': 0, 'part': 0}
+				self.offsets[file_path] = entry
+				self.scanned[file_path] = 0
+				self.save_offsets()
+			pending = size - entry['offset']
+			match_ended = self.match_ended(file_path, size)
+		if pending > 0:
+			metrics.detected(file_path)
+		if pending >= self.batch_bytes or match_ended:
+			self.schedule(file_path, 0)
+		elif pending > 0:
+			self.schedule(file_path, self.batch_seconds)
+
+	# Look at the bytes written since the last event for the end of a match
+	def match_ended(self, file_path, size):
+		start = max(self.scanned.get(file_path, self.offsets[file_path]['offset']) - len(MATCH_END), 0)
+		self.scanned[file_path] = size
+		with open(file_path, 'rb') as f:
+			while start < size:
+				length = min(self.batch_bytes, size - start)
+				f.seek(start)
+				# Overlap reads so a marker across two reads is still found
+				if MATCH_END in f.read(length + len(MATCH_END)):
+					return True
+				start += length
+		return False
+
+	# Run flush on a timer thread after delay seconds, so the watchdog thread
+	# never waits on the network. A newer event pushes the timer back.
+	def schedule(self, file_path, delay):
+		with self.lock:
+			timer = self.timers.pop(file_path, None)
+			if timer is not None:
+				timer.cancel()
+			timer = threading.Timer(delay, self.timed_flush, args=(file_path,))
+			timer.daemon = True
+			self.timers[file_path] = timer
+			timer.start()
+
+	# Keep trying on a slower timer while the server can't be reached, or
+	# once its circuit breaker lets requests through again if that is later
+	def timed_flush(self, file_path):
+		lower_priority()
+		if not self.flush(file_path):
+			self.schedule(file_path, max(RETRY_SECONDS, breaker_for(self.url).wait()))
+
+	# Send everything appended since the acknowledged offset, up to the last
+	# complete line. Returns False if the server could not be reached.
+	def flush(self, file_path):
+		metrics.begin(file_path, 'live')
+		ok = self.send_pending(file_path)
+		metrics.end(file_path, 'uploaded' if ok else 'failed')
+		return ok
+
+	# send_lock keeps one send per tailer at a time, lock is only held while
+	# touching the offsets so new events are never held up by the network.
+	def send_pending(self, file_path):
+		with self.send_lock:
+			with self.lock:
+				entry = self.offsets.get(file_path)
+				if entry is None:
+					return True
+				offset, part = entry['offset'], entry['part']
+			base_url = resumable_url(self.url, entry['upload_id'])
+			encoding = accepted_encodings.get(self.url, supported_encodings()[0])
+			try:
+				if self.arena_only:
+					return self.flush_matches(file_path, entry)
+				with open(file_path, 'rb') as f:
+					while True:
+						f.seek(offset)
+						with metrics.timed(file_path, 'read'):
+							data = f.read(self.batch_bytes)
+						end = data.rfind(b'\n')
+						if end < 0:
+							return True
+						data = data[:end + 1]
+						metrics.add_count(file_path, 'bytes_read', len(data))
+						response = send_part(f"{base_url}/{part}", data, offset, '*', encoding, file_path)
+						if encoding != 'identity' and refused_body(self.url, response, encoding):
+							encoding = 'identity'
+							metrics.add_count(file_path, 'retries')
+							continue
+						have = conflict_offset(response)
+						if have is not None and have < offset:
+							# The server lost the end of what it had, send it again from there
+							offset = have
+							with self.lock:
+								entry['offset'] = offset
+								self.save_offsets()
+							metrics.add_count(file_path, 'retries')
+							continue
+						if response.status_code != 200:
+							print(f"Live upload of {file_path} failed with {response.status_code}", flush=True)
+							return False
+						offset += len(data)
+						part += 1
+						with self.lock:
+							entry['offset'], entry['part'] = offset, part
+							self.save_offsets()
+			except (OSError, requests.RequestException):
+				return False
+
+	# Send each arena match that has ended since the offset, as its own upload
+	def flush_matches(self, file_path, entry):
+		header = entry.get('header')
+		matches, resume = find_matches(file_path, entry['offset'], tuple(header) if header else None)
+		for match in matches:
+			if match.complete:
+				if self.destinations:
+					responses = list(upload_match_to(self.destinations, file_path, match, self.summaries).values())
+				else:
+					responses = [upload_match(self.url, file_path, match, self.index, self.summaries)]
+				for response in responses:
+					if response is not None and response.status_code != 200 and not is_duplicate(response):
+						print(f"Upload of arena match in {file_path} failed with {response.status_code}", flush=True)
+						return False
+			with self.lock:
+				entry['offset'] = match.end
+				entry['header'] = match.header
+				self.save_offsets()
+		with self.lock:
+			entry['offset'] = resume
+			self.save_offsets()
+		return True
+
+	# The log is closed, send the rest and tell the server it is complete.
+	# Returns False if the server could not be reached or refused it.
+	def finish(self, file_path):
+		with self.lock:
+			timer = self.timers.pop(file_path, None)
+			if timer is not None:
+				timer.cancel()
+		if not self.flush(file_path):
+			return False
+		with self.send_lock:
+			with self.lock:
+				entry = self.offsets.get(file_path)
+			if entry is None:
+				return False
+			if not self.arena_only:
+				try:
+					response = complete_upload(resumable_url(self.url, entry['upload_id']), file_path, entry['offset'])
+				except requests.RequestException:
+					return False
+				if response.status_code != 200:
+					return False
+			with self.lock:
+				del self.offsets[file_path]
+				self.scanned.pop(file_path, None)
+				self.save_offsets()
+			return True
@@ -0,0 +1,97 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from arenamatch import ArenaMatch, find_matches, scan_matches
+
+# Finding arena matches: each match is the bytes from its start line to the
+# end of its end line, sent with the log version line it was logged under,
+# a match cut short by the next one is incomplete, and a scan of a log that
+# is still being written stops where it can carry on later.
+
+VERSION_1 = b'5/4 20:59:59.000  COMBAT_LOG_VERSION,20,ADVANCED_LOG_ENABLED,1\n'
+VERSION_2 = b'5/4 22:00:00.000  COMBAT_LOG_VERSION,21,ADVANCED_LOG_ENABLED,1\n'
+
+def match_lines(n, end=True):
+	lines = [b'5/4 21:%02d:00.000  ARENA_MATCH_START,2547,33,3v3,1\n' % n]
+	lines += [b'5/4 21:%02d:01.000  SPELL_DAMAGE,Player-1,"Name-Realm",0x511,0x0,%d\n' % (n, i) for i in range(5)]
+	if end:
+		lines.append(b'5/4 21:%02d:02.000  ARENA_MATCH_END,0,33,1500,1520\n' % n)
+	return b''.join(lines)
+
+OTHER = b'5/4 21:30:00.000  ZONE_CHANGE,1,"Dungeon",0\n' * 3
+
+class ArenaMatchTest(unittest.TestCase):
+	def setUp(self):
+		self.work_dir = tempfile.mkdtemp(prefix='arenalogs-test-')
+		self.file_path = os.path.join(self.work_dir, 'WoWCombatLog-1.txt')
+
+	def tearDown(self):
+		shutil.rmtree(self.work_dir, ignore_errors=True)
+
+	def write(self, data, mode='wb'):
+		with open(self.file_path, mode) as f:
+			f.write(data)
+
+	def read(self, start, end):
+		with open(self.file_path, 'rb') as f:
+			f.seek(start)
+			return f.read(end - start)
+
+	def test_matches_and_their_header(self):
+		self.write(VERSION_1 + OTHER + match_lines(1) + OTHER + match_lines(2) + OTHER)
+		matches, resume = find_matches(self.file_path)
+		self.assertEqual(len(matches), 2)
+		self.assertTrue(all(match.complete for match in matches))
+		self.assertEqual(self.read(*matches[0].ranges()[1]), match_lines(1))
+		self.assertEqual(self.read(*matches[1].ranges()[1]), match_lines(2))
+		self.assertEqual(self.read(*matches[0].header), VERSION_1)
+		self.assertEqual(resume, os.path.getsize(self.file_path))
+
+	def test_match_cut_short_by_the_next(self):
+		self.write(VERSION_1 + match_lines(1, end=False) + match_lines(2))
+		matches, _ = find_matches(self.file_path)
+		self.assertEqual([match.complete for match in matches], [False, True])
+		self.assertEqual(self.read(matches[0].start, matches[0].end), match_lines(1, end=False))
+
+	def test_new_version_line_is_the_next_header(self):
+		self.write(VERSION_1 + match_lines(1) + VERSION_2 + match_lines(2))
+		matches, _ = find_matches(self.file_path)
+		self.assertEqual(self.read(*matches[0].header), VERSION_1)
+		self.assertEqual(self.read(*matches[1].header), VERSION_2)
+
+	def test_log_without_version_line(self):
+		self.write(OTHER + match_lines(1))
+		matches, _ = find_matches(self.file_path)
+		self.assertIsNone(matches[0].header)
+		self.assertEqual(matches[0].ranges(), [(len(OTHER), len(OTHER) + len(match_lines(1)))])
+
+	def test_growing_log_resumes_at_the_open_match(self):
+		self.write(VERSION_1 + match_lines(1) + match_lines(2, end=False))
+		matches, resume, header = scan_matches(self.file_path)
+		self.assertEqual(len(matches), 1)
+		self.assertEqual(resume, len(VERSION_1) + len(match_lines(1)))
+		# The match ends, and the next line is only half written
+		self.write(b'5/4 21:02:02.000  ARENA_MATCH_END,0,33,1500,1520\n5/4 21:02:03.000  ZONE_', 'ab')
+		matches, resume, _ = scan_matches(self.file_path, resume, header)
+		self.assertEqual(len(matches), 1)
+		self.assertEqual(self.read(matches[0].start, matches[0].end), match_lines(2))
+		self.assertEqual(self.read(*matches[0].header), VERSION_1)
+		self.assertEqual(resume, os.path.getsize(self.file_path) - len(b'5/4 21:02:03.000  ZONE_'))
+
+	def test_empty_log(self):
+		self.write(b'')
+		self.assertEqual(find_matches(self.file_path), ([], 0))
+
+	def test_list_round_trip(self):
+		self.write(VERSION_1 + match_lines(1))
+		match = find_matches(self.file_path)[0][0]
+		copy = ArenaMatch.from_list(match.to_list())
+		self.assertEqual((copy.start, copy.end, copy.header, copy.complete), (match.start, match.end, match.header, match.complete))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import binlog
+
+# The binary log format: whatever goes in comes back as the same text, line
+# endings aside, and a stream that is cut off or damaged is refused with a
+# ValueError rather than decoded into something else.
+
+LOG = (
+	b'10/18/2026 20:30:15.1234-4  COMBAT_LOG_VERSION,21,ADVANCED_LOG_ENABLED,1,BUILD_VERSION,11.0.2,PROJECT_ID,1\n'
+	b'10/18/2026 20:30:15.1250-4  ARENA_MATCH_START,2547,33,3v3,1\n'
+	b'10/18/2026 20:30:16.0001-4  SPELL_DAMAGE,Player-1092-0A1B2C3D,"Name-Realm",0x511,0x0,Creature-0-3019-2552-13-225982-00001,"Target, Dummy",0xa48,0x0,185358,"Arcane Shot",0x40,-1,0,1.00,-2.50,0.05,nil\n'
+	b'10/18/2026 20:30:16.0001-4  SPELL_AURA_APPLIED,Player-1092-0A1B2C3D,"Name-Realm",0x511,0x0,Player-1092-0A1B2C3D,"Name-Realm",0x511,0x0,186257,"Aspect of the Cheetah",0x1,BUFF\n'
+	b'10/18/2026 9:05:01.0001-4  ZONE_CHANGE,2547,"Nokhudon Proving Grounds",0\n'
+	b'10/19/2026 00:00:00.000+2  SPELL_CAST_SUCCESS,007,0x00,1.,-0\n'
+	b'not a combat log line at all\n'
+	b'\n'
+	b'10/19/2026 00:00:01.000+2  ARENA_MATCH_END,0,33,1500,1520\n'
+)
+
+class BinlogTest(unittest.TestCase):
+	def test_round_trip(self):
+		encoded = binlog.encode(LOG)
+		self.assertTrue(encoded.startswith(binlog.MAGIC))
+		self.assertEqual(binlog.decode(encoded), LOG)
+		self.assertLess(len(binlog.encode(LOG * 50)), len(LOG * 50) // 2)
+
+	def test_round_trip_in_chunks(self):
+		# Lines cut between chunks are put back together
+		chunks = [LOG[i:i + 37] for i in range(0, len(LOG), 37)]
+		self.assertEqual(binlog.decode(b''.join(binlog.encode_stream(chunks))), LOG)
+
+	def test_last_line_without_newline(self):
+		data = LOG.rstrip(b'\n')
+		self.assertEqual(binlog.decode(binlog.encode(data)), data)
+
+	def test_line_endings_are_normalised(self):
+		self.assertEqual(binlog.decode(binlog.encode(LOG.replace(b'\n', b'\r\n'))), LOG)
+
+	def test_empty_log(self):
+		encoded = binlog.encode(b'')
+		self.assertEqual(encoded, binlog.MAGIC + bytes([binlog.VERSION]))
+		self.assertEqual(binlog.decode(encoded), b'')
+
+	def test_truncated_stream(self):
+		encoded = binlog.encode(LOG)
+		for cut in range(len(binlog.MAGIC) + 1, len(encoded)):
+			try:
+				decoded = binlog.decode(encoded[:cut])
+			except ValueError:
+				continue
+			# Cut between two records, which reads as a shorter log
+			self.assertNotEqual(decoded, LOG, f"cut at {cut} of {len(encoded)}")
+		# Cut inside the first string of the table
+		with self.assertRaises(ValueError):
+			binlog.decode(encoded[:len(binlog.MAGIC) + 4])
+
+	def test_corrupt_stream(self):
+		encoded = binlog.encode(LOG)
+		header = len(binlog.MAGIC) + 1
+		for data in (b'', b'ALCB', b'XXXX' + encoded[4:], encoded[:4] + bytes([binlog.VERSION + 1]) + encoded[5:], encoded[:header] + bytes([0x7f])):
+			with self.assertRaises(ValueError):
+				binlog.decode(data)
+		# A line before any clock
+		out = bytearray(encoded[:header])
+		out += bytes([binlog.OP_STRING, 1]) + b'X'
+		out += bytes([binlog.OP_LINE, 0, 0, 0])
+		with self.assertRaises(ValueError):
+			binlog.decode(bytes(out))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import hashindex
+from hashindex import HashIndex, content_digest
+
+# The hash index: digests don't depend on how many threads hashed them,
+# what was uploaded is remembered, and hash lookups only go to a server when
+# asked for, stopping for good once it turns out to have no such endpoint.
+
+URL = "http://hashes.test/api/upload/"
+
+class HashIndexTest(unittest.TestCase):
+	def setUp(self):
+		self.work_dir = tempfile.mkdtemp(prefix='arenalogs-test-')
+		self.file_path = os.path.join(self.work_dir, 'WoWCombatLog-1.txt')
+		with open(self.file_path, 'wb') as f:
+			f.write(os.urandom(300 * 1024))
+		self.db_path = os.path.join(self.work_dir, 'hashes.sqlite3')
+
+	def tearDown(self):
+		shutil.rmtree(self.work_dir, ignore_errors=True)
+
+	def head(self, status_code):
+		session = mock.Mock()
+		session.head.return_value = mock.Mock(status_code=status_code)
+		return mock.patch.object(hashindex, 'get_session', return_value=session)
+
+	def test_digest_does_not_depend_on_workers(self):
+		ranges = [(0, 1000), (5000, 200000)]
+		self.assertEqual(content_digest(self.file_path, ranges, block_size=4096, workers=4), content_digest(self.file_path, ranges, block_size=4096, workers=1))
+		self.assertNotEqual(content_digest(self.file_path, [(0, 1000)]), content_digest(self.file_path, [(1, 1001)]))
+
+	def test_file_digest_follows_changes(self):
+		index = HashIndex(URL, db_path=self.db_path)
+		digest = index.file_digest(self.file_path)
+		self.assertEqual(index.file_digest(self.file_path), digest)
+		with open(self.file_path, 'ab') as f:
+			f.write(b'more')
+		self.assertNotEqual(index.file_digest(self.file_path), digest)
+
+	def test_uploaded_digest_is_known(self):
+		index = HashIndex(URL, db_path=self.db_path)
+		self.assertFalse(index.known('abc'))
+		index.add('abc', self.file_path)
+		self.assertTrue(index.known('abc'))
+
+	def test_no_lookups_by_default(self):
+		index = HashIndex(URL, db_path=self.db_path)
+		with self.head(200) as get_session:
+			self.assertFalse(index.known('abc'))
+		get_session.assert_not_called()
+
+	def test_server_yes_is_remembered(self):
+		index = HashIndex(URL, preflight=True, db_path=self.db_path)
+		with self.head(200):
+			self.assertTrue(index.known('abc'))
+		self.assertTrue(index.seen('abc'))
+
+	def test_missing_endpoint_is_unknown_and_not_asked_again(self):
+		for status_code in (404, 405):
+			index = HashIndex(URL, preflight=True, db_path=self.db_path)
+			with self.head(status_code) as get_session:
+				self.assertIsNone(index.server_has('abc'))
+				self.assertFalse(index.known('def'))
+			self.assertEqual(get_session.return_value.head.call_count, 1)
+			self.assertFalse(index.preflight)
+			self.assertFalse(index.seen('abc'))
+
+if __name__ == '__main__':
+	unittest.main()
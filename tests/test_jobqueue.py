@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import uploader
+import jobqueue
+from jobqueue import UploadQueue
+
+# Retries of the upload queue: every failure with the breaker closed uses up
+# a try, failures while it is open only wait for the server and only so many
+# times, and a Retry-After of 0 is kept rather than taken for no answer.
+
+URL = "http://queue.test/api/upload/"
+ORIGIN = "http://queue.test"
+
+class UploadQueueTest(unittest.TestCase):
+	def setUp(self):
+		self.work_dir = tempfile.mkdtemp(prefix='arenalogs-test-')
+		patcher = mock.patch.dict(os.environ, {'LOCALAPPDATA': self.work_dir})
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.saved_breaker = uploader.breakers.get(ORIGIN)
+		self.breaker = uploader.breakers[ORIGIN] = uploader.CircuitBreaker(ORIGIN, failures=1000, open_seconds=0.05, max_open_seconds=0.05)
+		self.file_path = os.path.join(self.work_dir, 'WoWCombatLog-1.txt')
+		with open(self.file_path, 'w') as f:
+			f.write("5/4 21:00:00.000  ZONE_CHANGE\n")
+		self.queue = None
+
+	def tearDown(self):
+		if self.queue is not None:
+			self.queue.stop()
+			for thread in self.queue.threads:
+				thread.join(5)
+		if self.saved_breaker is None:
+			uploader.breakers.pop(ORIGIN, None)
+		else:
+			uploader.breakers[ORIGIN] = self.saved_breaker
+		shutil.rmtree(self.work_dir, ignore_errors=True)
+
+	def make_queue(self, handler):
+		self.queue = UploadQueue(URL, handler, workers=1, db_path=os.path.join(self.work_dir, 'queue.sqlite3'))
+		return self.queue
+
+	def job(self):
+		with self.queue.connect() as db:
+			return db.execute("SELECT status, attempts, waits, next_try FROM jobs").fetchone()
+
+	def wait_for(self, status, timeout=10):
+		deadline = time.monotonic() + timeout
+		while time.monotonic() < deadline:
+			row = self.job()
+			if row is not None and row[0] == status:
+				return row
+			time.sleep(0.02)
+		self.fail(f"job never became {status}, last {self.job()}")
+
+	@mock.patch.object(jobqueue, 'RETRY_DELAY', 0)
+	def test_failures_use_up_tries(self):
+		calls = []
+
+		def handler(file_path):
+			calls.append(file_path)
+			# A plain failure counts against the breaker but doesn't open it
+			self.breaker.failure()
+			return False
+
+		queue = self.make_queue(handler)
+		queue.put(self.file_path)
+		queue.start()
+		status, attempts, waits, _ = self.wait_for('failed')
+		self.assertEqual(attempts, jobqueue.MAX_ATTEMPTS)
+		self.assertEqual(waits, 0)
+		self.assertEqual(len(calls), jobqueue.MAX_ATTEMPTS)
+
+	@mock.patch.object(jobqueue, 'RETRY_DELAY', 0)
+	@mock.patch.object(jobqueue, 'MAX_WAITS', 3)
+	def test_open_breaker_waits_are_capped(self):
+		def handler(file_path):
+			self.breaker.failure(retry_after=0.05)
+			return False
+
+		queue = self.make_queue(handler)
+		queue.put(self.file_path)
+		queue.start()
+		status, attempts, waits, _ = self.wait_for('failed')
+		self.assertEqual(waits, 3)
+		self.assertEqual(attempts, jobqueue.MAX_ATTEMPTS)
+
+	def test_zero_retry_after_is_kept(self):
+		queue = self.make_queue(lambda file_path: True)
+		queue.put(self.file_path)
+		job_id = queue.claim()[0]
+		queue.finish(job_id, 1, "Upload failed", retry_after=0)
+		self.assertLess(self.job()[3], time.time() + 1)
+
+	def test_backoff_grows(self):
+		queue = self.make_queue(lambda file_path: True)
+		queue.put(self.file_path)
+		job_id = queue.claim()[0]
+		queue.finish(job_id, 3, "Upload failed")
+		# Third failure waits at least half of four times RETRY_DELAY
+		self.assertGreaterEqual(self.job()[3] - time.time(), jobqueue.RETRY_DELAY * 2 - 1)
+
+	def test_successful_upload_is_done(self):
+		queue = self.make_queue(lambda file_path: True)
+		queue.put(self.file_path)
+		queue.start()
+		status, attempts, _, _ = self.wait_for('done')
+		self.assertEqual(attempts, 1)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from logcache import LogCache
+from logfiles import LogScanner
+
+# The log cache and the dialog's scanner: the cached listing is shown before
+# anything is read from the folder, a folder is only fully synced once per
+# run, and logs the watcher saw since show up without a sync.
+
+URL = "http://cache.test/api/upload/"
+
+def write_log(file_path, text="5/4 21:00:00.000  ZONE_CHANGE\n"):
+	with open(file_path, 'w') as f:
+		f.write(text)
+
+class LogCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.work_dir = tempfile.mkdtemp(prefix='arenalogs-test-')
+		self.logs = os.path.join(self.work_dir, 'Logs')
+		os.mkdir(self.logs)
+		self.db_path = os.path.join(self.work_dir, 'logs.sqlite3')
+		for name in ('WoWCombatLog-1.txt', 'WoWCombatLog-2.txt', 'WoWCombatLog-2 - Copy.txt', 'notes.txt'):
+			write_log(os.path.join(self.logs, name))
+
+	def tearDown(self):
+		shutil.rmtree(self.work_dir, ignore_errors=True)
+
+	def scan(self, cache):
+		batches = []
+		scanner = LogScanner([self.logs], lambda callback, value: callback(value), batches.append, cache=cache)
+		scanner.run()
+		return [sorted(log_file.name for log_file in batch) for batch in batches]
+
+	def test_sync_only_takes_combat_logs(self):
+		cache = LogCache(URL, self.db_path)
+		self.assertFalse(cache.is_synced(self.logs))
+		self.assertEqual(cache.sync(self.logs), 2)
+		self.assertTrue(cache.is_synced(self.logs))
+		self.assertEqual(sorted(log_file.name for log_file in cache.files(self.logs)), ['WoWCombatLog-1.txt', 'WoWCombatLog-2.txt'])
+		# Nothing changed, nothing written
+		self.assertEqual(cache.sync(self.logs), 0)
+
+	def test_cached_rows_come_before_the_sync(self):
+		LogCache(URL, self.db_path).sync(self.logs)
+		write_log(os.path.join(self.logs, 'WoWCombatLog-3.txt'))
+		# Next start of the app, before its startup sync has run
+		cache = LogCache(URL, self.db_path)
+		self.assertEqual(self.scan(cache), [['WoWCombatLog-1.txt', 'WoWCombatLog-2.txt'], ['WoWCombatLog-3.txt']])
+		self.assertTrue(cache.is_synced(self.logs))
+
+	def test_synced_folder_is_not_rescanned(self):
+		cache = LogCache(URL, self.db_path)
+		cache.sync(self.logs)
+		new_log = os.path.join(self.logs, 'WoWCombatLog-3.txt')
+		write_log(new_log)
+		cache.touch(new_log)
+		with mock.patch.object(cache, 'sync') as sync:
+			batches = self.scan(cache)
+		sync.assert_not_called()
+		self.assertEqual(batches, [['WoWCombatLog-1.txt', 'WoWCombatLog-2.txt', 'WoWCombatLog-3.txt']])
+
+	def test_changed_log_loses_its_status(self):
+		cache = LogCache(URL, self.db_path)
+		cache.sync(self.logs)
+		file_path = os.path.join(self.logs, 'WoWCombatLog-1.txt')
+		cache.set_status(file_path, 'uploaded')
+		cache.set_matches(file_path, 3)
+		self.assertTrue(cache.up_to_date(file_path))
+		write_log(file_path, "5/4 21:00:00.000  ZONE_CHANGE\n5/4 21:00:01.000  ZONE_CHANGE\n")
+		cache.touch(file_path)
+		self.assertFalse(cache.up_to_date(file_path))
+		self.assertEqual(cache.get(file_path)['matches'], None)
+
+	def test_new_folder_is_scanned_then_synced(self):
+		cache = LogCache(URL, self.db_path)
+		batches = self.scan(cache)
+		self.assertEqual(sorted(name for batch in batches for name in batch), ['WoWCombatLog-1.txt', 'WoWCombatLog-2.txt'])
+		self.assertTrue(cache.is_synced(self.logs))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+from watchdog.events import FileCreatedEvent, FileModifiedEvent, FileDeletedEvent, FileMovedEvent, DirModifiedEvent
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from logevents import LogEventCoalescer
+
+# The watchdog event filter: a burst of events for a log comes through as
+# one, a log is stable once it has gone quiet and only then, a log that
+# grows again waits again, and deletes and moves drop what was held.
+
+DEBOUNCE = 0.05
+QUIET = 0.3
+
+class Recorder:
+	def __init__(self):
+		self.calls = []
+
+	def on_created(self, event):
+		self.calls.append(('created', event.src_path))
+
+	def on_modified(self, event):
+		self.calls.append(('modified', event.src_path))
+
+	def on_deleted(self, event):
+		self.calls.append(('deleted', event.src_path))
+
+	def on_moved(self, event):
+		self.calls.append(('moved', event.src_path))
+
+	def on_log_stable(self, file_path):
+		self.calls.append(('stable', file_path))
+
+class LogEventCoalescerTest(unittest.TestCase):
+	def setUp(self):
+		self.work_dir = tempfile.mkdtemp(prefix='arenalogs-test-')
+		self.file_path = os.path.join(self.work_dir, 'WoWCombatLog-1.txt')
+		self.write()
+		self.handler = Recorder()
+		self.coalescer = LogEventCoalescer(self.handler, quiet_seconds=QUIET, debounce_seconds=DEBOUNCE)
+
+	def tearDown(self):
+		for entry in list(self.coalescer.pending.values()):
+			if entry.get('timer') is not None:
+				entry['timer'].cancel()
+		shutil.rmtree(self.work_dir, ignore_errors=True)
+
+	def write(self, text=b'5/4 21:00:00.000  ZONE_CHANGE\n'):
+		with open(self.file_path, 'ab') as f:
+			f.write(text)
+
+	def wait_for(self, call, timeout=5):
+		deadline = time.monotonic() + timeout
+		while call not in self.handler.calls and time.monotonic() < deadline:
+			time.sleep(0.01)
+
+	def test_burst_is_one_created(self):
+		self.coalescer.on_created(FileCreatedEvent(self.file_path))
+		for _ in range(20):
+			self.coalescer.on_modified(FileModifiedEvent(self.file_path))
+		time.sleep(DEBOUNCE * 4)
+		self.assertEqual(self.handler.calls, [('created', self.file_path)])
+
+	def test_burst_of_modifies_is_one_modified(self):
+		for _ in range(20):
+			self.coalescer.on_modified(FileModifiedEvent(self.file_path))
+		time.sleep(DEBOUNCE * 4)
+		self.assertEqual(self.handler.calls, [('modified', self.file_path)])
+
+	def test_stable_once_quiet(self):
+		started = time.monotonic()
+		self.coalescer.on_modified(FileModifiedEvent(self.file_path))
+		self.wait_for(('stable', self.file_path))
+		self.assertGreaterEqual(time.monotonic() - started, QUIET)
+		self.assertEqual(self.handler.calls, [('modified', self.file_path), ('stable', self.file_path)])
+		self.assertEqual(self.coalescer.pending, {})
+
+	def test_growing_log_waits_again(self):
+		self.coalescer.on_modified(FileModifiedEvent(self.file_path))
+		time.sleep(QUIET * 0.6)
+		self.write()
+		self.coalescer.on_modified(FileModifiedEvent(self.file_path))
+		grown = time.monotonic()
+		self.wait_for(('stable', self.file_path))
+		self.assertGreaterEqual(time.monotonic() - grown, QUIET * 0.9)
+		self.assertEqual(self.handler.calls.count(('stable', self.file_path)), 1)
+
+	def test_delete_drops_held_events(self):
+		self.coalescer.on_modified(FileModifiedEvent(self.file_path))
+		self.coalescer.on_deleted(FileDeletedEvent(self.file_path))
+		time.sleep(QUIET + DEBOUNCE * 4)
+		self.assertEqual(self.handler.calls, [('deleted', self.file_path)])
+		self.assertEqual(self.coalescer.pending, {})
+
+	def test_moved_in_log_becomes_stable(self):
+		old_path = os.path.join(self.work_dir, 'WoWCombatLog-0.txt')
+		self.coalescer.on_modified(FileModifiedEvent(old_path))
+		self.coalescer.on_moved(FileMovedEvent(old_path, self.file_path))
+		self.wait_for(('stable', self.file_path))
+		self.assertEqual(self.handler.calls, [('moved', old_path), ('modified', self.file_path), ('stable', self.file_path)])
+
+	def test_other_files_are_ignored(self):
+		self.coalescer.on_modified(FileModifiedEvent(os.path.join(self.work_dir, 'notes.txt')))
+		self.coalescer.on_modified(DirModifiedEvent(self.work_dir))
+		time.sleep(DEBOUNCE * 4)
+		self.assertEqual(self.handler.calls, [])
+		self.assertEqual(self.coalescer.pending, {})
+
+if __name__ == '__main__':
+	unittest.main()
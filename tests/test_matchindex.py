@@ -0,0 +1,79 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import matchindex
+from matchindex import MatchIndex
+from test_arenamatch import VERSION_1, OTHER, match_lines
+
+# The match index: an unchanged log is never scanned again, a log that has
+# grown is only scanned from where the last scan stopped and ends up with
+# the matches a full scan finds, and anything else is scanned from the top.
+
+class MatchIndexTest(unittest.TestCase):
+	def setUp(self):
+		self.work_dir = tempfile.mkdtemp(prefix='arenalogs-test-')
+		self.file_path = os.path.join(self.work_dir, 'WoWCombatLog-1.txt')
+		self.index = MatchIndex(os.path.join(self.work_dir, 'matches.sqlite3'))
+
+	def tearDown(self):
+		shutil.rmtree(self.work_dir, ignore_errors=True)
+
+	def write(self, data, mode='wb'):
+		with open(self.file_path, mode) as f:
+			f.write(data)
+
+	def scan(self):
+		scans = []
+		real_scan = matchindex.scan_matches
+
+		def scan_matches(file_path, start=0, header=None):
+			scans.append(start)
+			return real_scan(file_path, start, header)
+
+		with mock.patch.object(matchindex, 'scan_matches', scan_matches):
+			matches = self.index.matches(self.file_path)
+		return [(match.start, match.end, match.complete) for match in matches], scans
+
+	def test_unchanged_log_is_not_scanned(self):
+		self.write(VERSION_1 + match_lines(1) + OTHER)
+		first, scans = self.scan()
+		self.assertEqual(scans, [0])
+		again, scans = self.scan()
+		self.assertEqual(again, first)
+		self.assertEqual(scans, [])
+		self.assertEqual(self.index.count(self.file_path), 1)
+
+	def test_grown_log_is_scanned_from_the_open_match(self):
+		self.write(VERSION_1 + match_lines(1) + match_lines(2, end=False))
+		found, _ = self.scan()
+		self.assertEqual([complete for _, _, complete in found], [True])
+		self.write(b'5/4 21:02:02.000  ARENA_MATCH_END,0,33,1500,1520\n' + OTHER + match_lines(3), 'ab')
+		found, scans = self.scan()
+		self.assertEqual(scans, [len(VERSION_1) + len(match_lines(1))])
+		self.assertEqual(self.index.count(self.file_path), 3)
+		# Same as scanning the whole log afresh
+		self.index.forget(self.file_path)
+		full, scans = self.scan()
+		self.assertEqual(scans, [0])
+		self.assertEqual(found, full)
+
+	def test_rewritten_log_is_scanned_from_the_top(self):
+		self.write(VERSION_1 + match_lines(1) + match_lines(2))
+		self.scan()
+		self.write(VERSION_1 + match_lines(3))
+		found, scans = self.scan()
+		self.assertEqual(scans, [0])
+		self.assertEqual(len(found), 1)
+
+	def test_missing_log(self):
+		with self.assertRaises(OSError):
+			self.index.matches(os.path.join(self.work_dir, 'WoWCombatLog-2.txt'))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,108 @@
+import os
+import sys
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import requests
+import uploader
+import devserver
+
+# A resumable upload to devserver.py dropping connections at random has to
+# end with the server holding exactly the bytes of the log, however many
+# parts were cut off, stored without an answer or sent again.
+
+# Chance of the server dropping each part
+DROP_RATE = 0.2
+# Small parts, so one log makes plenty of them
+PART_SIZE = 16 * 1024
+# Runs of resumable_upload before giving up, each picks up where the last stopped
+RUNS = 20
+
+def write_log(file_path, lines=6000):
+	rng = random.Random(3)
+	with open(file_path, 'w', encoding='utf-8', newline='\n') as f:
+		for i in range(lines):
+			f.write(f"5/4 21:{i // 600 % 60:02d}:{i // 10 % 60:02d}.{i % 1000:03d}  SPELL_DAMAGE,Player-1-{rng.randrange(10 ** 8):08X},\"Name-Realm\",0x511,0x0,{rng.randrange(10 ** 6)},{rng.randrange(10 ** 5)}\n")
+
+class ResumableUploadTest(unittest.TestCase):
+	def setUp(self):
+		self.work_dir = tempfile.mkdtemp(prefix='arenalogs-upload-')
+		# Checkpoints go to a folder of their own, so the test never touches the app's
+		patcher = mock.patch.dict(os.environ, {'LOCALAPPDATA': os.path.join(self.work_dir, 'state')})
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.server = devserver.make_server(port=0, upload_dir=os.path.join(self.work_dir, 'uploads'), drop_rate=DROP_RATE, quiet=True)
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/upload/"
+		# Drops are expected here, they must not open the circuit breaker
+		self.origin = self.url.split('/api/')[0]
+		self.saved_breaker = uploader.breakers.get(self.origin)
+		uploader.breakers[self.origin] = uploader.CircuitBreaker(self.origin, failures=10 ** 6)
+		self.file_path = os.path.join(self.work_dir, 'WoWCombatLog-1.txt')
+		write_log(self.file_path)
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+		if self.saved_breaker is None:
+			uploader.breakers.pop(self.origin, None)
+		else:
+			uploader.breakers[self.origin] = self.saved_breaker
+		shutil.rmtree(self.work_dir, ignore_errors=True)
+
+	def test_stored_file_matches_source(self):
+		random.seed(1)
+		response = None
+		for _ in range(RUNS):
+			try:
+				response = uploader.resumable_upload(self.url, self.file_path, PART_SIZE)
+			except requests.RequestException:
+				continue
+			if response is not None and response.status_code == 200:
+				break
+		self.assertIsNotNone(response)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(len(self.server.uploads), 1)
+		with open(self.server.uploads[0]['file'], 'rb') as f:
+			stored = f.read()
+		with open(self.file_path, 'rb') as f:
+			source = f.read()
+		self.assertEqual(len(stored), len(source))
+		self.assertTrue(stored == source, "stored upload differs from the log")
+		# A finished upload leaves no checkpoint behind
+		self.assertIsNone(uploader.load_checkpoint(uploader.upload_id(self.file_path)))
+
+	def test_checkpoint_ahead_of_server_is_resynced(self):
+		# A checkpoint that claims parts the server never stored, and no
+		# server offset to correct it, so the first part sent is a 409
+		self.server.drop_rate = 0.0
+		size = os.path.getsize(self.file_path)
+		uploader.save_checkpoint({'upload_id': uploader.upload_id(self.file_path), 'url': self.url, 'file_path': self.file_path, 'size': size, 'part_size': PART_SIZE, 'parts': [0, 1, 2]})
+		with mock.patch.object(uploader, 'server_offset', return_value=None):
+			response = uploader.resumable_upload(self.url, self.file_path, PART_SIZE)
+		self.assertEqual(response.status_code, 200)
+		with open(self.server.uploads[0]['file'], 'rb') as f:
+			stored = f.read()
+		with open(self.file_path, 'rb') as f:
+			self.assertTrue(stored == f.read(), "stored upload differs from the log")
+
+	def test_part_conflict_is_not_a_duplicate(self):
+		conflict = requests.Response()
+		conflict.status_code = 409
+		conflict._content = b'{"offset": 16384}'
+		self.assertEqual(uploader.conflict_offset(conflict), 16384)
+		self.assertFalse(uploader.is_duplicate(conflict))
+		duplicate = requests.Response()
+		duplicate.status_code = 409
+		duplicate._content = b'{"message": "Combat log already uploaded"}'
+		self.assertIsNone(uploader.conflict_offset(duplicate))
+		self.assertTrue(uploader.is_duplicate(duplicate))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import throttle
+from throttle import TokenBucket, UploadSlots
+
+# Staying out of the game's way: play is told from how fast the log grows,
+# big logs wait for it to end, the token bucket holds bodies to the play
+# bandwidth without letting a burst through, and logs take turns at the
+# connection while one log's own requests go out together.
+
+class PlayTest(unittest.TestCase):
+	def setUp(self):
+		self.work_dir = tempfile.mkdtemp(prefix='arenalogs-test-')
+		self.file_path = os.path.join(self.work_dir, 'WoWCombatLog-1.txt')
+		with open(self.file_path, 'wb') as f:
+			f.write(b'x' * 1000)
+		for patcher in (mock.patch.object(throttle, 'active_until', 0), mock.patch.object(throttle, 'sizes', {}), mock.patch.object(throttle, 'growth', [])):
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def tearDown(self):
+		shutil.rmtree(self.work_dir, ignore_errors=True)
+
+	def grow(self, n):
+		with open(self.file_path, 'ab') as f:
+			f.write(b'x' * n)
+		throttle.file_changed(self.file_path)
+
+	def test_slow_growth_is_not_play(self):
+		throttle.file_changed(self.file_path)
+		self.grow(100)
+		self.assertFalse(throttle.playing())
+		self.assertIsNone(throttle.bandwidth())
+
+	def test_fast_growth_is_play(self):
+		throttle.file_changed(self.file_path)
+		self.grow(throttle.PLAY_BYTES_PER_SECOND * throttle.PLAY_WINDOW)
+		self.assertTrue(throttle.playing())
+		self.assertEqual(throttle.bandwidth(), throttle.PLAY_BANDWIDTH)
+
+	def test_new_log_is_play(self):
+		throttle.log_started(self.file_path)
+		self.assertTrue(throttle.playing())
+
+	def test_only_big_logs_wait_for_play_to_end(self):
+		self.assertEqual(throttle.defer_seconds(self.file_path), 0)
+		throttle.log_started(self.file_path)
+		self.assertEqual(throttle.defer_seconds(self.file_path), 0)
+		with mock.patch.object(throttle, 'DEFER_BYTES', 100):
+			self.assertGreater(throttle.defer_seconds(self.file_path), throttle.IDLE_SECONDS - 5)
+			# A log that is gone is not held back
+			self.assertEqual(throttle.defer_seconds(self.file_path + '.gone'), 0)
+
+class TokenBucketTest(unittest.TestCase):
+	def test_empty_bucket_waits_for_the_bytes(self):
+		bucket = TokenBucket()
+		self.assertAlmostEqual(bucket.take(1000, 1000), 1.0, delta=0.05)
+		# The debt carries over to the next sender
+		self.assertAlmostEqual(bucket.take(1000, 1000), 2.0, delta=0.05)
+
+	def test_idle_time_only_buys_a_short_burst(self):
+		bucket = TokenBucket(burst_seconds=0.5)
+		bucket.updated -= 60
+		self.assertEqual(bucket.take(500, 1000), 0)
+		self.assertAlmostEqual(bucket.take(500, 1000), 0.5, delta=0.05)
+
+	def test_throttled_body_is_unchanged(self):
+		body = [os.urandom(40000), b'', os.urandom(5)]
+		with mock.patch.object(throttle, 'bandwidth', return_value=10 ** 9):
+			self.assertEqual(b''.join(throttle.throttled(body)), b''.join(body))
+
+class UploadSlotsTest(unittest.TestCase):
+	def hold(self, slots, file_path, entered, release):
+		with slots.slot(file_path):
+			entered.append(file_path)
+			release.wait(5)
+
+	def start(self, *args):
+		thread = threading.Thread(target=self.hold, args=args, daemon=True)
+		thread.start()
+		return thread
+
+	def wait_for(self, condition):
+		deadline = time.monotonic() + 5
+		while not condition() and time.monotonic() < deadline:
+			time.sleep(0.01)
+
+	def test_other_logs_wait_their_turn(self):
+		slots = UploadSlots(limit=1)
+		entered = []
+		first, second = threading.Event(), threading.Event()
+		threads = [self.start(slots, 'a', entered, first)]
+		self.wait_for(lambda: entered == ['a'])
+		threads.append(self.start(slots, 'b', entered, second))
+		self.wait_for(lambda: len(slots.waiting) == 1)
+		threads.append(self.start(slots, 'c', entered, second))
+		self.wait_for(lambda: len(slots.waiting) == 2)
+		# Another request of the log that is in goes straight in
+		threads.append(self.start(slots, 'a', entered, first))
+		self.wait_for(lambda: entered == ['a', 'a'])
+		self.assertEqual(entered, ['a', 'a'])
+		first.set()
+		second.set()
+		for thread in threads:
+			thread.join(5)
+		# The others in the order they asked
+		self.assertEqual(entered, ['a', 'a', 'b', 'c'])
+		self.assertEqual(slots.active, {})
+
+	def test_no_file_is_never_held(self):
+		slots = UploadSlots(limit=1)
+		with slots.slot('a'):
+			with slots.slot(None):
+				self.assertEqual(slots.active, {'a': 1})
+
+if __name__ == '__main__':
+	unittest.main()
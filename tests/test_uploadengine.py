@@ -0,0 +1,48 @@
+import os
+import sys
+import threading
+import unittest
+from concurrent.futures import CancelledError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from uploadengine import UploadEngine
+
+# The upload engine: completion callbacks go through the dispatcher the GUI
+# set, map keeps the order of its arguments, and nothing is taken after stop.
+
+class UploadEngineTest(unittest.TestCase):
+	def setUp(self):
+		self.engine = UploadEngine(concurrency=2, max_pending=4)
+
+	def tearDown(self):
+		self.engine.stop()
+
+	def test_callbacks_go_through_the_dispatcher(self):
+		dispatched = []
+		done = threading.Event()
+
+		def dispatch(callback, future):
+			dispatched.append(callback)
+			callback(future)
+
+		results = []
+		self.engine.set_dispatcher(dispatch)
+		callback = lambda future: (results.append(future.result()), done.set())
+		self.engine.submit(pow, 2, 10, callback=callback)
+		self.assertTrue(done.wait(5))
+		self.assertEqual(results, [1024])
+		self.assertEqual(dispatched, [callback])
+
+	def test_map_keeps_the_order(self):
+		self.assertEqual(self.engine.map(pow, [(2, i) for i in range(10)]), [2 ** i for i in range(10)])
+
+	def test_nothing_is_taken_after_stop(self):
+		self.engine.stop()
+		with self.assertRaises(RuntimeError):
+			self.engine.submit(pow, 2, 10)
+		with self.assertRaises(CancelledError):
+			self.engine.map(pow, [(2, 10)])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+import metrics
+
+# Keeping uploads out of the way of the game. New logs and matches show up
+# exactly when someone is queueing or in an arena, and an upload filling the
+# uplink then is a lag spike in game. The combat log itself says when the
+# game is being played: it grows quickly in combat and barely at all
+# otherwise. While it is growing faster than PLAY_BYTES_PER_SECOND, and for
+# IDLE_SECONDS after, every request body is held to PLAY_BANDWIDTH by a token
+# bucket, and the upload queue holds back logs bigger than DEFER_BYTES until
+# play is over. Upload threads also run at a lower OS priority, so reading
+# and compressing never takes CPU from the game.
+#
+# Logs also take turns. Only ACTIVE_LOGS logs have requests in flight at
+# once, whichever install, queue worker or dialog they come from, and the
+# others wait in the order they asked. Requests for a log that already has
+# one in flight, its matches on the UploadEngine or its servers in a fan-out,
+# go straight in, so one log's upload keeps its concurrency.
+
+# Log growth, averaged over PLAY_WINDOW seconds, that counts as playing
+PLAY_BYTES_PER_SECOND = 1024
+PLAY_WINDOW = 30
+# Seconds without that growth before play counts as over
+IDLE_SECONDS = 90
+# Upload bandwidth in bytes per second while playing and otherwise, None
+# for no limit
+PLAY_BANDWIDTH = 64 * 1024
+IDLE_BANDWIDTH = None
+# Logs bigger than this wait for play to be over instead of trickling
+DEFER_BYTES = 5 * 1024 * 1024
+# Most bytes sent in one go while limited, so the trickle stays smooth
+SLICE_BYTES = 16 * 1024
+
+# Logs with requests in flight at once
+ACTIVE_LOGS = 1
+
+# Niceness of upload threads where there is no Windows background mode
+WORKER_NICE = 10
+# SetThreadPriority mode that lowers CPU, I/O and memory priority together
+THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+
+lock = threading.Lock()
+sizes = {}
+growth = []
+active_until = 0
+
+# Note the size of a combat log after a file event
+def file_changed(file_path):
+	global active_until
+	try:
+		size = os.path.getsize(file_path)
+	except OSError:
+		return
+	now = time.monotonic()
+	with lock:
+		grown = size - sizes.get(file_path, size)
+		sizes[file_path] = size
+		if grown > 0:
+			growth.append((now, grown))
+		while growth and growth[0][0] < now - PLAY_WINDOW:
+			growth.pop(0)
+		if sum(n for _, n in growth) >= PLAY_BYTES_PER_SECOND * PLAY_WINDOW:
+			active_until = now + IDLE_SECONDS
+
+# WoW starts a new log when logging is turned on, which is when play starts
+def log_started(file_path):
+	global active_until
+	with lock:
+		sizes[file_path] = 0
+		active_until = time.monotonic() + IDLE_SECONDS
+
+def playing():
+	return time.monotonic() < active_until
+
+# Seconds a queued upload of file_path should wait, 0 to send it now
+def defer_seconds(file_path):
+	if not playing():
+		return 0
+	try:
+		if os.path.getsize(file_path) <= DEFER_BYTES:
+			return 0
+	except OSError:
+		return 0
+	return max(active_until - time.monotonic(), 1)
+
+def bandwidth():
+	return PLAY_BANDWIDTH if playing() else IDLE_BANDWIDTH
+
+# Token bucket shared by every upload. Sending more than there are tokens
+# for leaves the bucket in debt, and the next sender waits it off.
+class TokenBucket:
+	def __init__(self, burst_seconds=0.5):
+		self.burst_seconds = burst_seconds
+		self.lock = threading.Lock()
+		self.tokens = 0.0
+		self.updated = time.monotonic()
+
+	# Seconds to wait before sending n bytes at rate bytes per second
+	def take(self, n, rate):
+		with self.lock:
+			now = time.monotonic()
+			self.tokens = min(self.tokens + (now - self.updated) * rate, rate * self.burst_seconds)
+			self.updated = now
+			self.tokens -= n
+			return max(-self.tokens / rate, 0)
+
+bucket = TokenBucket()
+
+# Pass a request body through, held to bandwidth() for as long as it has a
+# limit. Time spent waiting is the throttle stage of the file's upload.
+def throttled(chunks, file_path=None):
+	for chunk in chunks:
+		rate = bandwidth()
+		if rate is None:
+			yield chunk
+			continue
+		for start in range(0, len(chunk), SLICE_BYTES):
+			piece = chunk[start:start + SLICE_BYTES]
+			wait = bucket.take(len(piece), rate)
+			if wait:
+				with metrics.timed(file_path, 'throttle'):
+					time.sleep(wait)
+			yield piece
+
+class UploadSlots:
+	def __init__(self, limit=ACTIVE_LOGS):
+		self.limit = limit
+		self.condition = threading.Condition()
+		# Requests in flight for each log
+		self.active = {}
+		self.waiting = deque()
+
+	def admitted(self, file_path, ticket):
+		if file_path in self.active:
+			return True
+		return len(self.active) < self.limit and self.waiting[0] is ticket
+
+	# Hold a place for one request of file_path, None is never held back
+	@contextmanager
+	def slot(self, file_path):
+		if file_path is None:
+			yield
+			return
+		ticket = object()
+		with self.condition:
+			self.waiting.append(ticket)
+			if not self.admitted(file_path, ticket):
+				with metrics.timed(file_path, 'throttle'):
+					self.condition.wait_for(lambda: self.admitted(file_path, ticket))
+			self.waiting.remove(ticket)
+			self.active[file_path] = self.active.get(file_path, 0) + 1
+			self.condition.notify_all()
+		try:
+			yield
+		finally:
+			with self.condition:
+				self.active[file_path] -= 1
+				if not self.active[file_path]:
+					del self.active[file_path]
+				self.condition.notify_all()
+
+slots = UploadSlots()
+
+# Run the calling thread at a lower priority than the game
+def lower_priority():
+	try:
+		if sys.platform == 'win32':
+			import ctypes
+			kernel32 = ctypes.windll.kernel32
+			kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_MODE_BACKGROUND_BEGIN)
+		else:
+			os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), WORKER_NICE)
+	except (OSError, AttributeError):
+		pass
@@ -0,0 +1,247 @@
+import os
+import threading
+import requests
+from uploader import pending_uploads, is_duplicate, state_dir, ServerUnavailable, UNAVAILABLE_STATUSES
+from tailer import LogTailer
+from fanout import Destination, upload_log
+from jobqueue import UploadQueue
+from hashindex import HashIndex
+from matchindex import MatchIndex
+from logcache import LogCache
+import metrics
+import throttle
+from metrics import MetricsLog, MetricsServer
+from notify import Notifier
+from uploadengine import UploadEngine
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+from logevents import LogEventCoalescer, is_combat_log
+from wowinstalls import find_log_folders
+
+# What every uploader app does between the log folders and the server: the
+# upload queue and engine, the indexes, the live tailer, the folder watcher
+# and the upload toasts. arenalogsgg.py, local.py, arenalogs.py and
+# local2.py each make one UploadApp with their own server, name, icon and
+# toast call, and hand it to their windows as app.
+
+# Watched when no WoW install is found
+DEFAULT_LOGS_DIRECTORY = "C:\\Program Files (x86)\\World of Warcraft\\_retail_\\Logs"
+
+class UploadApp:
+	# display is the toolkit call that shows a toast, (title, message), it
+	# blocks until the toast is gone and only the notifier thread calls it.
+	# upload_urls are every server the logs go to, upload_url alone unless
+	# given. Each log is still read and compressed once, and each server
+	# keeps its own index of what it has been sent.
+	def __init__(self, upload_url, app_name, icon_path, display, upload_urls=None, arena_only=True, send_summaries=True, live_tail=True, quiet_seconds=60, metrics_port=None):
+		self.upload_url = upload_url
+		self.app_name = app_name
+		self.icon_path = icon_path
+		# Only send the arena matches in a log, one upload per match
+		self.arena_only = arena_only
+		# Send a short summary of each match ahead of the match so results show up sooner
+		self.send_summaries = send_summaries
+		# Send the active log as it grows instead of once it has stopped changing
+		self.live_tail = live_tail
+		# Seconds a log has to stay unchanged before it is uploaded when not live tailing
+		self.quiet_seconds = quiet_seconds
+		# Folders WoW writes the combat logs to. Unless they are set, every
+		# retail, classic and PTR install found is watched when the app starts.
+		self.logs_directories = None
+		self.notifier = Notifier(display, app_name)
+		# Runs the uploads inside one job side by side, like the matches in a log
+		self.upload_engine = UploadEngine()
+		# Hashes of everything uploaded so far, so nothing is sent twice. No
+		# server asked for them yet, so nothing is checked with the server.
+		self.hash_index = HashIndex(upload_url)
+		self.destinations = [Destination(url, self.hash_index if url == upload_url else HashIndex(url)) for url in upload_urls or [upload_url]]
+		# Where the arena matches are in each log, kept next to the logs' size and mtime
+		self.match_index = MatchIndex()
+		# Size, match count and upload status of every log, kept up to date from file events
+		self.log_cache = LogCache(upload_url)
+		# Timings of every upload go to a rotating file, and to a local Prometheus
+		# endpoint at http://127.0.0.1:<metrics_port>/metrics when a port is set
+		metrics.add_sink(MetricsLog(os.path.join(state_dir(), 'metrics.jsonl')))
+		if metrics_port:
+			metrics.add_sink(MetricsServer(metrics_port))
+		self.tailer = LogTailer(upload_url, arena_only=arena_only, index=self.hash_index, summaries=send_summaries, destinations=self.destinations if len(self.destinations) > 1 else None)
+		# Uploads run on worker threads so file events and the UI never wait on them.
+		# Big ones wait while the game is being played.
+		self.upload_queue = UploadQueue(upload_url, self.upload_file, defer=throttle.defer_seconds)
+
+	# Show a toast without waiting for it. kind marks upload results so a
+	# burst of them can be shown as one summary toast.
+	def show_tray_message(self, ntitle, nmessage, kind=None):
+		self.notifier.notify(ntitle, nmessage, kind)
+
+	# Record how an upload went, in the log cache and the upload metrics
+	def finish_upload(self, file_path, status, response=None):
+		self.log_cache.set_status(file_path, status)
+		metrics.end(file_path, status, response.status_code if response is not None else None)
+
+	# Upload one log to every server, the upload queue's handler
+	def upload_file(self, file_path):
+		metrics.begin(file_path)
+		print(f"Uploading {file_path}", flush=True)
+		self.show_tray_message("Starting Upload", f"Uploading {os.path.basename(file_path)}", kind='started')
+		if self.log_cache.up_to_date(file_path):
+			self.show_tray_message("Nothing to Upload", f"{os.path.basename(file_path)} has not changed since it was uploaded", kind='nothing')
+			metrics.end(file_path, 'unchanged')
+			return True
+		try:
+			responses = upload_log(self.destinations, file_path, self.arena_only, self.upload_engine, self.match_index, self.send_summaries)
+		except ServerUnavailable:
+			# Queued again, a no-op for a job the queue is running, so it goes up
+			# once the server is back
+			self.finish_upload(file_path, 'queued')
+			self.upload_queue.put(file_path)
+			self.show_tray_message("Upload Waiting", f"{os.path.basename(file_path)} will be uploaded when the server is back", kind='waiting')
+			return False
+		except requests.RequestException:
+			self.finish_upload(file_path, 'failed')
+			self.show_tray_message("Upload Interrupted", f"Could not finish uploading {os.path.basename(file_path)}", kind='failed')
+			return False
+		if not responses:
+			self.finish_upload(file_path, 'nothing')
+			self.show_tray_message("Nothing to Upload", f"Nothing new to upload in {os.path.basename(file_path)}", kind='nothing')
+			return True
+		# Report the first failed upload, or the last one if they all went through
+		response = next((r for r in responses if r.status_code != 200 and not is_duplicate(r)), responses[-1])
+		print("Status Code:", response.status_code, flush=True)
+		if response.status_code == 200:
+			self.finish_upload(file_path, 'uploaded', response)
+			self.show_tray_message("Upload Successful", f"Successfully uploaded {os.path.basename(file_path)}", kind='uploaded')
+			return True
+		elif is_duplicate(response):
+			self.finish_upload(file_path, 'exists', response)
+			self.show_tray_message("Combat log exists", f"{os.path.basename(file_path)} was already uploaded", kind='exists')
+			return True
+		elif response.status_code in UNAVAILABLE_STATUSES:
+			self.finish_upload(file_path, 'queued', response)
+			self.upload_queue.put(file_path)
+			self.show_tray_message("Upload Waiting", f"{os.path.basename(file_path)} will be uploaded when the server is back", kind='waiting')
+			return False
+		else:
+			self.finish_upload(file_path, 'failed', response)
+			self.show_tray_message("Upload Failed", "Failed to upload the file.", kind='failed')
+			return False
+
+	# Queue an upload and show it as queued in the file list
+	def queue_upload(self, file_path):
+		metrics.detected(file_path)
+		self.log_cache.set_status(file_path, 'queued')
+		self.upload_queue.put(file_path)
+
+	# Finish a live uploaded log once WoW has moved on to a new one
+	def finish_log(self, file_path):
+		if self.tailer.finish(file_path):
+			self.show_tray_message("Upload Successful", f"Successfully uploaded {os.path.basename(file_path)}", kind='uploaded')
+		else:
+			print(f"Could not finish {file_path}, trying again with the next log", flush=True)
+
+	# Finish interrupted uploads
+	def resume_uploads(self):
+		for file_path in pending_uploads(self.upload_url):
+			self.queue_upload(file_path)
+
+	# Bring the log cache up to date with a folder, only logs that are new or
+	# changed get their matches counted
+	def index_logs(self, directory):
+		self.log_cache.sync(directory)
+		for log_file in self.log_cache.files(directory):
+			if log_file.matches is None:
+				self.match_count(log_file.path)
+
+	# Estimate how many bytes uploading a log reads, for progress bars
+	def upload_size(self, file_path):
+		if self.arena_only:
+			return sum(end - start for match in self.match_index.matches(file_path) if match.complete for start, end in match.ranges())
+		return os.path.getsize(file_path)
+
+	# Describe how many arena matches a log has, from the match index
+	def match_count(self, file_path):
+		try:
+			count = self.match_index.count(file_path)
+		except OSError:
+			return ""
+		self.log_cache.set_matches(file_path, count)
+		return str(count)
+
+	# Find the Logs folder of every WoW install, once
+	def log_folders(self):
+		if self.logs_directories is None:
+			self.logs_directories = [folder.path for folder in find_log_folders()] or [DEFAULT_LOGS_DIRECTORY]
+		return self.logs_directories
+
+	# Watch the log folders. One observer watches every folder and all of them
+	# feed the same upload queue and tailer, so logs from several installs
+	# take turns instead of competing for the connection.
+	def setup_file_monitoring(self):
+		# Bursts of events come through as one, and uploads wait for the log to settle
+		event_handler = LogEventCoalescer(NewLogFileHandler(self), self.quiet_seconds)
+		observer = Observer()
+		watched = []
+		for path_to_watch in self.log_folders():
+			if not os.path.isdir(path_to_watch):
+				print(f"Could not find {path_to_watch}", flush=True)
+				continue
+			observer.schedule(event_handler, path=path_to_watch, recursive=False)
+			watched.append(path_to_watch)
+		observer.start()
+		for path_to_watch in watched:
+			print(f"Watching {path_to_watch}", flush=True)
+			# Catch up on logs that changed while the app was closed, then index their matches
+			threading.Thread(target=self.index_logs, args=(path_to_watch,), daemon=True).start()
+		# Finish uploads that were cut off the last time the app ran
+		self.resume_uploads()
+
+	# Called on Quit
+	def stop(self):
+		self.upload_engine.stop()
+		self.upload_queue.stop()
+
+# Keeps the log cache, the match index and the tailer in step with the log folders
+class NewLogFileHandler(FileSystemEventHandler):
+	def __init__(self, app):
+		self.app = app
+
+	def is_combat_log(self, event):
+		return not event.is_directory and is_combat_log(event.src_path)
+
+	def on_created(self, event):
+		if self.is_combat_log(event):
+			self.app.log_cache.touch(event.src_path)
+			throttle.log_started(event.src_path)
+			print(f"New log file detected: {event.src_path}", flush=True)
+			self.app.show_tray_message("Auto Upload", f"New log file detected {os.path.basename(event.src_path)}", kind='started')
+			if self.app.live_tail:
+				# A new log means the ones before it in its folder are closed,
+				# other installs keep writing theirs
+				for file_path in self.app.tailer.active_files():
+					if file_path != event.src_path and os.path.dirname(file_path) == os.path.dirname(event.src_path):
+						threading.Thread(target=self.app.finish_log, args=(file_path,), daemon=True).start()
+				self.app.tailer.file_changed(event.src_path)
+
+	def on_modified(self, event):
+		if self.is_combat_log(event):
+			self.app.log_cache.touch(event.src_path)
+			throttle.file_changed(event.src_path)
+			if self.app.live_tail:
+				self.app.tailer.file_changed(event.src_path)
+
+	def on_deleted(self, event):
+		if self.is_combat_log(event):
+			self.app.log_cache.remove(event.src_path)
+			self.app.match_index.forget(event.src_path)
+
+	def on_moved(self, event):
+		if self.is_combat_log(event):
+			self.app.log_cache.remove(event.src_path)
+			self.app.match_index.forget(event.src_path)
+		if not event.is_directory and is_combat_log(event.dest_path):
+			self.app.log_cache.touch(event.dest_path)
+
+	# Called once a log has stopped changing, so all of it is there to upload
+	def on_log_stable(self, file_path):
+		if not self.app.live_tail:
+			self.app.queue_upload(file_path)
@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from throttle import lower_priority
+
+# Upload engine. A pool of CONCURRENCY threads runs upload jobs, so the
+# per-match uploads of a log and its extra destinations go out side by side
+# instead of one after another. The HTTP calls stay on the shared requests
+# session, there is no async HTTP client to hand them to. Any thread,
+# the Qt or wx GUI thread included, can submit a job and have a callback run
+# on its own thread once the job is done.
+
+# Jobs running at once
+CONCURRENCY = 4
+# Jobs submitted but not finished before submit() starts to push back
+MAX_PENDING = 64
+
+class UploadEngine:
+	def __init__(self, concurrency=CONCURRENCY, max_pending=MAX_PENDING):
+		self.executor = ThreadPoolExecutor(concurrency, thread_name_prefix='upload', initializer=lower_priority)
+		self.slots = threading.BoundedSemaphore(max_pending)
+		self.lock = threading.Lock()
+		self.futures = set()
+		self.dispatch = None
+		self.stopped = False
+
+	# dispatch(callback, future) runs a completion callback on the GUI
+	# thread, wx.CallAfter for wx or a CallbackBridge signal for Qt. Without
+	# one callbacks run on the thread that ran the job.
+	def set_dispatcher(self, dispatch):
+		self.dispatch = dispatch
+
+	# Run fn(*args) on the engine and return a concurrent.futures.Future,
+	# calling callback(future) once it is done. When MAX_PENDING jobs are
+	# already waiting this blocks until one finishes. Raises RuntimeError
+	# once the engine is stopped.
+	def submit(self, fn, *args, callback=None):
+		self.slots.acquire()
+		with self.lock:
+			if self.stopped:
+				self.slots.release()
+				raise RuntimeError("upload engine is stopped")
+			future = self.executor.submit(fn, *args)
+			self.futures.add(future)
+		future.add_done_callback(lambda f: self.done(f, callback))
+		return future
+
+	def done(self, future, callback):
+		with self.lock:
+			self.futures.discard(future)
+		self.slots.release()
+		if callback is None or future.cancelled():
+			return
+		if self.dispatch is not None:
+			self.dispatch(callback, future)
+		else:
+			callback(future)
+
+	# Run fn over a list of argument tuples at the engine's concurrency and
+	# wait for all of them. Results come back in the same order. Raises
+	# CancelledError if the engine is stopped first.
+	def map(self, fn, arg_list):
+		try:
+			futures = [self.submit(fn, *args) for args in arg_list]
+		except RuntimeError:
+			raise CancelledError()
+		return [future.result() for future in futures]
+
+	# Called on Quit. Jobs that have not started are cancelled, jobs that are
+	# mid-request finish on their own thread but nobody waits for them.
+	def stop(self):
+		with self.lock:
+			if self.stopped:
+				return
+			self.stopped = True
+			futures = list(self.futures)
+		for future in futures:
+			future.cancel()
+		self.executor.shutdown(wait=False, cancel_futures=True)
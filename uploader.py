@@ -0,0 +1,633 @@
+import io
+import os
+import json
+import time
+import zlib
+import codecs
+import random
+import hashlib
+import threading
+import requests
+import binlog
+import email.utils
+from urllib.parse import urlsplit
+import metrics
+import throttle
+from wowinstalls import flavor_of
+from requests.adapters import HTTPAdapter
+
+try:
+	import zstandard
+except ImportError:
+	# zstd is optional, gzip is always available
+	zstandard = None
+
+# Size of each read from the combat log, in bytes
+CHUNK_SIZE = 1024 * 1024
+
+# Compression levels, chosen to keep up with a fast uplink on one core
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Content-Encoding each upload url has agreed to, filled in as servers answer
+accepted_encodings = {}
+
+# Upload urls that have offered to read the binary event format (binlog.py) in
+# their Accept-Log-Format header, everything else gets the JSON body
+binary_urls = set()
+
+# The binary event format is only sent when this is turned on. It is a lot
+# smaller than compressed text, but the encoder is pure Python and runs at a
+# few MB/s where zstd does hundreds, so it only pays on a slow uplink.
+binary_uploads = False
+# Bodies bigger than this go as compressed text even then, so one big log
+# never holds an upload thread for minutes of encoding
+BINARY_MAX_BYTES = 8 * 1024 * 1024
+
+# Files at least this big are sent in numbered parts that can be resumed
+RESUMABLE_MIN_SIZE = 64 * 1024 * 1024
+PART_SIZE = 8 * 1024 * 1024
+# Tries per part before the upload is left to be resumed later
+PART_ATTEMPTS = 5
+
+# Timeouts for every request in seconds. The read timeout is the longest the
+# server may go quiet, not a limit on the whole upload.
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 120
+# Most connections kept open to one server, extra requests wait for one
+POOL_SIZE = 8
+
+# Consecutive failed requests to a server before its circuit breaker opens
+BREAKER_FAILURES = 5
+# How long the breaker first stays open, doubled every time the request let
+# through to test the server fails too
+BREAKER_SECONDS = 30
+BREAKER_MAX_SECONDS = 30 * 60
+# Header telling the server which WoW flavor, retail, classic, ptr..., a log
+# is from
+FLAVOR_HEADER = 'X-WoW-Flavor'
+
+# Answers that mean the server is down or busy rather than the upload is bad
+UNAVAILABLE_STATUSES = (429, 500, 502, 503, 504)
+
+# Raised instead of making a request while a server's breaker is open, so
+# nothing is read or compressed for a request that would fail anyway.
+# retry_after is how many seconds until the server may be tried again.
+class ServerUnavailable(requests.RequestException):
+	def __init__(self, origin, retry_after):
+		super().__init__(f"{origin} is unavailable, retry in {retry_after:.0f} s")
+		self.retry_after = retry_after
+
+# Seconds a Retry-After header asks for, given as seconds or as a date
+def retry_after(response):
+	value = response.headers.get('Retry-After')
+	if not value:
+		return None
+	try:
+		return max(float(value), 0)
+	except ValueError:
+		pass
+	try:
+		return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0)
+	except (TypeError, ValueError):
+		return None
+
+# A delay with random jitter, somewhere between half of it and all of it, so
+# clients that failed together don't all come back together
+def jittered(delay):
+	return delay / 2 + random.uniform(0, delay / 2)
+
+# Circuit breaker for one server. After BREAKER_FAILURES failures in a row,
+# or an answer with Retry-After, no requests go out until the open period is
+# over. Then one request is let through to test the server: if it works the
+# breaker closes and the listeners are told, if not it opens again for twice
+# as long.
+class CircuitBreaker:
+	def __init__(self, origin, failures=BREAKER_FAILURES, open_seconds=BREAKER_SECONDS, max_open_seconds=BREAKER_MAX_SECONDS):
+		self.origin = origin
+		self.threshold = failures
+		self.open_seconds = open_seconds
+		self.max_open_seconds = max_open_seconds
+		self.lock = threading.Lock()
+		self.failures = 0
+		self.opened = 0
+		self.open_until = 0
+		self.testing = False
+		self.listeners = []
+
+	# Called with no arguments when the breaker closes again
+	def add_listener(self, callback):
+		self.listeners.append(callback)
+
+	# Seconds until requests may go out again, 0 if they can now
+	def wait(self):
+		return max(self.open_until - time.time(), 0)
+
+	# True if the last request to the server failed
+	def failing(self):
+		return self.failures > 0
+
+	# True while no new requests may go out, the breaker is open or a request
+	# is already testing the server
+	def blocked(self):
+		return self.wait() > 0 or self.testing
+
+	# Raise ServerUnavailable unless a request may go out now
+	def check(self):
+		with self.lock:
+			wait = self.open_until - time.time()
+			if wait > 0:
+				raise ServerUnavailable(self.origin, wait)
+			if self.opened:
+				if self.testing:
+					raise ServerUnavailable(self.origin, 1)
+				self.testing = True
+
+	# The request failed in a way that says nothing about the server
+	def release(self):
+		with self.lock:
+			self.testing = False
+
+	def success(self):
+		with self.lock:
+			reopened = self.opened > 0
+			self.failures = 0
+			self.opened = 0
+			self.open_until = 0
+			self.testing = False
+		if reopened:
+			for callback in self.listeners:
+				callback()
+
+	def failure(self, retry_after=None):
+		with self.lock:
+			self.failures += 1
+			self.testing = False
+			if self.failures >= self.threshold or self.opened:
+				period = jittered(min(self.open_seconds * 2 ** self.opened, self.max_open_seconds))
+				period = max(period, retry_after or 0)
+			elif retry_after is not None:
+				# Busy rather than down, wait as long as the server asked
+				period = retry_after
+			else:
+				return
+			self.opened += 1
+			self.open_until = max(self.open_until, time.time() + period)
+		print(f"{self.origin} is unavailable, waiting {period:.0f} s", flush=True)
+
+breakers = {}
+breakers_lock = threading.Lock()
+
+def breaker_for(url):
+	parts = urlsplit(url)
+	origin = f"{parts.scheme}://{parts.netloc}"
+	with breakers_lock:
+		if origin not in breakers:
+			breakers[origin] = CircuitBreaker(origin)
+		return breakers[origin]
+
+# One session shared by every upload so connections, and their TLS
+# handshakes, are reused from one request to the next. Every request goes
+# through the server's circuit breaker.
+class UploadSession(requests.Session):
+	def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), pool_size=POOL_SIZE):
+		super().__init__()
+		self.timeout = timeout
+		adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+		self.mount('https://', adapter)
+		self.mount('http://', adapter)
+
+	def request(self, method, url, **kwargs):
+		kwargs.setdefault('timeout', self.timeout)
+		breaker = breaker_for(url)
+		breaker.check()
+		try:
+			response = super().request(method, url, **kwargs)
+		except (requests.ConnectionError, requests.Timeout):
+			breaker.failure()
+			raise
+		except BaseException:
+			breaker.release()
+			raise
+		if response.status_code in UNAVAILABLE_STATUSES:
+			breaker.failure(retry_after(response))
+		else:
+			breaker.success()
+		return response
+
+shared_session = None
+session_lock = threading.Lock()
+
+def get_session():
+	global shared_session
+	with session_lock:
+		if shared_session is None:
+			shared_session = UploadSession()
+		return shared_session
+
+# Folder for checkpoints and other upload state
+def state_dir():
+	base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+	path = os.path.join(base, 'ArenaLogs')
+	os.makedirs(path, exist_ok=True)
+	return path
+
+# Progress callbacks by file path, for progress bars. Each is called with the
+# number of bytes just read for sending, on whichever thread is sending them.
+progress_callbacks = {}
+
+def watch_progress(file_path, callback):
+	progress_callbacks[file_path] = callback
+
+def unwatch_progress(file_path):
+	progress_callbacks.pop(file_path, None)
+
+def report_progress(file_path, size):
+	callback = progress_callbacks.get(file_path)
+	if callback is not None:
+		callback(size)
+
+# Read a file in chunks of at most chunk_size bytes. ranges is a list of
+# (start, end) byte offsets to read one after another, None reads it all.
+def read_chunks(f, chunk_size=CHUNK_SIZE, ranges=None):
+	if ranges is None:
+		ranges = [(0, None)]
+	for start, end in ranges:
+		f.seek(start)
+		while end is None or f.tell() < end:
+			size = chunk_size if end is None else min(chunk_size, end - f.tell())
+			with metrics.timed(f.name, 'read'):
+				chunk = f.read(size)
+			if not chunk:
+				break
+			metrics.add_count(f.name, 'bytes_read', len(chunk))
+			report_progress(f.name, len(chunk))
+			yield chunk
+
+# Short key for an upload url, used to name state files so apps that upload
+# to different servers keep their state apart
+def url_key(url):
+	return hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+
+# Build the upload body as a stream of bytes. The server still receives
+# {"file_contents": "..."} exactly as before, but the log is read in binary
+# chunks which are decoded, JSON escaped and sent one at a time so memory use
+# does not grow with the size of the file.
+def stream_payload(file_path, chunk_size=CHUNK_SIZE, ranges=None):
+	# Same newline handling as open(file_path, 'r', encoding='utf-8')
+	decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(), translate=True)
+	yield b'{"file_contents": "'
+	with open(file_path, 'rb') as f:
+		for chunk in read_chunks(f, chunk_size, ranges):
+			text = decoder.decode(chunk)
+			if text:
+				yield json.dumps(text)[1:-1].encode('ascii')
+	text = decoder.decode(b'', final=True)
+	if text:
+		yield json.dumps(text)[1:-1].encode('ascii')
+	yield b'"}'
+
+# Build the upload body in the binary event format, as a stream of bytes
+def binary_payload(file_path, chunk_size=CHUNK_SIZE, ranges=None):
+	with open(file_path, 'rb') as f:
+		yield from binlog.encode_stream(read_chunks(f, chunk_size, ranges))
+
+# Old behaviour, the whole file is read into memory and sent in one go
+def buffered_payload(file_path, ranges=None):
+	if ranges is None:
+		with open(file_path, 'r', encoding='utf-8') as f:
+			file_contents = f.read()
+	else:
+		with open(file_path, 'rb') as f:
+			data = b''.join(read_chunks(f, ranges=ranges))
+		file_contents = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+	return json.dumps({'file_contents': file_contents}).encode('ascii')
+
+# Encodings this client can send, best first
+def supported_encodings():
+	encodings = ['gzip', 'identity']
+	if zstandard is not None:
+		encodings.insert(0, 'zstd')
+	return encodings
+
+# Compress a stream of byte chunks as it goes, never holding more than the
+# compressor's own window in memory. The time spent compressing counts
+# towards the upload of file_path in the metrics.
+def compress_stream(chunks, encoding, file_path=None):
+	if encoding == 'identity':
+		yield from chunks
+		return
+	if encoding == 'gzip':
+		compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+	elif encoding == 'zstd':
+		compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+	else:
+		raise ValueError(f"Unsupported encoding {encoding}")
+	for chunk in chunks:
+		with metrics.timed(file_path, 'compress'):
+			data = compressor.compress(chunk)
+		if data:
+			yield data
+	with metrics.timed(file_path, 'compress'):
+		data = compressor.flush()
+	if data:
+		yield data
+
+# Work out which encoding to fall back to after a 415 response. A server that
+# knows RFC 7694 lists what it takes in Accept-Encoding, otherwise send plain.
+def fallback_encoding(response):
+	offered = response.headers.get('Accept-Encoding', '')
+	offered = [e.split(';')[0].strip().lower() for e in offered.split(',')]
+	for encoding in supported_encodings():
+		if encoding in offered:
+			return encoding
+	return 'identity'
+
+# True if a response says the server can't read the body as it was sent.
+# 415 is the proper answer, but servers that try to read a compressed body
+# as JSON answer 400 instead. A 400 for a log the server already has, or
+# from a server that took this encoding before, is about the log itself.
+def refused_body(url, response, encoding):
+	if response.status_code == 415:
+		return True
+	return response.status_code == 400 and not is_duplicate(response) and accepted_encodings.get(url) != encoding
+
+# Whether this upload of file_path to url goes in the binary event format
+def use_binary(url, file_path, ranges=None):
+	if not binary_uploads or url not in binary_urls:
+		return False
+	try:
+		file_size = os.path.getsize(file_path)
+	except OSError:
+		return False
+	size = sum((file_size if end is None else end) - start for start, end in ranges or [(0, None)])
+	return size <= BINARY_MAX_BYTES
+
+# Remember if a server has offered to take the binary event format
+def note_log_format(url, response):
+	offered = [f.strip() for f in response.headers.get('Accept-Log-Format', '').split(',')]
+	if binlog.FORMAT_NAME in offered:
+		binary_urls.add(url)
+
+# Send a combat log once with the given Content-Encoding, as JSON or with
+# binary set in the binary event format
+def send_file(url, file_path, encoding, stream=True, ranges=None, binary=False):
+	headers = {'Content-Type': 'application/json'}
+	if binary:
+		headers['Content-Type'] = binlog.CONTENT_TYPE
+		body = binary_payload(file_path, ranges=ranges)
+	elif stream:
+		body = stream_payload(file_path, ranges=ranges)
+	else:
+		body = [buffered_payload(file_path, ranges)]
+	if encoding != 'identity':
+		headers['Content-Encoding'] = encoding
+		body = compress_stream(body, encoding, file_path)
+	return timed_request(get_session().post, url, file_path, body, headers=headers)
+
+# Headers every upload of file_path carries
+def upload_headers(file_path):
+	flavor = flavor_of(file_path) if file_path else None
+	return {FLAVOR_HEADER: flavor} if flavor else {}
+
+# Make a request with a streamed body, timing the send and ack stages of the
+# upload of file_path. The body is held to the bandwidth limit while the
+# game is played, and waits for other logs' turns.
+def timed_request(method, url, file_path, body, **kwargs):
+	kwargs['headers'] = dict(kwargs.get('headers') or {}, **upload_headers(file_path))
+	finished = []
+	body = throttle.throttled(body, file_path)
+	with throttle.slots.slot(file_path):
+		response = method(url, data=metrics.metered(file_path, body, finished), **kwargs)
+	if finished:
+		metrics.add_time(file_path, 'ack', time.monotonic() - finished[0])
+	metrics.add_count(file_path, 'requests')
+	return response
+
+# Send a combat log to the upload endpoint and return the response.
+# With stream=True the body goes out with chunked transfer encoding.
+# With compress=True the body is compressed on the fly, using the best
+# encoding the server has not refused yet.
+# ranges limits the upload to those (start, end) byte ranges of the file.
+# Servers that have offered the binary event format get that instead of JSON,
+# when binary_uploads is on and the body is small enough.
+def post_file(url, file_path, stream=True, compress=True, ranges=None):
+	if compress:
+		encoding = accepted_encodings.get(url, supported_encodings()[0])
+	else:
+		encoding = 'identity'
+	if use_binary(url, file_path, ranges):
+		response = send_file(url, file_path, encoding, stream, ranges, binary=True)
+		if response.status_code not in (400, 415) or is_duplicate(response):
+			return response
+		# Refused after all, back to JSON until the server offers it again
+		binary_urls.discard(url)
+		metrics.add_count(file_path, 'retries')
+	response = send_file(url, file_path, encoding, stream, ranges)
+	if encoding != 'identity' and refused_body(url, response, encoding):
+		fallback = 'identity'
+		if response.status_code == 415:
+			fallback = fallback_encoding(response)
+		if fallback == encoding:
+			fallback = 'identity'
+		metrics.add_count(file_path, 'retries')
+		response = send_file(url, file_path, fallback, stream, ranges)
+		# A plain upload failing with 400 too means the 400 was about the log
+		# itself and not the encoding, so don't give up on compression
+		if response.status_code != 400 or fallback != 'identity':
+			accepted_encodings[url] = fallback
+	elif response.status_code == 200:
+		accepted_encodings[url] = encoding
+	note_log_format(url, response)
+	return response
+
+# Id for a resumable upload, the same file at the same size and mtime always
+# gets the same id so a restarted upload finds its earlier parts
+def upload_id(file_path):
+	stat = os.stat(file_path)
+	key = f"{os.path.basename(file_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+	return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def checkpoint_dir():
+	path = os.path.join(state_dir(), 'checkpoints')
+	os.makedirs(path, exist_ok=True)
+	return path
+
+def checkpoint_path(uid):
+	return os.path.join(checkpoint_dir(), f"{uid}.json")
+
+def load_checkpoint(uid):
+	try:
+		with open(checkpoint_path(uid), 'r', encoding='utf-8') as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
+
+# Write the checkpoint to a temp file first so a crash never leaves half of one
+def save_checkpoint(checkpoint):
+	path = checkpoint_path(checkpoint['upload_id'])
+	with open(path + '.tmp', 'w', encoding='utf-8') as f:
+		json.dump(checkpoint, f)
+	os.replace(path + '.tmp', path)
+
+def remove_checkpoint(uid):
+	try:
+		os.remove(checkpoint_path(uid))
+	except OSError:
+		pass
+
+# Files with an unfinished resumable upload to the given url. Checkpoints for
+# files that are gone or have changed since are thrown away.
+def pending_uploads(url):
+	files = []
+	for name in os.listdir(checkpoint_dir()):
+		if not name.endswith('.json'):
+			continue
+		checkpoint = load_checkpoint(name[:-5])
+		if checkpoint is None or checkpoint.get('url') != url:
+			continue
+		file_path = checkpoint['file_path']
+		if not os.path.exists(file_path) or upload_id(file_path) != checkpoint['upload_id']:
+			remove_checkpoint(checkpoint['upload_id'])
+			continue
+		files.append(file_path)
+	return files
+
+# Ask the server how many bytes of an upload it already has. None means the
+# server could not be asked and the local checkpoint has to do.
+def server_offset(base_url):
+	try:
+		response = get_session().get(base_url)
+	except requests.RequestException:
+		return None
+	if response.status_code == 404:
+		return 0
+	if response.status_code != 200:
+		return None
+	try:
+		return int(response.json().get('offset', 0))
+	except (ValueError, AttributeError):
+		return None
+
+def read_part(file_path, offset, size):
+	with metrics.timed(file_path, 'read'):
+		with open(file_path, 'rb') as f:
+			f.seek(offset)
+			data = f.read(size)
+	metrics.add_count(file_path, 'bytes_read', len(data))
+	report_progress(file_path, len(data))
+	return data
+
+# Address of a resumable upload on the server
+def resumable_url(url, uid):
+	return f"{url.rstrip('/')}/resumable/{uid}"
+
+# Send one part, trying again a few times if the connection drops. size is
+# the total size of the file, or '*' while it is still growing.
+# The last connection error is raised if every try fails.
+def send_part(part_url, data, start, size, encoding, file_path=None):
+	headers = {
+		'Content-Type': 'application/octet-stream',
+		'Content-Range': f"bytes {start}-{start + len(data) - 1}/{size}",
+	}
+	if encoding != 'identity':
+		headers['Content-Encoding'] = encoding
+	for attempt in range(PART_ATTEMPTS):
+		try:
+			return timed_request(get_session().put, part_url, file_path, compress_stream([data], encoding, file_path), headers=headers)
+		except requests.ConnectionError:
+			if attempt == PART_ATTEMPTS - 1:
+				raise
+			metrics.add_count(file_path, 'retries')
+			time.sleep(min(2 ** attempt, 30))
+
+# Tell the server every part of an upload is in
+def complete_upload(base_url, file_path, size):
+	return get_session().post(f"{base_url}/complete", json={'file_name': os.path.basename(file_path), 'size': size}, headers=upload_headers(file_path))
+
+# Upload a combat log in numbered parts of part_size bytes. Every part the
+# server acknowledges is written to a checkpoint file, and a restarted upload
+# asks the server where it got to and carries on from there.
+# Returns None if the server does not take resumable uploads.
+def resumable_upload(url, file_path, part_size=PART_SIZE):
+	uid = upload_id(file_path)
+	size = os.path.getsize(file_path)
+	base_url = resumable_url(url, uid)
+	checkpoint = load_checkpoint(uid)
+	if checkpoint is None:
+		checkpoint = {'upload_id': uid, 'url': url, 'file_path': file_path, 'size': size, 'part_size': part_size, 'parts': []}
+	part_size = checkpoint['part_size']
+	# Parts go out in order, so everything before the first gap is on the server
+	part = 0
+	while part in checkpoint['parts']:
+		part += 1
+	offset = server_offset(base_url)
+	if offset is not None:
+		part = offset // part_size
+		checkpoint['parts'] = [p for p in checkpoint['parts'] if p < part]
+	encoding = accepted_encodings.get(url, supported_encodings()[0])
+	resyncs = 0
+	while part * part_size < size:
+		start = part * part_size
+		data = read_part(file_path, start, part_size)
+		response = send_part(f"{base_url}/{part}", data, start, size, encoding, file_path)
+		if encoding != 'identity' and refused_body(url, response, encoding):
+			encoding = 'identity'
+			metrics.add_count(file_path, 'retries')
+			continue
+		if response.status_code in (404, 405, 501) and not checkpoint['parts']:
+			remove_checkpoint(uid)
+			return None
+		have = conflict_offset(response)
+		if have is not None and have < start and resyncs < PART_ATTEMPTS:
+			# The server has less than the checkpoint says, go back to where it is
+			resyncs += 1
+			part = have // part_size
+			checkpoint['parts'] = [p for p in checkpoint['parts'] if p < part]
+			save_checkpoint(checkpoint)
+			metrics.add_count(file_path, 'retries')
+			continue
+		if response.status_code != 200:
+			return response
+		checkpoint['parts'].append(part)
+		save_checkpoint(checkpoint)
+		part += 1
+	response = complete_upload(base_url, file_path, size)
+	if response.status_code == 200:
+		remove_checkpoint(uid)
+	return response
+
+# The offset the server has, when it turned a part down for starting past
+# it. None for any other answer, a 409 without an offset included.
+def conflict_offset(response):
+	if response.status_code != 409:
+		return None
+	try:
+		return int(response.json()['offset'])
+	except (ValueError, KeyError, TypeError):
+		return None
+
+# True if the server turned the upload down because it already has the log.
+# A part starting past what the server has is a conflict, not a duplicate.
+def is_duplicate(response):
+	if response.status_code == 409:
+		return conflict_offset(response) is None
+	return response.status_code == 400 and 'exist' in response.text.lower()
+
+# Upload a combat log the best way the server allows, big files in resumable
+# parts and everything else in one streamed request. With a HashIndex the file
+# is skipped, and None returned, if the same content was uploaded before.
+def upload(url, file_path, index=None):
+	if index is not None:
+		with metrics.timed(file_path, 'hash'):
+			digest = index.file_digest(file_path)
+		if index.known(digest, file_path):
+			return None
+	response = None
+	if os.path.getsize(file_path) >= RESUMABLE_MIN_SIZE:
+		response = resumable_upload(url, file_path)
+	if response is None:
+		response = post_file(url, file_path)
+	if index is not None and (response.status_code == 200 or is_duplicate(response)):
+		index.add(digest, file_path)
+	return response
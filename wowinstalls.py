@@ -0,0 +1,101 @@
+import os
+import re
+import sys
+import string
+from collections import namedtuple
+
+try:
+	import winreg
+except ImportError:
+	# Not on Windows
+	winreg = None
+
+# Finding the Logs folder of every WoW install. One install folder holds a
+# folder per flavor, _retail_, _classic_, _classic_era_, _ptr_ and so on,
+# each with a Logs folder of its own, and players keep installs on other
+# drives too. Installs are found from the Battle.net registry keys and by
+# looking in the usual places on every fixed drive, and every flavor folder
+# with a Logs folder in it is returned.
+
+INSTALL_NAME = "World of Warcraft"
+# Folders on a drive an install is usually in, '' for the drive itself
+INSTALL_PARENTS = ["Program Files (x86)", "Program Files", "Games", "Blizzard", ""]
+# Registry keys whose InstallPath is an install or one of its flavor folders
+REGISTRY_KEYS = [
+	r"SOFTWARE\WOW6432Node\Blizzard Entertainment\World of Warcraft",
+	r"SOFTWARE\WOW6432Node\Blizzard Entertainment\World of Warcraft\Beta",
+	r"SOFTWARE\WOW6432Node\Blizzard Entertainment\World of Warcraft\PTR",
+	r"SOFTWARE\Blizzard Entertainment\World of Warcraft",
+]
+
+# GetDriveType of a local hard disk. Removable, network and optical drives
+# are left out, asking about them can hang for seconds.
+DRIVE_FIXED = 3
+
+FLAVOR_FOLDER = re.compile(r'^_(\w+?)_$')
+
+LogFolder = namedtuple('LogFolder', ['flavor', 'path'])
+
+# Flavor of a folder name like _classic_era_, None if it is not one
+def folder_flavor(name):
+	match = FLAVOR_FOLDER.match(name)
+	return match.group(1) if match else None
+
+# Flavor a combat log was written by, from the folder its Logs folder is in
+def flavor_of(file_path):
+	return folder_flavor(os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(file_path)))))
+
+def registry_installs():
+	installs = []
+	if winreg is None:
+		return installs
+	for key_name in REGISTRY_KEYS:
+		try:
+			with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, key_name) as key:
+				path = winreg.QueryValueEx(key, "InstallPath")[0]
+		except OSError:
+			continue
+		path = os.path.normpath(path)
+		if folder_flavor(os.path.basename(path)):
+			path = os.path.dirname(path)
+		installs.append(path)
+	return installs
+
+# Roots of the local fixed drives, from the drive bitmask without touching
+# any of them
+def drive_roots():
+	if sys.platform == 'win32':
+		import ctypes
+		kernel32 = ctypes.windll.kernel32
+		drives = kernel32.GetLogicalDrives()
+		roots = [f"{letter}:\\" for i, letter in enumerate(string.ascii_uppercase) if drives >> i & 1]
+		return [root for root in roots if kernel32.GetDriveTypeW(root) == DRIVE_FIXED]
+	return ["/Applications", os.path.expanduser("~/Games")]
+
+# Install folders that exist, each once
+def find_installs():
+	candidates = registry_installs()
+	for root in drive_roots():
+		for parent in INSTALL_PARENTS:
+			candidates.append(os.path.join(root, parent, INSTALL_NAME))
+	installs = []
+	for path in candidates:
+		if os.path.isdir(path) and os.path.normcase(path) not in (os.path.normcase(p) for p in installs):
+			installs.append(path)
+	return installs
+
+# Logs folders of every flavor of every install, retail first
+def find_log_folders():
+	folders = []
+	for install in find_installs():
+		try:
+			names = sorted(os.listdir(install))
+		except OSError:
+			continue
+		for name in names:
+			flavor = folder_flavor(name)
+			path = os.path.join(install, name, "Logs")
+			if flavor and os.path.isdir(path):
+				folders.append(LogFolder(flavor, path))
+	folders.sort(key=lambda folder: folder.flavor != 'retail')
+	return folders
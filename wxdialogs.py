@@ -0,0 +1,234 @@
+import os
+import wx
+import wx.lib.scrolledpanel
+from logfiles import LogFileList, LogScanner
+from batchupload import BatchUpload, STATE_LABELS, describe
+
+# The wx windows the wx apps share. Two scripts import this module:
+#
+#   arenalogsgg.py  every window here, the manual upload dialog, the info
+#                   window and start/stop, loaded the first time one is
+#                   opened from the tray menu so the watcher, the uploads
+#                   and --headless never load wx
+#   local.py        LogFileListCtrl and BatchProgressDialog, which its own
+#                   manual upload dialog is built from
+#
+# app is the script's UploadApp, the windows use its settings, log cache and
+# upload functions.
+
+# Virtual list of the logs. Rows are drawn from a LogFileList as they come
+# into view, so adding thousands of logs is one SetItemCount call.
+class LogFileListCtrl(wx.ListCtrl):
+	def __init__(self, parent):
+		super().__init__(parent, style=wx.LC_REPORT | wx.LC_VIRTUAL)
+		self.files = LogFileList()
+
+	def OnGetItemText(self, item, column):
+		return self.files.cell(item, column)
+
+	# Add a batch of logs from the scanner, keeping the selected logs selected
+	def add_files(self, batch):
+		if not self:
+			return
+		selected = self.selected_paths()
+		self.select_rows([])
+		for log_file in batch:
+			self.files.insert(log_file)
+		self.SetItemCount(len(self.files))
+		self.select_rows([self.files.row_of(file_path) for file_path in selected])
+		self.Refresh()
+
+	def set_matches(self, value):
+		if not self:
+			return
+		file_path, count = value
+		self.files.matches[file_path] = count
+		row = self.files.row_of(file_path)
+		if row is not None:
+			self.RefreshItem(row)
+
+	def set_status(self, file_path, status):
+		row = self.files.set_status(file_path, status)
+		if row is not None:
+			self.RefreshItem(row)
+
+	def selected_rows(self):
+		rows = []
+		row = self.GetFirstSelected()
+		while row != wx.NOT_FOUND:
+			rows.append(row)
+			row = self.GetNextSelected(row)
+		return rows
+
+	def selected_paths(self):
+		return [self.files[row].path for row in self.selected_rows()]
+
+	# Select exactly these rows
+	def select_rows(self, rows):
+		for row in self.selected_rows():
+			self.Select(row, False)
+		for row in rows:
+			self.Select(row)
+
+# Dialog with the progress of a batch upload, a bar for each log and one for all of them
+class BatchProgressDialog(wx.Dialog):
+	def __init__(self, parent, file_paths):
+		super().__init__(parent, title="Uploading Logs", size=(500, 400), style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+		self.batch = None
+		vbox = wx.BoxSizer(wx.VERTICAL)
+		self.total_gauge = wx.Gauge(self, range=1000)
+		vbox.Add(self.total_gauge, 0, wx.EXPAND | wx.ALL, 10)
+		self.total_label = wx.StaticText(self, label="Starting upload")
+		vbox.Add(self.total_label, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 10)
+		panel = wx.lib.scrolledpanel.ScrolledPanel(self)
+		grid = wx.FlexGridSizer(3, 5, 10)
+		grid.AddGrowableCol(1)
+		self.file_gauges = []
+		self.file_labels = []
+		for file_path in file_paths:
+			grid.Add(wx.StaticText(panel, label=os.path.basename(file_path)), 0, wx.ALIGN_CENTER_VERTICAL)
+			gauge = wx.Gauge(panel, range=1000)
+			grid.Add(gauge, 1, wx.EXPAND)
+			label = wx.StaticText(panel, label="Waiting", size=(70, -1))
+			grid.Add(label, 0, wx.ALIGN_CENTER_VERTICAL)
+			self.file_gauges.append(gauge)
+			self.file_labels.append(label)
+		panel.SetSizer(grid)
+		panel.SetupScrolling(scroll_x=False)
+		vbox.Add(panel, 1, wx.EXPAND | wx.ALL, 10)
+		self.cancel_button = wx.Button(self, label="Cancel")
+		self.cancel_button.Bind(wx.EVT_BUTTON, self.on_cancel)
+		vbox.Add(self.cancel_button, 0, wx.ALIGN_CENTER | wx.ALL, 10)
+		self.SetSizer(vbox)
+
+	def update_progress(self, progress):
+		if not self:
+			return
+		self.total_gauge.SetValue(int(progress.done * 1000 / max(progress.total, 1)))
+		self.total_label.SetLabel(describe(progress))
+		for gauge, label, file_progress in zip(self.file_gauges, self.file_labels, progress.files):
+			value = int(file_progress.done * 1000 / file_progress.total)
+			gauge.SetValue(value)
+			label.SetLabel(STATE_LABELS.get(file_progress.state, f"{value // 10}%"))
+		if progress.finished:
+			self.cancel_button.SetLabel("Close")
+
+	def on_cancel(self, event):
+		if self.batch.finished.is_set():
+			self.Destroy()
+		else:
+			self.batch.cancel()
+
+class ManualUploadDialog(wx.Dialog):
+	def __init__(self, parent, app):
+		super().__init__(parent, title="Manual Upload", size=(500, 300))
+		self.app = app
+		self.__close_callback = self.OnClose
+		self.icon = wx.Icon(self.app.icon_path, wx.BITMAP_TYPE_ICO)
+		self.SetIcon(self.icon)
+		
+		vbox = wx.BoxSizer(wx.VERTICAL)
+		
+		self.file_listctrl = LogFileListCtrl(self)
+		self.file_listctrl.InsertColumn(0, "File Name")
+		self.file_listctrl.InsertColumn(1, "Date Created")
+		self.file_listctrl.InsertColumn(2, "Arena Matches")
+		self.file_listctrl.InsertColumn(3, "Status")
+		self.file_listctrl.SetColumnWidth(0, 280)  # Adjust width of first column
+		self.file_listctrl.SetColumnWidth(1, 160)  # Adjust width of second column
+		self.file_listctrl.SetColumnWidth(2, 100)
+		self.file_listctrl.SetColumnWidth(3, 120)
+
+		vbox.Add(self.file_listctrl, 1, wx.EXPAND | wx.ALL, 10)
+		
+		select_button = wx.Button(self, label="Select Not Uploaded")
+		select_button.Bind(wx.EVT_BUTTON, self.on_select_not_uploaded)
+		vbox.Add(select_button, 0, wx.ALIGN_CENTER | wx.ALL, 10)
+		
+		upload_button = wx.Button(self, label="Upload Selected Files")
+		upload_button.Bind(wx.EVT_BUTTON, self.on_upload)
+		vbox.Add(upload_button, 0, wx.ALIGN_CENTER | wx.ALL, 10)
+		
+		close_button = wx.Button(self, label="Close")
+		close_button.Bind(wx.EVT_BUTTON, self.on_close)
+		vbox.Add(close_button, 0, wx.ALIGN_CENTER | wx.ALL, 10)
+		
+		self.populate_file_list()
+		self.SetSizer(vbox)
+		
+		self.Bind(wx.EVT_CLOSE, self.OnClose)
+		self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy)
+
+	def OnClose(self, event):
+		#print('In OnClose')
+		event.Skip()
+
+	def OnDestroy(self, event):
+		#print('In OnDestroy')
+		self.scanner.stop()
+		event.Skip()
+
+	def _close(self):
+		#print('In _close')
+		self.Hide()
+		self.Destroy()
+
+	def on_close(self, event):
+		#print('In On_Close')
+		self.Hide()
+
+	# Fill the list from a background scan so the dialog opens straight away
+	def populate_file_list(self):
+		self.scanner = LogScanner(self.app.log_folders(), wx.CallAfter, self.file_listctrl.add_files, self.file_listctrl.set_matches, self.app.match_count, self.app.log_cache)
+		self.scanner.start()
+
+	# Upload the selected logs as one batch, the dialog stays usable meanwhile
+	def on_upload(self, event):
+		file_paths = self.file_listctrl.selected_paths()
+		if file_paths:
+			progress_dialog = BatchProgressDialog(self, file_paths)
+			batch = BatchUpload(file_paths, self.app.upload_queue, self.app.upload_size, wx.CallAfter, progress_dialog.update_progress, self.on_file_done)
+			progress_dialog.batch = batch
+			progress_dialog.Show()
+			batch.start()
+		else:
+			self.app.show_tray_message("No file selected", "Please select a file to upload")
+
+	def on_select_not_uploaded(self, event):
+		self.file_listctrl.select_rows(self.file_listctrl.files.not_uploaded())
+
+	def on_file_done(self, value):
+		if not self:
+			return
+		file_path, ok = value
+		entry = self.app.log_cache.get(file_path)
+		self.file_listctrl.set_status(file_path, entry['status'] if entry else None)
+
+class InfoFrame(wx.Frame):
+	def __init__(self, icon, app):
+		super().__init__(None, title="Arena Logs Uploader", size=(400, 200))
+		self.icon = icon
+		self.icon_path = app.icon_path
+		self.SetIcon(wx.Icon(self.icon_path, wx.BITMAP_TYPE_ICO))  # Set the frame icon
+		panel = wx.Panel(self)
+		vbox = wx.BoxSizer(wx.VERTICAL)
+		label = wx.StaticText(panel, label="This application monitors the World of Warcraft logs directory for new log files and uploads them to the server when detected. GitHub repo can be seen here https://github.com/Ulminia/PvP-Lookup-App", style=wx.ST_ELLIPSIZE_MIDDLE)
+		label.Wrap(380)  # Set the width to wrap at (adjust as needed)
+		vbox.Add(label, 0, wx.ALL | wx.EXPAND, 10)
+		close_button = wx.Button(panel, label="Close")
+		close_button.Bind(wx.EVT_BUTTON, self.on_close)
+		vbox.Add(close_button, 0, wx.ALL | wx.CENTER, 10)
+		panel.SetSizer(vbox)
+
+	def on_close(self, event):
+		self.Hide()
+
+# Start wx on the calling thread, the one pystray runs its menu on
+def start(app):
+	wx_app = wx.App(False)
+	# Upload callbacks come back on the wx thread
+	app.upload_engine.set_dispatcher(wx.CallAfter)
+	return wx_app
+
+def stop():
+	wx.CallAfter(wx.GetApp().ExitMainLoop)